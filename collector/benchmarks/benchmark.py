@@ -0,0 +1,520 @@
+"""
+Benchmarks for the metrics collector.
+
+Usage:
+    python benchmarks/benchmark.py [--samples N] [--snapshot DIR]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from backends import ProcfsBackend
+from buffer_store import BufferStore
+from config import Config
+from history import HistoryStore
+from ingest_stub import IngestStub
+from load_shedding import BackpressureMonitor
+from metrics_collector import MetricsCollector
+from metrics_sender import EncodedSample
+from sample_model import Sample
+from serializer import encode, format_timestamp
+from shared_state import SharedStateReader, SharedStateWriter
+from sinks import HttpSink
+from synthetic import generate_host
+
+
+# Samples per hour with the default per-family intervals (cpu, memory,
+# network every 5s, disk every 30s; one sample per family tick)
+SAMPLES_PER_HOUR = 3 * 720 + 120
+
+# Synthetic hosts for the collection scale benchmark:
+# (cores, network interfaces, disks, sockets)
+HOST_SIZES = (
+    (4, 2, 2, 200),
+    (32, 8, 8, 5000),
+    (128, 32, 32, 50000),
+    (256, 128, 64, 200000),
+)
+
+CONFIG_PATH = Path(__file__).parent.parent / 'config' / 'collector-config.yaml'
+
+
+def make_samples(count: int, seed: int = 1):
+    """
+    Build a deterministic stream of realistic per-family samples.
+
+    Args:
+        count: Number of samples
+        seed: Random seed
+
+    Returns:
+        List of sample dictionaries
+    """
+    rng = random.Random(seed)
+    cores = 16
+    state = {'bytes': [10**11] * 6, 'packets': [10**8] * 6, 'used': 3 * 10**10}
+
+    def pct():
+        # psutil reports percentages with one decimal
+        return round(rng.uniform(0, 100), 1)
+
+    def counter(kind, index, step):
+        state[kind][index] += rng.randrange(step)
+        return state[kind][index]
+
+    def drift(key, step):
+        state[key] += rng.randrange(-step, step)
+        return state[key]
+
+    templates = {
+        'cpu': lambda: {
+            'usage': {'total': pct(), 'user': pct(), 'system': pct(), 'idle': pct(),
+                      'iowait': round(rng.uniform(0, 5), 1)},
+            'cores': {'usage': [pct() for _ in range(cores)],
+                      'count': cores, 'physical_count': cores // 2},
+            'load': {'average': {'1m': round(rng.uniform(0, 8), 2), '5m': round(rng.uniform(0, 8), 2),
+                                 '15m': round(rng.uniform(0, 8), 2)}},
+        },
+        'memory': lambda: {
+            'total': 67108864000, 'used': drift('used', 10**7),
+            'available': 67108864000 - state['used'], 'free': 4 * 10**9 - state['used'] // 100,
+            'usage': {'percent': round(state['used'] / 671088640, 1)},
+            'buffers': 512000000, 'cached': 20 * 10**9 + state['used'] % 10**6,
+            'swap': {'total': 8589934592, 'used': 0, 'free': 8589934592,
+                     'usage': {'percent': 0.0}},
+        },
+        'disk': lambda: {
+            'partitions': [{
+                'device': f'/dev/nvme0n1p{i}', 'mountpoint': mountpoint, 'fstype': 'ext4',
+                'usage': {'total': 512110190592, 'used': 201234567168 + i * 10**9,
+                          'free': 310875623424 - i * 10**9, 'percent': 39.3 + i},
+                'inode': {'total': 31260672, 'used': 812345 + i, 'free': 30448327 - i,
+                          'usage': {'percent': 2.598}},
+            } for i, mountpoint in enumerate(['/', '/var', '/home'], 1)],
+            'io': {'read': {'bytes': rng.uniform(0, 10**7), 'count': rng.uniform(0, 500)},
+                   'write': {'bytes': rng.uniform(0, 10**7), 'count': rng.uniform(0, 500)}},
+        },
+        'network': lambda: {
+            'interfaces': [{
+                'name': name,
+                'io': {'bytes': {'sent': counter('bytes', 2 * i, 10**7),
+                                 'recv': counter('bytes', 2 * i + 1, 10**7)},
+                       'packets': {'sent': counter('packets', 2 * i, 10**4),
+                                   'recv': counter('packets', 2 * i + 1, 10**4)},
+                       'errors': {'in': 0, 'out': 0}, 'dropped': {'in': 0, 'out': 0}},
+                'io_rate': {'bytes_sent': rng.uniform(0, 10**6), 'bytes_recv': rng.uniform(0, 10**6),
+                            'packets_sent': rng.uniform(0, 10**3),
+                            'packets_recv': rng.uniform(0, 10**3)},
+            } for i, name in enumerate(['eth0', 'eth1', 'docker0'])],
+            'connections': {'tcp': rng.randrange(500), 'udp': rng.randrange(50),
+                            'established': rng.randrange(300), 'time_wait': rng.randrange(100),
+                            'close_wait': 0, 'listen': 20},
+        },
+    }
+    families = ['cpu', 'memory', 'network', 'cpu', 'memory', 'network', 'disk']
+
+    samples = []
+    start = 1767225600.0
+    for i in range(count):
+        family = families[i % len(families)]
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(start + i * 5 / 3))
+        samples.append({
+            'timestamp': f'{timestamp}.{rng.randrange(10**6):06d}Z',
+            'hostname': 'bench-host-01',
+            'metrics': {family: templates[family]()},
+        })
+    return samples
+
+
+def bench_buffer(samples):
+    """Compare the compressed buffer store against one JSON file per sample."""
+    records = [json.dumps(s, separators=(',', ':')).encode('utf-8') for s in samples]
+    legacy_bytes = sum(len(json.dumps(s)) for s in samples)
+
+    directory = Path(tempfile.mkdtemp(prefix='bench-buffer-'))
+    try:
+        store = BufferStore(directory, max_size=100 * 1024 * 1024)
+        start = time.perf_counter()
+        for record in records:
+            store.append(record)
+        write_time = time.perf_counter() - start
+        store.close()
+        store_bytes = store.size
+
+        store = BufferStore(directory, max_size=100 * 1024 * 1024)
+        start = time.perf_counter()
+        replayed = store.replay(lambda batch: True, batch_size=20)
+        replay_time = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    legacy_hours = (1024 * 1024 / (legacy_bytes / len(samples))) / SAMPLES_PER_HOUR
+    store_hours = (1024 * 1024 / (store_bytes / len(samples))) / SAMPLES_PER_HOUR
+
+    print("Buffer")
+    print(f"  samples                  {len(samples)}")
+    print(f"  json files bytes/sample  {legacy_bytes / len(samples):10.1f}")
+    print(f"  store bytes/sample       {store_bytes / len(samples):10.1f}")
+    print(f"  compression ratio        {legacy_bytes / store_bytes:10.1f}x")
+    print(f"  buffered hours per MB    {legacy_hours:10.2f} -> {store_hours:.2f}")
+    print(f"  write throughput         {len(records) / write_time:10.0f} samples/s")
+    print(f"  replay throughput        {replayed / replay_time:10.0f} samples/s")
+
+
+def bench_serializer(samples):
+    """Compare per-sample timestamp formatting and encoding before/after the serializer."""
+    def before(sample):
+        dict(sample, timestamp=datetime.utcnow().isoformat() + 'Z')
+        return json.dumps(sample, separators=(',', ':')).encode('utf-8')
+
+    def after(sample):
+        dict(sample, timestamp=format_timestamp())
+        return encode(sample)
+
+    results = []
+    for run in (before, after):
+        best = float('inf')
+        for _ in range(5):
+            start = time.perf_counter()
+            for sample in samples:
+                run(sample)
+            best = min(best, time.perf_counter() - start)
+
+        # Transient memory: peak traced allocation while handling one
+        # sample, excluding the returned payload itself
+        subset = samples[:2000]
+        transient = 0
+        tracemalloc.start()
+        for sample in subset:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            payload = run(sample)
+            transient += tracemalloc.get_traced_memory()[1] - base - sys.getsizeof(payload)
+            del payload
+        tracemalloc.stop()
+        results.append((best / len(samples) * 1e6, transient / len(subset)))
+
+    print("Serializer")
+    for label, (cpu_us, transient) in zip(('json.dumps + datetime', 'shared encoder + cache'),
+                                          results):
+        print(f"  {label:<24} {cpu_us:7.2f} us/sample, {transient:7.0f} transient bytes/sample")
+
+
+def bench_queue_memory(samples):
+    """Compare memory retained per queued sample: dictionary vs compact sample."""
+    subset = samples[:5000]
+    # Round-trip through JSON so every sample owns its strings, as a
+    # freshly collected one does
+    payloads = [json.dumps(sample) for sample in subset]
+
+    results = []
+    for build in (lambda p: EncodedSample(json.loads(p)),
+                  lambda p: EncodedSample(Sample.from_dict(json.loads(p)))):
+        tracemalloc.start()
+        queued = []
+        for payload in payloads:
+            sample = build(payload)
+            sample.payload()
+            queued.append(sample)
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del queued
+        results.append(retained / len(payloads))
+
+    print("Queued sample memory")
+    for label, size in zip(('dictionary + payload', 'compact + payload'), results):
+        print(f"  {label:<24} {size:10.0f} bytes/sample")
+
+
+def bench_history(samples):
+    """Write samples spread over a week into the history store and time queries."""
+    week = 7 * 24 * 3600
+    end = 1767225600.0 + week
+    step = week / len(samples)
+    stamped = []
+    for i, sample in enumerate(samples):
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(end - week + i * step))
+        stamped.append(dict(sample, timestamp=f'{timestamp}.000000Z'))
+
+    directory = Path(tempfile.mkdtemp(prefix='bench-history-'))
+    try:
+        store = HistoryStore(directory, max_size=500 * 1024 * 1024)
+        start = time.perf_counter()
+        for sample in stamped:
+            store.record(sample)
+        write_time = time.perf_counter() - start
+        series_count = store.series_count
+        disk_bytes = sum(f.stat().st_blocks * 512 for f in directory.rglob('*.ring'))
+        store.close()
+
+        store = HistoryStore(directory, max_size=500 * 1024 * 1024, read_only=True)
+        timings = []
+        for label, span in (('1h', 3600), ('24h', 86400), ('7d', week)):
+            tier = store.select_tier(end - span, now=end)
+            # Best of three, so first-touch page faults are not counted
+            query_ms = aggregate_ms = float('inf')
+            for _ in range(3):
+                began = time.perf_counter()
+                points = store.query('cpu.usage.total', end - span, end, tier)
+                query_ms = min(query_ms, (time.perf_counter() - began) * 1000)
+                began = time.perf_counter()
+                store.aggregate('cpu.usage.total', end - span, end, tier)
+                aggregate_ms = min(aggregate_ms, (time.perf_counter() - began) * 1000)
+            timings.append((label, tier.name, len(points), query_ms, aggregate_ms))
+        store.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print("History")
+    print(f"  samples over 7d          {len(samples)}")
+    print(f"  series                   {series_count}")
+    print(f"  disk used                {disk_bytes / 1024 / 1024:10.1f} MB")
+    print(f"  write throughput         {len(stamped) / write_time:10.0f} samples/s")
+    for label, tier, count, query_ms, aggregate_ms in timings:
+        print(f"  query {label:<4} ({tier}, {count:5d} pts) {query_ms:7.2f} ms, "
+              f"aggregate {aggregate_ms:6.2f} ms")
+
+
+def measure_collection(snapshot: Path, config, repeat: int = 3):
+    """
+    Time one collection per family against a snapshot's second frame.
+
+    Returns:
+        (milliseconds per family, payload bytes, gzip payload bytes)
+    """
+    best = {}
+    for _ in range(repeat):
+        # A fresh backend each run, so file parsing is timed too
+        backend = ProcfsBackend(snapshot)
+        collector = MetricsCollector(config, backend)
+        collector.collect_all()
+        backend.advance()
+
+        sample = collector.collect_sample(())
+        for family in collector.enabled_families:
+            began = time.perf_counter()
+            setattr(sample, family, collector._collectors[family]())
+            elapsed = (time.perf_counter() - began) * 1000
+            best[family] = min(best.get(family, elapsed), elapsed)
+
+    payload = encode(sample.to_dict())
+    return best, len(payload), len(gzip.compress(payload))
+
+
+def bench_collection_scale(snapshot: Path = None):
+    """Time collection and payload size on synthetic hosts of growing size."""
+    config = Config(str(CONFIG_PATH))
+    print("Collection scale")
+    print(f"  {'host':<30} {'cpu':>8} {'memory':>8} {'disk':>8} {'network':>8} "
+          f"{'payload':>10} {'gzip':>9}")
+
+    def report(label, timings, size, compressed):
+        columns = ' '.join(f"{timings.get(family, 0.0):6.2f}ms"
+                           for family in ('cpu', 'memory', 'disk', 'network'))
+        print(f"  {label:<30} {columns} {size / 1024:8.1f}KB {compressed / 1024:7.1f}KB")
+
+    if snapshot is not None:
+        report(f'recorded {snapshot.name}', *measure_collection(snapshot, config))
+        return
+
+    for cores, interfaces, disks, sockets in HOST_SIZES:
+        directory = Path(tempfile.mkdtemp(prefix='bench-host-'))
+        try:
+            generate_host(directory, cores=cores, interfaces=interfaces, disks=disks,
+                          sockets=sockets)
+            label = f'{cores}c/{interfaces}nic/{disks}disk/{sockets}sock'
+            report(label, *measure_collection(directory, config))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class _ConfigOverride:
+    """Configuration with some keys replaced."""
+
+    def __init__(self, config, values):
+        self._config = config
+        self._values = values
+
+    def get(self, *keys, default=None):
+        if keys in self._values:
+            return self._values[keys]
+        return self._config.get(*keys, default=default)
+
+    def __getattr__(self, name):
+        return getattr(self._config, name)
+
+
+def bench_per_core_modes():
+    """Compare CPU collection time and payload size per per-core mode and core count."""
+    config = Config(str(CONFIG_PATH))
+    print("Per-core CPU reporting")
+    print(f"  {'cores':>5} {'mode':<8} {'collect':>9} {'cpu payload':>12}")
+
+    for cores in (16, 64, 256):
+        directory = Path(tempfile.mkdtemp(prefix='bench-cores-'))
+        try:
+            generate_host(directory, cores=cores, interfaces=1, disks=1, sockets=0)
+            for mode in ('usage', 'summary', 'full'):
+                override = _ConfigOverride(config, {('metrics', 'cpu', 'per_cpu_mode'): mode})
+                best = float('inf')
+                for _ in range(5):
+                    backend = ProcfsBackend(directory)
+                    collector = MetricsCollector(override, backend)
+                    collector.collect_cpu_metrics()
+                    backend.advance()
+                    began = time.perf_counter()
+                    metrics = collector.collect_cpu_metrics()
+                    best = min(best, time.perf_counter() - began)
+                size = len(encode(metrics))
+                print(f"  {cores:5d} {mode:<8} {best * 1000:7.2f}ms {size:10d} B")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_network_churn():
+    """Compare network collection with and without grouping under veth churn."""
+    config = Config(str(CONFIG_PATH))
+    ungrouped = _ConfigOverride(config, {('metrics', 'network', 'groups'): {},
+                                         ('metrics', 'network', 'max_interfaces'): 10**6})
+    frames = 4
+    print("Network interface churn (20% of veths replaced per frame)")
+    print(f"  {'veths':>5} {'config':<9} {'collect':>9} {'payload':>10} {'series':>7} "
+          f"{'state':>6}")
+
+    for veths in (100, 1000, 5000):
+        directory = Path(tempfile.mkdtemp(prefix='bench-churn-'))
+        try:
+            generate_host(directory, cores=4, interfaces=2, disks=1, sockets=0,
+                          frames=frames, veths=veths, churn=0.2)
+            for label, settings in (('ungrouped', ungrouped), ('grouped', config)):
+                backend = ProcfsBackend(directory)
+                collector = MetricsCollector(settings, backend)
+                best = float('inf')
+                for frame in range(frames):
+                    began = time.perf_counter()
+                    metrics = collector._collect_network()
+                    best = min(best, time.perf_counter() - began) if frame else best
+                    backend.advance()
+                size = len(encode(metrics.to_dict()))
+                print(f"  {veths:5d} {label:<9} {best * 1000:7.2f}ms {size / 1024:8.1f}KB "
+                      f"{len(metrics.names):7d} {collector._net_tracker.tracked:6d}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_windowed_upload(samples):
+    """Compare HTTP upload throughput per window over a high-latency link."""
+    config = Config(str(CONFIG_PATH))
+    delay, batch_size = 0.05, 20
+    payloads = [encode(sample) for sample in samples[:2000]]
+    batches = [payloads[i:i + batch_size] for i in range(0, len(payloads), batch_size)]
+    print(f"Windowed upload ({delay * 1000:.0f}ms per response, batches of {batch_size})")
+    print(f"  {'window':>6} {'elapsed':>9} {'samples/s':>10} {'stored':>7}")
+
+    for window in (1, 4, 8, 32):
+        stub = IngestStub(delay=delay)
+        stub.start_in_thread()
+        sink = HttpSink({'name': 'bench', 'url': stub.url, 'window': window},
+                        BackpressureMonitor(config))
+        pending = iter(batches)
+        lock = threading.Lock()
+
+        def upload():
+            # One request in flight per worker, like the runtime's window
+            while True:
+                with lock:
+                    batch = next(pending, None)
+                if batch is None:
+                    return
+                sink.deliver(batch)
+
+        try:
+            began = time.perf_counter()
+            with ThreadPoolExecutor(window) as executor:
+                for _ in range(window):
+                    executor.submit(upload)
+            elapsed = time.perf_counter() - began
+            print(f"  {window:6d} {elapsed:8.2f}s {len(payloads) / elapsed:10.0f} "
+                  f"{stub.stats['stored']:7d}")
+        finally:
+            sink.close()
+            stub.stop()
+
+
+def bench_shared_state():
+    """Compare each consumer sampling the host with reading the shared-memory segment."""
+    config = Config(str(CONFIG_PATH))
+    rounds = 200
+    print("Shared-memory segment (per consumer, latest values of every family)")
+    print(f"  {'cores':>5} {'sample host':>12} {'publish':>9} {'read':>9}")
+
+    for cores in (16, 64, 256):
+        directory = Path(tempfile.mkdtemp(prefix='bench-shm-'))
+        try:
+            generate_host(directory, cores=cores, interfaces=4, disks=4, sockets=1000)
+            backend = ProcfsBackend(directory)
+            collector = MetricsCollector(config, backend)
+            collector.collect_sample(collector.enabled_families)
+            backend.advance()
+
+            began = time.perf_counter()
+            sample = collector.collect_sample(collector.enabled_families)
+            sampled = time.perf_counter() - began
+
+            writer = SharedStateWriter(directory / 'metrics.shm', 'bench-host')
+            reader = SharedStateReader(writer.path)
+            try:
+                began = time.perf_counter()
+                for _ in range(rounds):
+                    writer.publish(sample)
+                published = (time.perf_counter() - began) / rounds
+                began = time.perf_counter()
+                for _ in range(rounds):
+                    reader.sample()
+                read = (time.perf_counter() - began) / rounds
+            finally:
+                reader.close()
+                writer.close()
+            print(f"  {cores:5d} {sampled * 1000:10.2f}ms {published * 1000:7.3f}ms "
+                  f"{read * 1000:7.3f}ms")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    """Run all benchmarks."""
+    parser = argparse.ArgumentParser(description='Collector benchmarks')
+    parser.add_argument('--samples', type=int, default=20000, help='Samples per benchmark')
+    parser.add_argument('--snapshot', type=Path, default=None,
+                        help='Recorded snapshot to time collection against, instead of '
+                             'synthetic hosts')
+    args = parser.parse_args()
+
+    samples = make_samples(args.samples)
+    bench_buffer(samples)
+    bench_serializer(samples)
+    bench_queue_memory(samples)
+    bench_history(samples)
+    bench_collection_scale(args.snapshot)
+    bench_per_core_modes()
+    bench_network_churn()
+    bench_windowed_upload(samples)
+    bench_shared_state()
+
+
+if __name__ == '__main__':
+    main()
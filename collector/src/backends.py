@@ -0,0 +1,421 @@
+"""
+System data sources for the metrics collector.
+
+PsutilBackend reads the live system. ProcfsBackend replays snapshots of
+the /proc and /sys files psutil reads on Linux, recorded from a real
+host with record_snapshot() or generated by synthetic.generate_host(),
+so collection can be tested and benchmarked deterministically against
+hosts of any size.
+
+Snapshot layout: one directory per frame (0000, 0001, ...), each with
+
+    time                  epoch seconds the frame was taken at
+    proc/...              stat, meminfo, loadavg, cpuinfo, filesystems,
+                          mounts, diskstats, net/dev, net/{tcp,tcp6,udp,udp6}
+    sys/block/<name>      one empty file per whole-disk block device
+    sys/cpu/<n>           core_cpus_list topology of logical CPU n
+    statvfs.json          {mountpoint: [frsize, blocks, bfree, bavail, files, ffree]}
+"""
+
+import json
+import os
+import shutil
+import time
+from array import array
+from collections import namedtuple
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import psutil
+
+from cpu_engine import CPU_MODES
+
+
+# Files copied from /proc into each frame (source path, snapshot path)
+PROC_FILES = (
+    ('stat', 'stat'),
+    ('meminfo', 'meminfo'),
+    ('loadavg', 'loadavg'),
+    ('cpuinfo', 'cpuinfo'),
+    ('filesystems', 'filesystems'),
+    ('self/mounts', 'mounts'),
+    ('diskstats', 'diskstats'),
+    ('net/dev', 'net/dev'),
+    ('net/tcp', 'net/tcp'),
+    ('net/tcp6', 'net/tcp6'),
+    ('net/udp', 'net/udp'),
+    ('net/udp6', 'net/udp6'),
+)
+
+# /proc/stat cpu line fields, in kernel order
+CPU_FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal',
+              'guest', 'guest_nice')
+
+# Socket states as psutil reports them, by /proc/net/tcp state code
+TCP_STATES = {
+    '01': 'ESTABLISHED', '02': 'SYN_SENT', '03': 'SYN_RECV', '04': 'FIN_WAIT1',
+    '05': 'FIN_WAIT2', '06': 'TIME_WAIT', '07': 'CLOSE', '08': 'CLOSE_WAIT',
+    '09': 'LAST_ACK', '0A': 'LISTEN', '0B': 'CLOSING',
+}
+
+# Kernel clock ticks per second for /proc/stat
+USER_HZ = 100
+
+svmem = namedtuple('svmem', 'total available percent used free buffers cached')
+sswap = namedtuple('sswap', 'total used free percent')
+sdiskpart = namedtuple('sdiskpart', 'device mountpoint fstype opts')
+sdiskusage = namedtuple('sdiskusage', 'total used free percent')
+sdiskio = namedtuple('sdiskio', 'read_count write_count read_bytes write_bytes')
+snetio = namedtuple('snetio', 'bytes_sent bytes_recv packets_sent packets_recv '
+                              'errin errout dropin dropout')
+sconn = namedtuple('sconn', 'type status')
+statvfs_result = namedtuple('statvfs_result', 'f_frsize f_blocks f_bfree f_bavail f_files f_ffree')
+
+
+def parse_cpu_stat(text: str) -> Tuple[Tuple[float, ...], array]:
+    """
+    Parse the cpu lines of /proc/stat.
+
+    Args:
+        text: Contents of /proc/stat
+
+    Returns:
+        (CPU_MODES ticks of the whole system, CPU_MODES ticks per core
+        as one core-major array)
+    """
+    width = len(CPU_MODES)
+    total: Tuple[float, ...] = (0.0,) * width
+    cores = array('d')
+    for line in text.splitlines():
+        # The cpu lines come first
+        if not line.startswith('cpu'):
+            break
+        fields = line.split()
+        values = [float(value) for value in fields[1:width + 1]]
+        values += [0.0] * (width - len(values))
+        if fields[0] == 'cpu':
+            total = tuple(values)
+        else:
+            cores.extend(values)
+    return total, cores
+
+
+class PsutilBackend:
+    """Reads the live system through psutil."""
+
+    cpu_count = staticmethod(psutil.cpu_count)
+    virtual_memory = staticmethod(psutil.virtual_memory)
+    swap_memory = staticmethod(psutil.swap_memory)
+    disk_partitions = staticmethod(psutil.disk_partitions)
+    disk_usage = staticmethod(psutil.disk_usage)
+    disk_io_counters = staticmethod(psutil.disk_io_counters)
+    net_io_counters = staticmethod(psutil.net_io_counters)
+    net_connections = staticmethod(psutil.net_connections)
+    statvfs = staticmethod(os.statvfs)
+    sleep = staticmethod(time.sleep)
+    time = staticmethod(time.time)
+
+    @staticmethod
+    def cpu_stat() -> Tuple[Tuple[float, ...], array]:
+        """Get cumulative CPU_MODES times for the system and per core, in one read."""
+        try:
+            with open(os.path.join(psutil.PROCFS_PATH, 'stat')) as f:
+                return parse_cpu_stat(f.read())
+        except OSError:
+            # No /proc (macOS, Windows): psutil's times, modes it lacks as 0
+            total = psutil.cpu_times()
+            cores = array('d')
+            for times in psutil.cpu_times(percpu=True):
+                cores.extend(getattr(times, mode, 0.0) for mode in CPU_MODES)
+            return tuple(getattr(total, mode, 0.0) for mode in CPU_MODES), cores
+
+    @staticmethod
+    def getloadavg() -> Tuple[float, float, float]:
+        return psutil.getloadavg()
+
+
+def _usage_percent(used: float, total: float) -> float:
+    return round(used / total * 100, 1) if total else 0.0
+
+
+class _Frame:
+    """Lazily parsed contents of one snapshot frame."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._cache: Dict[str, Any] = {}
+
+    def read(self, name: str) -> str:
+        return (self.path / name).read_text()
+
+    def cached(self, key: str, parse):
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = parse()
+        return value
+
+    @property
+    def time(self) -> float:
+        return self.cached('time', lambda: float(self.read('time')))
+
+    @property
+    def meminfo(self) -> Dict[str, int]:
+        def parse():
+            values = {}
+            for line in self.read('proc/meminfo').splitlines():
+                key, _, rest = line.partition(':')
+                fields = rest.split()
+                if fields:
+                    values[key] = int(fields[0]) * (1024 if len(fields) > 1 else 1)
+            return values
+        return self.cached('meminfo', parse)
+
+    @property
+    def block_devices(self) -> frozenset:
+        def parse():
+            block = self.path / 'sys' / 'block'
+            return frozenset(p.name.replace('!', '/') for p in block.iterdir()) \
+                if block.is_dir() else frozenset()
+        return self.cached('block_devices', parse)
+
+    @property
+    def statvfs(self) -> Dict[str, List[int]]:
+        return self.cached('statvfs', lambda: json.loads(self.read('statvfs.json')))
+
+
+class ProcfsBackend:
+    """
+    Replays a recorded or synthetic snapshot.
+
+    Calls answer from the current frame and never sleep; the collector
+    derives rates and CPU percentages from successive frames, so a replay
+    is deterministic and as fast as parsing allows. advance() moves to the
+    next frame.
+    """
+
+    def __init__(self, snapshot: Path):
+        """
+        Open a snapshot.
+
+        Args:
+            snapshot: Snapshot directory containing frame directories
+
+        Raises:
+            ValueError: If the directory contains no frames
+        """
+        self.snapshot = Path(snapshot)
+        self._frames = [_Frame(path) for path in sorted(self.snapshot.iterdir())
+                        if path.is_dir() and (path / 'time').exists()]
+        if not self._frames:
+            raise ValueError(f"No snapshot frames in {snapshot}")
+        self.index = 0
+
+    @property
+    def frame_count(self) -> int:
+        return len(self._frames)
+
+    def advance(self) -> bool:
+        """
+        Move to the next frame.
+
+        Returns:
+            False if already at the last frame
+        """
+        if self.index + 1 >= len(self._frames):
+            return False
+        self.index += 1
+        return True
+
+    @property
+    def _current(self) -> _Frame:
+        return self._frames[self.index]
+
+    def time(self) -> float:
+        return self._current.time
+
+    def sleep(self, seconds: float):
+        """Replays do not wait; time moves with advance()."""
+
+    # CPU
+
+    def cpu_stat(self) -> Tuple[Tuple[float, ...], array]:
+        frame = self._current
+        return frame.cached('cpu_stat', lambda: parse_cpu_stat(frame.read('proc/stat')))
+
+    def cpu_count(self, logical: bool = True) -> Optional[int]:
+        frame = self._current
+        if logical:
+            return len(self.cpu_stat()[1]) // len(CPU_MODES)
+        topology = frame.path / 'sys' / 'cpu'
+        if not topology.is_dir():
+            return None
+        cores = {path.read_text().strip() for path in topology.iterdir()}
+        return len(cores) or None
+
+    def getloadavg(self) -> Tuple[float, float, float]:
+        fields = self._current.read('proc/loadavg').split()
+        return float(fields[0]), float(fields[1]), float(fields[2])
+
+    # Memory
+
+    def virtual_memory(self) -> svmem:
+        mems = self._current.meminfo
+        total = mems['MemTotal']
+        free = mems['MemFree']
+        buffers = mems.get('Buffers', 0)
+        cached = mems.get('Cached', 0) + mems.get('SReclaimable', 0)
+        available = mems.get('MemAvailable') or free + buffers + cached
+        if available > total:
+            available = free
+        used = total - available
+        return svmem(total, available, _usage_percent(used, total), used, free, buffers, cached)
+
+    def swap_memory(self) -> sswap:
+        mems = self._current.meminfo
+        total = mems.get('SwapTotal', 0)
+        free = mems.get('SwapFree', 0)
+        return sswap(total, total - free, free, _usage_percent(total - free, total))
+
+    # Disk
+
+    def disk_partitions(self, all: bool = False) -> List[sdiskpart]:
+        frame = self._current
+        fstypes = set()
+        for line in frame.read('proc/filesystems').splitlines():
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] != 'nodev':
+                fstypes.add(fields[0])
+            elif fields[-1] == 'zfs':
+                fstypes.add('zfs')
+
+        partitions = []
+        for line in frame.read('proc/mounts').splitlines():
+            fields = line.split()
+            if len(fields) < 4:
+                continue
+            device, mountpoint, fstype, opts = fields[:4]
+            mountpoint = mountpoint.replace('\\040', ' ')
+            if device == 'none':
+                device = ''
+            if not all and (not device or fstype not in fstypes):
+                continue
+            partitions.append(sdiskpart(device, mountpoint, fstype, opts))
+        return partitions
+
+    def statvfs(self, path: str) -> statvfs_result:
+        values = self._current.statvfs.get(str(path))
+        if values is None:
+            raise FileNotFoundError(path)
+        return statvfs_result(*values)
+
+    def disk_usage(self, path: str) -> sdiskusage:
+        st = self.statvfs(path)
+        total = st.f_blocks * st.f_frsize
+        free = st.f_bavail * st.f_frsize
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        return sdiskusage(total, used, free, _usage_percent(used, used + free))
+
+    def disk_io_counters(self, perdisk: bool = False):
+        frame = self._current
+        disks = {}
+        for line in frame.read('proc/diskstats').splitlines():
+            fields = line.split()
+            if len(fields) < 10 or fields[2] not in frame.block_devices:
+                continue
+            disks[fields[2]] = sdiskio(int(fields[3]), int(fields[7]),
+                                       int(fields[5]) * 512, int(fields[9]) * 512)
+        if perdisk:
+            return disks
+        if not disks:
+            return None
+        return sdiskio(*(sum(values) for values in zip(*disks.values())))
+
+    # Network
+
+    def net_io_counters(self, pernic: bool = False):
+        nics = {}
+        for line in self._current.read('proc/net/dev').splitlines()[2:]:
+            name, _, rest = line.partition(':')
+            fields = [int(value) for value in rest.split()]
+            nics[name.strip()] = snetio(fields[8], fields[0], fields[9], fields[1],
+                                        fields[2], fields[10], fields[3], fields[11])
+        if pernic:
+            return nics
+        return snetio(*(sum(values) for values in zip(*nics.values())))
+
+    def net_connections(self, kind: str = 'inet') -> List[sconn]:
+        connections = []
+        for name, sock_type in (('tcp', 1), ('tcp6', 1), ('udp', 2), ('udp6', 2)):
+            path = self._current.path / 'proc' / 'net' / name
+            if not path.exists():
+                continue
+            with open(path) as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split(None, 4)
+                    if len(fields) < 4:
+                        continue
+                    status = TCP_STATES.get(fields[3], 'NONE') if sock_type == 1 else 'NONE'
+                    connections.append(sconn(sock_type, status))
+        return connections
+
+
+def record_snapshot(dest: Path, frames: int = 2, interval: float = 5.0,
+                    root: Path = Path('/')) -> int:
+    """
+    Record frames of this host's /proc and /sys data for later replay.
+
+    Args:
+        dest: Snapshot directory to create
+        frames: Number of frames (at least two are needed for rates)
+        interval: Seconds between frames
+        root: Filesystem root to read from
+
+    Returns:
+        Number of frames recorded
+    """
+    dest = Path(dest)
+    proc = root / 'proc'
+    backend = PsutilBackend()
+
+    for index in range(frames):
+        if index:
+            time.sleep(interval)
+        frame = dest / f'{index:04d}'
+        (frame / 'proc' / 'net').mkdir(parents=True, exist_ok=True)
+
+        taken = time.time()
+        for source, target in PROC_FILES:
+            try:
+                shutil.copyfile(proc / source, frame / 'proc' / target)
+            except OSError:
+                # e.g. no IPv6 socket tables
+                pass
+
+        block = frame / 'sys' / 'block'
+        block.mkdir(parents=True, exist_ok=True)
+        sys_block = root / 'sys' / 'block'
+        if sys_block.is_dir():
+            for device in sys_block.iterdir():
+                (block / device.name).touch()
+
+        topology = frame / 'sys' / 'cpu'
+        topology.mkdir(parents=True, exist_ok=True)
+        for path in (root / 'sys' / 'devices' / 'system' / 'cpu').glob(
+                'cpu[0-9]*/topology/core_cpus_list'):
+            shutil.copyfile(path, topology / path.parent.parent.name[3:])
+
+        statvfs = {}
+        for partition in backend.disk_partitions(all=False):
+            try:
+                st = os.statvfs(partition.mountpoint)
+            except OSError:
+                continue
+            statvfs[partition.mountpoint] = [st.f_frsize, st.f_blocks, st.f_bfree,
+                                             st.f_bavail, st.f_files, st.f_ffree]
+        (frame / 'statvfs.json').write_text(json.dumps(statvfs))
+        (frame / 'time').write_text(repr(taken))
+
+    return frames
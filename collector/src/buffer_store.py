@@ -0,0 +1,443 @@
+"""
+Compressed on-disk buffer for metrics that could not be sent.
+"""
+
+import logging
+import struct
+import zlib
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MBUF'
+FORMAT_VERSION = 1
+
+# magic, format version, dictionary version, record count (0 until sealed)
+HEADER = struct.Struct('>4sHHI')
+
+SEGMENT_PREFIX = 'segment_'
+SEGMENT_SUFFIX = '.zbuf'
+
+# Read size used when streaming a segment back
+READ_CHUNK = 64 * 1024
+
+# Acknowledged positions are persisted at least this often during replay
+ACK_FLUSH_EVERY = 100
+
+
+def _build_dictionary() -> bytes:
+    """
+    Build the preset compression dictionary from the sample schema.
+
+    zlib favours matches near the end of the dictionary, so the most
+    frequent fragments (keys repeated in every record) come last. The
+    content must never change for a given DICTIONARY_VERSION, since
+    existing segments can only be decompressed with the same bytes.
+    """
+    fragments = [
+        '"partitions":[{"device":"/dev/', '"fstype":"ext4"', '"fstype":"xfs"',
+        '"mountpoint":"/', '"inode":{"total":', '"read":{"bytes":', '"write":{"bytes":',
+        '"connections":{"tcp":', '"udp":', '"established":', '"time_wait":',
+        '"close_wait":', '"listen":', '"errors":{"in":0,"out":0}',
+        '"dropped":{"in":0,"out":0}', '"io_rate":{"bytes_sent":', '"bytes_recv":',
+        '"packets_sent":', '"packets_recv":', '"interfaces":[{"name":"eth0"',
+        '"packets":{"sent":', '"recv":', '"swap":{"total":', '"buffers":', '"cached":',
+        '"load":{"average":{"1m":', '"5m":', '"15m":', '"physical_count":',
+        '"cores":{"usage":[', '"count":', '"iowait":', '"aggregate":{"count":',
+        '"start":"', '"end":"', '"shed_level":',
+        '"io":{"bytes":{"sent":', '"usage":{"total":', '"used":', '"free":', '"available":',
+        '"percent":', '"user":', '"system":', '"idle":', '{"total":',
+        '"metrics":{"cpu":{', '"memory":{', '"disk":{', '"network":{',
+        '{"timestamp":"20', 'T00:00:00.000000Z","hostname":"', '"usage":{"percent":',
+    ]
+    return ''.join(fragments).encode('utf-8')
+
+
+DICTIONARY_VERSION = 1
+DICTIONARIES = {
+    DICTIONARY_VERSION: _build_dictionary(),
+}
+
+
+class _Segment:
+    """Bookkeeping for one segment file."""
+
+    __slots__ = ('path', 'size', 'records', 'acked', 'dictionary_version')
+
+    def __init__(self, path: Path, size: int, records: int, acked: int,
+                 dictionary_version: int = DICTIONARY_VERSION):
+        self.path = path
+        self.size = size
+        self.records = records
+        self.acked = acked
+        self.dictionary_version = dictionary_version
+
+    @property
+    def ack_path(self) -> Path:
+        return self.path.with_suffix('.ack')
+
+    @property
+    def pending(self) -> int:
+        return self.records - self.acked
+
+
+class BufferStore:
+    """
+    Append-only store of newline-delimited JSON records in compressed
+    segment files.
+
+    Each segment is a single zlib stream primed with a dictionary built
+    from the sample schema. Records are sync-flushed as they are appended,
+    so every record is on disk (and readable) as soon as append() returns
+    while the stream still compresses against all earlier records in the
+    segment. Segments are sealed once they reach the target size.
+
+    Replay streams records back in order without loading a segment into
+    memory and remembers how far each segment has been acknowledged.
+    Size accounting is in compressed bytes on disk.
+    """
+
+    def __init__(self, directory: Path, max_size: int, segment_size: Optional[int] = None,
+                 compression_level: int = 6):
+        """
+        Initialize the store, picking up segments left by a previous run.
+
+        Args:
+            directory: Directory holding the segment files
+            max_size: Buffer budget in bytes
+            segment_size: Compressed size at which a segment is sealed.
+                          Defaults to 1/16 of max_size, capped at 1MB.
+            compression_level: zlib compression level
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.segment_size = segment_size or max(16 * 1024, min(1024 * 1024, max_size // 16))
+        self.compression_level = compression_level
+
+        self._segments: List[_Segment] = []
+        self._active: Optional[_Segment] = None
+        self._file = None
+        self._compressor = None
+        self._next_id = 1
+        # Bumped whenever existing segments are rewritten or removed
+        self._generation = 0
+
+        self._scan()
+
+    # -- bookkeeping -------------------------------------------------------
+
+    def _segment_path(self, segment_id: int) -> Path:
+        return self.directory / f"{SEGMENT_PREFIX}{segment_id:012d}{SEGMENT_SUFFIX}"
+
+    def _scan(self):
+        """Load metadata for existing segments."""
+        for path in sorted(self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")):
+            try:
+                segment_id = int(path.stem[len(SEGMENT_PREFIX):])
+                with open(path, 'rb') as f:
+                    magic, _, dictionary_version, records = HEADER.unpack(f.read(HEADER.size))
+                if magic != MAGIC or dictionary_version not in DICTIONARIES:
+                    raise ValueError("unrecognized segment header")
+
+                segment = _Segment(path, path.stat().st_size, records, 0, dictionary_version)
+                if records == 0:
+                    # Not sealed (previous run stopped while writing it)
+                    segment.records = sum(1 for _ in self._iter_segment(segment, 0))
+                segment.acked = self._read_ack(segment)
+            except (OSError, ValueError, struct.error, zlib.error) as e:
+                logger.error("Discarding unreadable buffer segment %s: %s", path, e)
+                self._remove_files(path)
+                continue
+
+            self._next_id = max(self._next_id, segment_id + 1)
+            if segment.pending > 0:
+                self._segments.append(segment)
+            else:
+                self._remove_files(path)
+
+    def _read_ack(self, segment: _Segment) -> int:
+        try:
+            return min(int(segment.ack_path.read_text()), segment.records)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_ack(self, segment: _Segment):
+        try:
+            segment.ack_path.write_text(str(segment.acked))
+        except OSError as e:
+            logger.error("Failed to record replay position for %s: %s", segment.path, e)
+
+    def _remove_files(self, path: Path):
+        for item in (path, path.with_suffix('.ack')):
+            try:
+                item.unlink()
+            except FileNotFoundError:
+                pass
+
+    # -- writing -----------------------------------------------------------
+
+    def _open_active(self):
+        path = self._segment_path(self._next_id)
+        self._next_id += 1
+
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, DICTIONARY_VERSION, 0))
+        self._compressor = zlib.compressobj(
+            self.compression_level, zlib.DEFLATED, zlib.MAX_WBITS, memLevel=9,
+            zdict=DICTIONARIES[DICTIONARY_VERSION]
+        )
+        self._active = _Segment(path, HEADER.size, 0, 0)
+        self._segments.append(self._active)
+
+    def append(self, record: bytes):
+        """
+        Append one encoded record (a JSON document without trailing newline).
+
+        Args:
+            record: Encoded record
+        """
+        if self._active is None:
+            self._open_active()
+
+        data = self._compressor.compress(record + b'\n')
+        data += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._file.write(data)
+        self._file.flush()
+
+        self._active.size += len(data)
+        self._active.records += 1
+
+        if self._active.size >= self.segment_size:
+            self._seal_active()
+
+    def _seal_active(self):
+        """Finish the active segment's stream and record its length."""
+        segment = self._active
+        self._file.write(self._compressor.flush(zlib.Z_FINISH))
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, FORMAT_VERSION, segment.dictionary_version,
+                                     segment.records))
+        self._file.close()
+        segment.size = segment.path.stat().st_size
+
+        self._file = None
+        self._compressor = None
+        self._active = None
+
+    def _discard_active(self):
+        """Drop the active segment without sealing it."""
+        self._file.close()
+        self._file = None
+        self._compressor = None
+        self._segments.remove(self._active)
+        self._remove_files(self._active.path)
+        self._active = None
+
+    def close(self):
+        """Seal the active segment and release file handles."""
+        self._generation += 1
+        if self._active is not None:
+            if self._active.records:
+                self._seal_active()
+            else:
+                self._discard_active()
+
+    # -- reading -----------------------------------------------------------
+
+    def _iter_segment(self, segment: _Segment, skip: int) -> Iterator[bytes]:
+        """Stream the records of a segment, skipping the first `skip`."""
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS,
+                                          zdict=DICTIONARIES[segment.dictionary_version])
+        index = 0
+        tail = b''
+        with open(segment.path, 'rb') as f:
+            f.seek(HEADER.size)
+            while True:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    break
+                lines = (tail + decompressor.decompress(chunk)).split(b'\n')
+                # The last piece is an incomplete record (or empty)
+                tail = lines.pop()
+                for line in lines:
+                    if index >= skip:
+                        yield line
+                    index += 1
+                if decompressor.eof:
+                    break
+        # A trailing partial record means the writer was interrupted; drop it
+
+    def iter_records(self) -> Iterator[bytes]:
+        """Stream all unacknowledged records, oldest first."""
+        for segment in list(self._segments):
+            yield from self._iter_segment(segment, segment.acked)
+
+    def replay(self, send: Callable[[List[bytes]], bool],
+               should_continue: Optional[Callable[[], bool]] = None,
+               batch_size: int = 1) -> int:
+        """
+        Send unacknowledged records oldest first until a batch fails.
+
+        `send` may let other threads use the store while it runs (the
+        sender appends and compacts from other threads). If the oldest
+        segments were rewritten or dropped meanwhile, replay stops without
+        acknowledging the batch; it is sent again next time.
+
+        Args:
+            send: Called with each batch of records, which never spans two
+                  segments; returns True once the batch is delivered
+            should_continue: Checked before each batch; replay stops when
+                             it returns False
+            batch_size: Records per batch
+
+        Returns:
+            Number of records delivered
+        """
+        delivered = 0
+
+        for segment in list(self._segments):
+            since_flush = 0
+            stopped = False
+            batch: List[bytes] = []
+            records = self._iter_segment(segment, segment.acked)
+
+            while True:
+                record = next(records, None)
+                if record is not None:
+                    batch.append(record)
+                    if len(batch) < batch_size:
+                        continue
+                if not batch:
+                    break
+
+                generation = self._generation
+                if (should_continue is not None and not should_continue()) or not send(batch):
+                    stopped = True
+                    break
+                if self._generation != generation:
+                    # Segments rewritten while sending; positions are stale
+                    records.close()
+                    return delivered
+                segment.acked += len(batch)
+                delivered += len(batch)
+                since_flush += len(batch)
+                batch = []
+                if since_flush >= ACK_FLUSH_EVERY:
+                    self._write_ack(segment)
+                    since_flush = 0
+                if record is None:
+                    break
+            records.close()
+
+            if segment.pending > 0 or stopped:
+                if since_flush:
+                    self._write_ack(segment)
+                break
+
+            # Fully delivered
+            if segment is self._active:
+                self._discard_active()
+            else:
+                self._segments.remove(segment)
+                self._remove_files(segment.path)
+
+        return delivered
+
+    # -- space management --------------------------------------------------
+
+    def compact(self, transform: Callable[[List[bytes]], List[bytes]],
+                fraction: float = 0.5) -> int:
+        """
+        Rewrite the oldest sealed segments through a transform.
+
+        Segments are processed one at a time, oldest first, until about
+        `fraction` of the stored bytes have been visited.
+
+        Args:
+            transform: Receives the pending records of one segment and
+                       returns the records to keep in their place
+            fraction: Share of the stored bytes to rewrite
+
+        Returns:
+            Number of bytes freed
+        """
+        self._generation += 1
+        budget = self.size * fraction
+        visited = 0
+        freed = 0
+
+        for segment in [s for s in self._segments if s is not self._active]:
+            if visited >= budget:
+                break
+            visited += segment.size
+
+            records = transform(list(self._iter_segment(segment, segment.acked)))
+            before = segment.size
+            if not records:
+                self._segments.remove(segment)
+                self._remove_files(segment.path)
+                freed += before
+                continue
+
+            tmp_path = segment.path.with_suffix('.tmp')
+            compressor = zlib.compressobj(
+                self.compression_level, zlib.DEFLATED, zlib.MAX_WBITS, memLevel=9,
+                zdict=DICTIONARIES[DICTIONARY_VERSION]
+            )
+            with open(tmp_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, DICTIONARY_VERSION, len(records)))
+                for record in records:
+                    f.write(compressor.compress(record + b'\n'))
+                f.write(compressor.flush(zlib.Z_FINISH))
+            tmp_path.replace(segment.path)
+            try:
+                segment.ack_path.unlink()
+            except FileNotFoundError:
+                pass
+
+            segment.size = segment.path.stat().st_size
+            segment.records = len(records)
+            segment.acked = 0
+            segment.dictionary_version = DICTIONARY_VERSION
+            freed += before - segment.size
+
+        return freed
+
+    def drop_oldest(self) -> int:
+        """
+        Delete the oldest segment.
+
+        Returns:
+            Number of records dropped
+        """
+        if not self._segments:
+            return 0
+
+        self._generation += 1
+        segment = self._segments[0]
+        if segment is self._active:
+            self._discard_active()
+        else:
+            self._segments.pop(0)
+            self._remove_files(segment.path)
+        return segment.pending
+
+    # -- stats -------------------------------------------------------------
+
+    @property
+    def size(self) -> int:
+        """Compressed bytes on disk."""
+        return sum(segment.size for segment in self._segments)
+
+    @property
+    def record_count(self) -> int:
+        """Number of unacknowledged records."""
+        return sum(segment.pending for segment in self._segments)
+
+    @property
+    def segment_count(self) -> int:
+        """Number of segment files."""
+        return len(self._segments)
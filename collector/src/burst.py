@@ -0,0 +1,375 @@
+"""
+High-frequency burst capture for incidents.
+
+A burst samples cheap cumulative counters (CPU times, memory, disk and
+network I/O totals) at a sub-second interval into a preallocated ring,
+then returns to normal cadence and uploads the whole capture to every
+sink as one gzip-compressed document.
+"""
+
+import gzip
+import logging
+import math
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import psutil
+
+from serializer import encode, format_timestamp
+
+
+logger = logging.getLogger(__name__)
+
+# Interval a throttled capture may back off to before it is stopped
+MAX_INTERVAL = 1.0
+
+# Seconds over which the capture's own CPU time is compared to its cap
+OVERHEAD_WINDOW = 1.0
+
+# Captures kept on disk when they could not be uploaded
+MAX_KEPT = 20
+
+
+def _probe_cpu() -> Tuple[float, ...]:
+    times = psutil.cpu_times()
+    return times.user, times.system, times.idle, getattr(times, 'iowait', 0.0)
+
+
+def _probe_memory() -> Tuple[float, ...]:
+    vmem = psutil.virtual_memory()
+    return vmem.used, vmem.available
+
+
+def _probe_disk() -> Tuple[float, ...]:
+    io = psutil.disk_io_counters(perdisk=False)
+    return io.read_bytes, io.write_bytes, io.read_count, io.write_count
+
+
+def _probe_network() -> Tuple[float, ...]:
+    io = psutil.net_io_counters(pernic=False)
+    return (io.bytes_sent, io.bytes_recv, io.packets_sent, io.packets_recv,
+            io.dropin, io.dropout)
+
+
+# Family -> (column names, probe). Values are raw counters; CPU times are
+# cumulative seconds, so consumers derive rates from consecutive rows.
+PROBES: Dict[str, Tuple[Tuple[str, ...], Callable[[], Sequence[float]]]] = {
+    'cpu': (('cpu.user', 'cpu.system', 'cpu.idle', 'cpu.iowait'), _probe_cpu),
+    'memory': (('memory.used', 'memory.available'), _probe_memory),
+    'disk': (('disk.read_bytes', 'disk.write_bytes', 'disk.read_count', 'disk.write_count'),
+             _probe_disk),
+    'network': (('network.bytes_sent', 'network.bytes_recv', 'network.packets_sent',
+                 'network.packets_recv', 'network.dropin', 'network.dropout'), _probe_network),
+}
+
+
+class BurstRing:
+    """Preallocated ring of fixed-width rows of floats."""
+
+    def __init__(self, capacity: int, width: int):
+        """
+        Initialize the ring.
+
+        Args:
+            capacity: Rows kept; older rows are overwritten
+            width: Values per row
+        """
+        self.capacity = capacity
+        self.width = width
+        self._data = array('d', [0.0]) * (capacity * width)
+        # Rows appended since the last clear()
+        self.count = 0
+
+    @property
+    def dropped(self) -> int:
+        """Rows overwritten since the last clear()."""
+        return max(0, self.count - self.capacity)
+
+    def clear(self):
+        self.count = 0
+
+    def append(self, row: Sequence[float]):
+        """Store a row, overwriting the oldest one when full."""
+        data = self._data
+        offset = (self.count % self.capacity) * self.width
+        for value in row:
+            data[offset] = value
+            offset += 1
+        self.count += 1
+
+    def columns(self) -> List[List[float]]:
+        """
+        Get the stored rows as columns.
+
+        Returns:
+            One list per column, oldest row first
+        """
+        width = self.width
+        rows = min(self.count, self.capacity)
+        data = self._data[:rows * width]
+        if self.count > self.capacity:
+            split = (self.count % self.capacity) * width
+            data = data[split:] + data[:split]
+        return [data[column::width].tolist() for column in range(width)]
+
+
+class BurstCapture:
+    """
+    Runs burst captures on a background thread.
+
+    start() begins a capture or extends the running one. The capture's own
+    CPU time is measured per probe; above the max_overhead budget the
+    sampling interval is doubled (and relaxed again once it falls well
+    below), and a capture that is still over budget at MAX_INTERVAL ends
+    early.
+    """
+
+    def __init__(self, config, sender):
+        """
+        Initialize burst capture.
+
+        Args:
+            config: Configuration object
+            sender: MetricsSender used to upload finished captures
+        """
+        self.sender = sender
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # Capture thread; it stays set while a finished capture uploads
+        self._thread: Optional[threading.Thread] = None
+        self._active = False
+        self._deadline = 0.0
+        self._trigger = ''
+        self._ring: Optional[BurstRing] = None
+        self.apply_config(config)
+
+    @property
+    def active(self) -> bool:
+        """Whether a capture is running."""
+        return self._active
+
+    def apply_config(self, config):
+        """
+        Apply burst settings from a configuration.
+
+        The ring is resized immediately unless a capture is running, in
+        which case the new size takes effect with the next capture.
+
+        Args:
+            config: Configuration object
+        """
+        self.hostname = config.hostname
+        self.interval = max(0.01, float(config.get('burst', 'interval', default=0.1)))
+        self.duration = max(self.interval, float(config.get('burst', 'duration', default=180)))
+        # Percent of one CPU
+        self.max_overhead = float(config.get('burst', 'max_overhead', default=2)) / 100
+        self.dir = Path(config.get('burst', 'dir', default='./burst'))
+
+        families = config.get('burst', 'families', default=None) or list(PROBES)
+        columns = ['timestamp']
+        probes = []
+        for family in families:
+            if family not in PROBES:
+                logger.warning("Unknown burst capture family %r ignored", family)
+                continue
+            names, probe = PROBES[family]
+            try:
+                probe()
+            except Exception as e:
+                # e.g. no disk I/O counters inside some containers
+                logger.info("Burst capture of %s unavailable: %s", family, e)
+                continue
+            columns.extend(names)
+            probes.append(probe)
+
+        with self._lock:
+            self._columns = tuple(columns)
+            self._probes = tuple(probes)
+            if not self.active:
+                self._allocate()
+
+    def _allocate(self):
+        """Preallocate the ring for the configured duration and columns."""
+        capacity = math.ceil(self.duration / self.interval) + 1
+        width = len(self._columns)
+        ring = self._ring
+        if ring is None or ring.capacity != capacity or ring.width != width:
+            self._ring = BurstRing(capacity, width)
+
+    def start(self, duration: Optional[float] = None, trigger: str = 'manual') -> bool:
+        """
+        Start a capture, or extend the running one.
+
+        Args:
+            duration: Seconds to capture (default: burst.duration)
+            trigger: What requested the capture (signal, cli, http), for logs
+                     and the uploaded document
+
+        Returns:
+            True if a capture was started, False if one was extended
+        """
+        duration = self.duration if not duration or duration <= 0 else float(duration)
+        deadline = time.monotonic() + duration
+
+        with self._lock:
+            if self.active:
+                self._deadline = max(self._deadline, deadline)
+                logger.info("Burst capture extended by %s (%gs)", trigger, duration)
+                return False
+
+            self._allocate()
+            self._ring.clear()
+            self._stop.clear()
+            self._deadline = deadline
+            self._trigger = trigger
+            self._active = True
+            self._thread = threading.Thread(
+                target=self._run, args=(self._ring, self._columns, self._probes),
+                name='burst', daemon=True
+            )
+            self._thread.start()
+
+        logger.warning("Burst capture started by %s: %gs at %sms intervals",
+                       trigger, duration, round(self.interval * 1000))
+        return True
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        End a running capture early and wait for its upload.
+
+        Args:
+            timeout: Seconds to wait (None waits until done)
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout)
+
+    def _run(self, ring: BurstRing, columns: Tuple[str, ...],
+             probes: Tuple[Callable[[], Sequence[float]], ...]):
+        """Sample until the deadline, then finish the capture."""
+        interval = self.interval
+        thread_time = time.thread_time
+
+        cpu_total = 0.0
+        max_probe = 0.0
+        throttled = 0
+        max_interval = interval
+        over_budget = False
+
+        started = time.time()
+        start = window_start = next_run = time.monotonic()
+        window_cpu = 0.0
+
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= self._deadline:
+                break
+            if next_run > now:
+                self._stop.wait(next_run - now)
+                continue
+
+            began = thread_time()
+            row = [time.time()]
+            for probe in probes:
+                row.extend(probe())
+            ring.append(row)
+            cost = thread_time() - began
+
+            cpu_total += cost
+            window_cpu += cost
+            max_probe = max(max_probe, cost)
+
+            # Keep the capture's own CPU use under its budget
+            now = time.monotonic()
+            if now - window_start >= OVERHEAD_WINDOW:
+                overhead = window_cpu / (now - window_start)
+                if overhead > self.max_overhead:
+                    if interval >= MAX_INTERVAL:
+                        logger.warning("Burst capture over its %.1f%% CPU budget at %.1fs "
+                                       "intervals, ending early", self.max_overhead * 100,
+                                       interval)
+                        over_budget = True
+                        break
+                    interval = min(interval * 2, MAX_INTERVAL)
+                    max_interval = max(max_interval, interval)
+                    throttled += 1
+                    logger.warning("Burst capture used %.1f%% CPU (budget %.1f%%), "
+                                   "interval raised to %sms", overhead * 100,
+                                   self.max_overhead * 100, round(interval * 1000))
+                elif overhead < self.max_overhead / 4 and interval > self.interval:
+                    interval = max(self.interval, interval / 2)
+                window_start = now
+                window_cpu = 0.0
+
+            next_run += interval
+            if next_run <= now:
+                # Missed ticks are skipped, not sampled in a burst
+                next_run += (int((now - next_run) // interval) + 1) * interval
+
+        elapsed = max(time.monotonic() - start, 1e-9)
+        document = {
+            'type': 'burst',
+            'hostname': self.hostname,
+            'trigger': self._trigger,
+            'started': format_timestamp(started),
+            'ended': format_timestamp(started + elapsed),
+            'interval': self.interval,
+            'columns': list(columns),
+            'values': ring.columns(),
+            'dropped_rows': ring.dropped,
+            'overhead': {
+                'cpu_seconds': round(cpu_total, 6),
+                'percent': round(cpu_total / elapsed * 100, 3),
+                'max_probe_ms': round(max_probe * 1000, 3),
+                'throttled': throttled,
+                'max_interval': max_interval,
+                'over_budget': over_budget,
+            },
+        }
+        name = time.strftime('burst-%Y%m%dT%H%M%SZ.json.gz', time.gmtime(started))
+
+        # The document holds copies, so the ring is free for the next capture
+        with self._lock:
+            self._active = False
+
+        logger.warning("Burst capture finished: %s samples in %.1fs, %.2f%% CPU",
+                       ring.count, elapsed, document['overhead']['percent'])
+        self._finish(name, document)
+
+    def _finish(self, name: str, document: Dict[str, Any]):
+        """Compress a finished capture, keep it on disk and upload it."""
+        data = gzip.compress(encode(document), compresslevel=6)
+
+        path = self.dir / name
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+        except OSError as e:
+            logger.error("Failed to save burst capture %s: %s", path, e)
+            path = None
+
+        try:
+            failed = self.sender.upload_capture(name, data)
+        except Exception as e:
+            logger.error("Error uploading burst capture %s: %s", name, e)
+            failed = ['all']
+
+        if path is None:
+            return
+        if not failed:
+            path.unlink()
+            return
+
+        logger.warning("Burst capture %s not accepted by sink(s) %s, kept at %s",
+                       name, ', '.join(failed), path)
+        kept = sorted(self.dir.glob('burst-*.json.gz'))
+        for old in kept[:-MAX_KEPT]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
@@ -4,13 +4,268 @@ Configuration loader for the metrics collector.
 
 import os
 import re
+import socket
 import yaml
-from typing import Any, Dict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, Tuple
 from pathlib import Path
 
+from cpu_engine import PER_CPU_MODES
+
+
+# ${VAR_NAME} pattern, compiled on first use
+_ENV_VAR_PATTERN = None
+
+# Prefer the libyaml-backed loader when available; it parses several times faster
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+METRIC_TYPES = ('cpu', 'memory', 'disk', 'network')
+
+SINK_TYPES = ('http', 'file')
+
+# Name of the sink built from collector.server_url when no sinks are listed
+DEFAULT_SINK = 'default'
+
+
+def _freeze(value: Any) -> Any:
+    """Recursively convert dicts and lists into read-only equivalents."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _resolve_sinks(sinks: Any, server_url: Any, api_key: str, buffer_dir: Path,
+                   buffer_max_size: float) -> Tuple[Mapping[str, Any], ...]:
+    """
+    Validate the sink list and fill in per-sink defaults.
+
+    Without a `sinks` section the collector sends to collector.server_url
+    and buffers in collector.buffer_dir, as before sinks existed.
+    """
+    if not sinks:
+        if server_url is None:
+            raise ValueError("Missing required configuration: collector.server_url")
+        sinks = ({'name': DEFAULT_SINK, 'type': 'http', 'url': server_url,
+                  'api_key': api_key, 'buffer_dir': buffer_dir},)
+    elif not isinstance(sinks, tuple):
+        raise ValueError("sinks must be a list")
+
+    resolved = []
+    names = set()
+    for index, sink in enumerate(sinks):
+        if not isinstance(sink, Mapping):
+            raise ValueError(f"sinks[{index}] must be a mapping")
+        spec = dict(sink)
+
+        name = spec.get('name')
+        if not name or not isinstance(name, str):
+            raise ValueError(f"sinks[{index}].name is required")
+        if name in names:
+            raise ValueError(f"Duplicate sink name: {name}")
+        names.add(name)
+
+        sink_type = spec.setdefault('type', 'http')
+        if sink_type not in SINK_TYPES:
+            raise ValueError(f"sinks[{index}].type must be one of {', '.join(SINK_TYPES)}, "
+                             f"got {sink_type!r}")
+        if sink_type == 'http' and not spec.get('url'):
+            raise ValueError(f"sinks[{index}].url is required for http sinks")
+        if sink_type == 'file' and not spec.get('path'):
+            raise ValueError(f"sinks[{index}].path is required for file sinks")
+
+        batch_size = spec.setdefault('batch_size', 1)
+        if isinstance(batch_size, bool) or not isinstance(batch_size, int) or batch_size < 1:
+            raise ValueError(f"sinks[{index}].batch_size must be a positive integer, "
+                             f"got {batch_size!r}")
+
+        window = spec.setdefault('window', 1)
+        if isinstance(window, bool) or not isinstance(window, int) or window < 1:
+            raise ValueError(f"sinks[{index}].window must be a positive integer, "
+                             f"got {window!r}")
+
+        spec['buffer_dir'] = Path(spec.get('buffer_dir') or buffer_dir / name)
+        spec.setdefault('buffer_max_size', buffer_max_size)
+        resolved.append(MappingProxyType(spec))
+
+    return tuple(resolved)
+
+
+def _flatten(value: Mapping, prefix: Tuple[str, ...], out: Dict[Tuple[str, ...], Any]):
+    """Index every nested key path of a frozen mapping."""
+    for key, item in value.items():
+        path = prefix + (key,)
+        out[path] = item
+        if isinstance(item, Mapping):
+            _flatten(item, path, out)
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    Validated, immutable view of one configuration load.
+
+    All lookups the collector needs per tick are resolved here once, so a
+    reload only has to swap a single reference.
+    """
+
+    raw: Mapping[str, Any]
+    values: Mapping[Tuple[str, ...], Any]
+    collector_interval: int
+    server_url: str
+    api_key: str
+    hostname: str
+    buffer_dir: Path
+    buffer_max_size: int
+    enabled_metrics: FrozenSet[str]
+    metric_intervals: Mapping[str, int]
+    log_level: str
+    log_file: str
+    sinks: Tuple[Mapping[str, Any], ...]
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> 'ConfigSnapshot':
+        """
+        Build a snapshot from parsed configuration data.
+
+        Args:
+            config: Parsed YAML configuration
+
+        Returns:
+            ConfigSnapshot instance
+
+        Raises:
+            ValueError: If required fields are missing or have invalid values
+        """
+        if not isinstance(config, dict):
+            raise ValueError("Configuration must be a mapping")
+
+        raw = _freeze(config)
+        values: Dict[Tuple[str, ...], Any] = {}
+        _flatten(raw, (), values)
+
+        def get(*keys, default=None):
+            return values.get(keys, default)
+
+        if ('collector', 'interval') not in values:
+            raise ValueError("Missing required configuration: collector.interval")
+
+        interval = get('collector', 'interval')
+        if isinstance(interval, bool) or not isinstance(interval, int) or interval <= 0:
+            raise ValueError(f"collector.interval must be a positive integer, got {interval!r}")
+
+        buffer_max_size = get('collector', 'buffer_max_size', default=100)
+        if isinstance(buffer_max_size, bool) or not isinstance(buffer_max_size, (int, float)) \
+                or buffer_max_size < 0:
+            raise ValueError(f"collector.buffer_max_size must be a non-negative number, "
+                             f"got {buffer_max_size!r}")
+
+        jitter = get('collector', 'jitter', default=0)
+        if isinstance(jitter, bool) or not isinstance(jitter, (int, float)) or jitter < 0:
+            raise ValueError(f"collector.jitter must be a non-negative number, got {jitter!r}")
+
+        budget = get('profiler', 'budget', default=2.0)
+        if isinstance(budget, bool) or not isinstance(budget, (int, float)) or budget <= 0:
+            raise ValueError(f"profiler.budget must be a positive number, got {budget!r}")
+
+        max_files = get('profiler', 'max_files', default=50)
+        if isinstance(max_files, bool) or not isinstance(max_files, int) or max_files < 1:
+            raise ValueError(f"profiler.max_files must be a positive integer, got {max_files!r}")
+
+        hostname = get('collector', 'hostname', default='')
+        if not hostname:
+            hostname = socket.gethostname()
+
+        metric_intervals = {}
+        for metric_type in METRIC_TYPES:
+            metric_interval = get('metrics', metric_type, 'interval', default=0) or interval
+            if isinstance(metric_interval, bool) or not isinstance(metric_interval, int) \
+                    or metric_interval < 0:
+                raise ValueError(f"metrics.{metric_type}.interval must be a non-negative "
+                                 f"integer, got {metric_interval!r}")
+            metric_intervals[metric_type] = metric_interval
+
+        per_cpu_mode = get('metrics', 'cpu', 'per_cpu_mode', default='usage')
+        if per_cpu_mode not in PER_CPU_MODES:
+            raise ValueError(f"metrics.cpu.per_cpu_mode must be one of "
+                             f"{', '.join(PER_CPU_MODES)}, got {per_cpu_mode!r}")
+
+        top_cores = get('metrics', 'cpu', 'top_cores', default=5)
+        if isinstance(top_cores, bool) or not isinstance(top_cores, int) or top_cores < 0:
+            raise ValueError(f"metrics.cpu.top_cores must be a non-negative integer, "
+                             f"got {top_cores!r}")
+
+        groups = get('metrics', 'network', 'groups', default={}) or {}
+        if not isinstance(groups, Mapping):
+            raise ValueError("metrics.network.groups must be a mapping")
+        for group, patterns in groups.items():
+            if isinstance(patterns, str):
+                patterns = (patterns,)
+            if not isinstance(patterns, tuple) or not patterns \
+                    or not all(isinstance(pattern, str) for pattern in patterns):
+                raise ValueError(f"metrics.network.groups.{group} must be a pattern or a "
+                                 f"non-empty list of patterns, got {patterns!r}")
+
+        max_interfaces = get('metrics', 'network', 'max_interfaces', default=32)
+        if isinstance(max_interfaces, bool) or not isinstance(max_interfaces, int) \
+                or max_interfaces < 0:
+            raise ValueError(f"metrics.network.max_interfaces must be a non-negative integer, "
+                             f"got {max_interfaces!r}")
+
+        state_ttl = get('metrics', 'network', 'state_ttl', default=60)
+        if isinstance(state_ttl, bool) or not isinstance(state_ttl, (int, float)) \
+                or state_ttl <= 0:
+            raise ValueError(f"metrics.network.state_ttl must be a positive number, "
+                             f"got {state_ttl!r}")
+
+        if isinstance(raw.get('shared_memory'), Mapping):
+            # Imported only when configured, as the collector itself does
+            from shared_state import (DEFAULT_MAX_CORES, DEFAULT_MAX_INTERFACES,
+                                      DEFAULT_MAX_PARTITIONS)
+            capacities = {'max_cores': DEFAULT_MAX_CORES,
+                          'max_partitions': DEFAULT_MAX_PARTITIONS,
+                          'max_interfaces': DEFAULT_MAX_INTERFACES}
+            for key, default in capacities.items():
+                capacity = get('shared_memory', key, default=default)
+                if isinstance(capacity, bool) or not isinstance(capacity, int) or capacity <= 0:
+                    raise ValueError(f"shared_memory.{key} must be a positive integer, "
+                                     f"got {capacity!r}")
+
+        server_url = get('collector', 'server_url')
+        api_key = get('collector', 'api_key', default='') or ''
+        buffer_dir = Path(get('collector', 'buffer_dir', default='./buffer'))
+        sinks = _resolve_sinks(get('sinks'), server_url, api_key, buffer_dir, buffer_max_size)
+
+        return cls(
+            raw=raw,
+            values=MappingProxyType(values),
+            collector_interval=interval,
+            server_url=str(server_url or ''),
+            api_key=api_key,
+            hostname=str(hostname),
+            buffer_dir=buffer_dir,
+            buffer_max_size=buffer_max_size,
+            enabled_metrics=frozenset(
+                metric_type for metric_type in METRIC_TYPES
+                if get('metrics', metric_type, 'enabled', default=False)
+            ),
+            metric_intervals=MappingProxyType(metric_intervals),
+            log_level=str(get('logging', 'level', default='INFO')),
+            log_file=get('logging', 'file', default='') or '',
+            sinks=sinks,
+        )
+
 
 class Config:
-    """Configuration manager for the collector."""
+    """
+    Configuration manager for the collector.
+
+    The loaded configuration is held as an immutable ConfigSnapshot.
+    reload() builds a new snapshot from the file and swaps it in with a
+    single assignment, so readers never see a partially applied reload.
+    """
 
     def __init__(self, config_path: str = None):
         """
@@ -26,8 +281,35 @@ class Config:
             config_path = base_dir / "config" / "collector-config.yaml"
 
         self.config_path = Path(config_path)
-        self.config = self._load_config()
-        self._validate_config()
+        self._snapshot = ConfigSnapshot.from_dict(self._load_config())
+
+    def reload(self) -> ConfigSnapshot:
+        """
+        Re-read the configuration file and swap in a new snapshot.
+
+        The current snapshot is kept if the file cannot be loaded or fails
+        validation.
+
+        Returns:
+            The newly active snapshot
+
+        Raises:
+            FileNotFoundError: If the configuration file no longer exists
+            ValueError: If the new configuration is invalid
+        """
+        snapshot = ConfigSnapshot.from_dict(self._load_config())
+        self._snapshot = snapshot
+        return snapshot
+
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """Get the currently active configuration snapshot."""
+        return self._snapshot
+
+    @property
+    def config(self) -> Mapping[str, Any]:
+        """Get the raw (read-only) configuration tree."""
+        return self._snapshot.raw
 
     def _load_config(self) -> Dict[str, Any]:
         """Load and parse the YAML configuration file."""
@@ -40,7 +322,7 @@ class Config:
         # Replace environment variables
         config_text = self._replace_env_vars(config_text)
 
-        config = yaml.safe_load(config_text)
+        config = yaml.load(config_text, Loader=_YAML_LOADER)
         return config
 
     def _replace_env_vars(self, text: str) -> str:
@@ -53,7 +335,14 @@ class Config:
         Returns:
             Text with environment variables replaced
         """
-        pattern = r'\$\{([^}]+)\}'
+        global _ENV_VAR_PATTERN
+
+        # Most configs reference no variables; skip the regex pass entirely
+        if '${' not in text:
+            return text
+
+        if _ENV_VAR_PATTERN is None:
+            _ENV_VAR_PATTERN = re.compile(r'\$\{([^}]+)\}')
 
         def replace(match):
             var_name = match.group(1)
@@ -63,24 +352,7 @@ class Config:
                 return match.group(0)
             return value
 
-        return re.sub(pattern, replace, text)
-
-    def _validate_config(self):
-        """Validate required configuration fields."""
-        required_fields = [
-            ('collector', 'interval'),
-            ('collector', 'server_url'),
-        ]
-
-        for *path, field in required_fields:
-            config_section = self.config
-            for key in path:
-                if key not in config_section:
-                    raise ValueError(f"Missing required configuration: {'.'.join(path)}.{field}")
-                config_section = config_section[key]
-
-            if field not in config_section:
-                raise ValueError(f"Missing required configuration: {'.'.join(path)}.{field}")
+        return _ENV_VAR_PATTERN.sub(replace, text)
 
     def get(self, *keys, default=None):
         """
@@ -91,49 +363,40 @@ class Config:
             default: Default value if key not found
 
         Returns:
-            Configuration value or default
+            Configuration value or default. Sections are returned as
+            read-only mappings and lists as tuples.
         """
-        value = self.config
-        for key in keys:
-            if not isinstance(value, dict) or key not in value:
-                return default
-            value = value[key]
-        return value
+        return self._snapshot.values.get(keys, default)
 
     @property
     def collector_interval(self) -> int:
         """Get collector interval in seconds."""
-        return self.get('collector', 'interval', default=5)
+        return self._snapshot.collector_interval
 
     @property
     def server_url(self) -> str:
         """Get API server URL."""
-        return self.get('collector', 'server_url')
+        return self._snapshot.server_url
 
     @property
     def api_key(self) -> str:
         """Get API key."""
-        return self.get('collector', 'api_key', default='')
+        return self._snapshot.api_key
 
     @property
     def hostname(self) -> str:
-        """Get hostname or auto-detect."""
-        hostname = self.get('collector', 'hostname', default='')
-        if not hostname:
-            import socket
-            hostname = socket.gethostname()
-        return hostname
+        """Get hostname (auto-detected once per load if not configured)."""
+        return self._snapshot.hostname
 
     @property
     def buffer_dir(self) -> Path:
         """Get buffer directory path."""
-        buffer_dir = self.get('collector', 'buffer_dir', default='./buffer')
-        return Path(buffer_dir)
+        return self._snapshot.buffer_dir
 
     @property
     def buffer_max_size(self) -> int:
         """Get buffer max size in MB."""
-        return self.get('collector', 'buffer_max_size', default=100)
+        return self._snapshot.buffer_max_size
 
     def is_metric_enabled(self, metric_type: str) -> bool:
         """
@@ -145,7 +408,7 @@ class Config:
         Returns:
             True if enabled, False otherwise
         """
-        return self.get('metrics', metric_type, 'enabled', default=False)
+        return metric_type in self._snapshot.enabled_metrics
 
     def get_metric_interval(self, metric_type: str) -> int:
         """
@@ -157,17 +420,19 @@ class Config:
         Returns:
             Interval in seconds
         """
-        interval = self.get('metrics', metric_type, 'interval', default=0)
-        if interval == 0:
-            interval = self.collector_interval
-        return interval
+        return self._snapshot.metric_intervals.get(metric_type, self._snapshot.collector_interval)
+
+    @property
+    def sinks(self) -> Tuple[Mapping[str, Any], ...]:
+        """Get the validated sink definitions, with defaults filled in."""
+        return self._snapshot.sinks
 
     @property
     def log_level(self) -> str:
         """Get logging level."""
-        return self.get('logging', 'level', default='INFO')
+        return self._snapshot.log_level
 
     @property
     def log_file(self) -> str:
         """Get log file path."""
-        return self.get('logging', 'file', default='')
+        return self._snapshot.log_file
@@ -0,0 +1,153 @@
+"""
+Per-core CPU engine.
+
+Each tick reads every core's cumulative times once (one /proc/stat read
+on Linux) into a flat array, core-major with one value per mode. The
+difference to the previous read is turned into percentages a mode column
+at a time, so the work per tick is a fixed number of passes over the
+array regardless of how the results are reported.
+"""
+
+import math
+from array import array
+from operator import sub
+from typing import List, Optional, Sequence, Tuple
+
+
+# Modes per core in the flat arrays, in /proc/stat order (guest time is
+# already included in user and nice)
+CPU_MODES = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+MODE_COUNT = len(CPU_MODES)
+IDLE = CPU_MODES.index('idle')
+IOWAIT = CPU_MODES.index('iowait')
+
+# Modes reported per core; idle is 100 - usage - iowait
+CORE_MODES = tuple(mode for mode in CPU_MODES if mode != 'idle')
+
+# Per-core reporting (metrics.cpu.per_cpu_mode): per-core usage list,
+# fixed-size summary, or usage plus every mode per core
+PER_CPU_MODES = ('usage', 'summary', 'full')
+
+# Per-core usage quantiles in summaries
+QUANTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+
+# Per-core usage statistics in summaries, in CpuMetrics.summary order
+SUMMARY_STATS = ('min',) + tuple(name for name, _ in QUANTILES) + ('max', 'mean')
+
+# Summary histogram buckets: cores per 10% of usage, the last one
+# including 100%
+HISTOGRAM_BUCKETS = 10
+
+
+class CpuUsage:
+    """Percentages for one tick: the whole system and each core."""
+
+    __slots__ = ('total', 'modes', 'cores', 'core_modes')
+
+    def __init__(self, total: float, modes: Tuple[float, ...], cores: array,
+                 core_modes: Tuple[array, ...]):
+        # Busy percentage and CPU_MODES percentages of the whole system
+        self.total = total
+        self.modes = modes
+        # Busy percentage per core, and one column per CPU_MODES entry
+        self.cores = cores
+        self.core_modes = core_modes
+
+
+def _percentages(deltas: Sequence[float], totals: Sequence[float]) -> array:
+    return array('d', [round(max(0.0, delta) * 100.0 / total, 1) if total > 0 else 0.0
+                       for delta, total in zip(deltas, totals)])
+
+
+class PerCoreEngine:
+    """Turns successive cumulative CPU time reads into percentages."""
+
+    def __init__(self):
+        self._prev_total: Optional[Sequence[float]] = None
+        self._prev_cores: Optional[array] = None
+
+    @property
+    def primed(self) -> bool:
+        """Whether a previous read is stored to compute the next tick against."""
+        return self._prev_total is not None
+
+    def update(self, total: Sequence[float], cores: array) -> Optional[CpuUsage]:
+        """
+        Store a read and compute percentages since the previous one.
+
+        Args:
+            total: Cumulative CPU_MODES times of the whole system
+            cores: Cumulative CPU_MODES times per core, core-major
+
+        Returns:
+            CpuUsage, or None for the first read (or after the number of
+            cores changed)
+        """
+        prev_total, prev_cores = self._prev_total, self._prev_cores
+        self._prev_total, self._prev_cores = total, cores
+        if prev_total is None or len(prev_cores) != len(cores):
+            return None
+
+        # System
+        deltas = [max(0.0, value) for value in map(sub, total, prev_total)]
+        elapsed = sum(deltas)
+        modes = tuple(_percentages(deltas, (elapsed,) * MODE_COUNT))
+        busy = elapsed - deltas[IDLE] - deltas[IOWAIT]
+        system = round(max(0.0, busy) * 100.0 / elapsed, 1) if elapsed > 0 else 0.0
+
+        # Cores: one column per mode, then totals across the columns
+        deltas = list(map(sub, cores, prev_cores))
+        columns = [deltas[mode::MODE_COUNT] for mode in range(MODE_COUNT)]
+        totals = [sum(values) for values in zip(*columns)]
+        idle = [a + b for a, b in zip(columns[IDLE], columns[IOWAIT])]
+        usage = _percentages([t - i for t, i in zip(totals, idle)], totals)
+        core_modes = tuple(_percentages(column, totals) for column in columns)
+
+        return CpuUsage(system, modes, usage, core_modes)
+
+
+def quantile(ordered: Sequence[float], fraction: float) -> float:
+    """Nearest-rank quantile of sorted values."""
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(usage: CpuUsage, top: int) -> Tuple:
+    """
+    Reduce per-core percentages to a fixed-size summary.
+
+    Args:
+        usage: Percentages from PerCoreEngine.update()
+        top: Number of hottest cores to list
+
+    Returns:
+        (usage stats, histogram, hottest cores, per-mode stats) as stored in
+        CpuMetrics.summary: usage stats are (min, p50, p90, p99, max, mean),
+        hottest cores are (core, usage) pairs, per-mode stats are one
+        (mean, max) pair per CORE_MODES entry
+    """
+    cores = usage.cores
+    count = len(cores)
+    ordered = sorted(cores)
+
+    stats = (
+        (ordered[0] if ordered else 0.0,)
+        + tuple(quantile(ordered, fraction) for _, fraction in QUANTILES)
+        + (ordered[-1] if ordered else 0.0,
+           round(sum(cores) / count, 1) if count else 0.0)
+    )
+
+    histogram: List[int] = [0] * HISTOGRAM_BUCKETS
+    for value in cores:
+        histogram[min(int(value * HISTOGRAM_BUCKETS / 100.0), HISTOGRAM_BUCKETS - 1)] += 1
+
+    hottest = sorted(range(count), key=cores.__getitem__, reverse=True)[:top]
+
+    modes = tuple(
+        (round(sum(column) / count, 1) if count else 0.0, max(column, default=0.0))
+        for mode, column in zip(CPU_MODES, usage.core_modes) if mode != 'idle'
+    )
+
+    return stats, tuple(histogram), tuple((core, cores[core]) for core in hottest), modes
@@ -0,0 +1,318 @@
+"""
+Prometheus-style pull endpoint serving the most recent collected sample.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds a client may take to send its request
+REQUEST_TIMEOUT = 5
+
+# Local endpoint starting a burst capture (POST, optional ?duration=SECONDS)
+BURST_PATH = b'/burst'
+
+# Families are always rendered in this order so the output is stable
+FAMILY_ORDER = ('cpu', 'memory', 'disk', 'network')
+
+
+def _escape(value: Any) -> str:
+    """Escape a label value for the text exposition format."""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    """Format a label set."""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class _FamilyWriter:
+    """
+    Accumulates exposition lines grouped by metric name.
+
+    Samples of one metric may be added between samples of others (one
+    interface's counters, then the next interface's); the exposition
+    format needs each metric as one block under its HELP/TYPE, so lines are
+    kept per name and joined in first-seen order.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, List[str]] = {}
+
+    def add(self, name: str, metric_type: str, help_text: str, value: Any,
+            labels: Optional[Dict[str, Any]] = None):
+        if value is None:
+            return
+        lines = self._metrics.get(name)
+        if lines is None:
+            lines = self._metrics[name] = [f'# HELP {name} {help_text}',
+                                           f'# TYPE {name} {metric_type}']
+        lines.append(f'{name}{_labels(labels)} {float(value)!r}')
+
+    @property
+    def lines(self) -> List[str]:
+        return [line for lines in self._metrics.values() for line in lines]
+
+
+def render_cpu(cpu: Dict[str, Any], out: _FamilyWriter):
+    """Render CPU metrics."""
+    for mode, value in cpu.get('usage', {}).items():
+        out.add('system_cpu_usage_percent', 'gauge', 'CPU usage by mode.', value, {'mode': mode})
+
+    cores = cpu.get('cores')
+    if cores:
+        for index, value in enumerate(cores.get('usage') or []):
+            out.add('system_cpu_core_usage_percent', 'gauge', 'Per-core CPU usage.', value,
+                    {'core': index})
+        for mode, values in (cores.get('modes') or {}).items():
+            for index, value in enumerate(values):
+                out.add('system_cpu_core_mode_percent', 'gauge', 'Per-core CPU time by mode.',
+                        value, {'core': index, 'mode': mode})
+
+        summary = cores.get('summary')
+        if summary:
+            for stat, value in summary.get('usage', {}).items():
+                out.add('system_cpu_core_usage_summary_percent', 'gauge',
+                        'Per-core CPU usage statistics across cores.', value, {'stat': stat})
+            for bucket, count in enumerate(summary.get('histogram') or []):
+                out.add('system_cpu_cores_by_usage', 'gauge',
+                        'Cores per 10% CPU usage bucket.', count,
+                        {'usage': f'{bucket * 10}-{bucket * 10 + 10}'})
+            for top in summary.get('top') or []:
+                out.add('system_cpu_core_usage_percent', 'gauge', 'Per-core CPU usage.',
+                        top.get('usage'), {'core': top.get('core')})
+            for mode, stats in (summary.get('modes') or {}).items():
+                for stat, value in stats.items():
+                    out.add('system_cpu_core_mode_summary_percent', 'gauge',
+                            'Per-core CPU time by mode, across cores.', value,
+                            {'mode': mode, 'stat': stat})
+
+        out.add('system_cpu_cores', 'gauge', 'Number of logical CPUs.', cores.get('count'))
+
+    for period, value in cpu.get('load', {}).get('average', {}).items():
+        out.add('system_load_average', 'gauge', 'System load average.', value, {'period': period})
+
+
+def render_memory(memory: Dict[str, Any], out: _FamilyWriter):
+    """Render memory metrics."""
+    for kind in ('total', 'used', 'available', 'free', 'buffers', 'cached'):
+        if kind in memory:
+            out.add('system_memory_bytes', 'gauge', 'Memory by type.', memory[kind], {'type': kind})
+    out.add('system_memory_usage_percent', 'gauge', 'Memory usage.',
+            memory.get('usage', {}).get('percent'))
+
+    swap = memory.get('swap', {})
+    for kind in ('total', 'used', 'free'):
+        if kind in swap:
+            out.add('system_swap_bytes', 'gauge', 'Swap by type.', swap[kind], {'type': kind})
+    out.add('system_swap_usage_percent', 'gauge', 'Swap usage.', swap.get('usage', {}).get('percent'))
+
+
+def render_disk(disk: Dict[str, Any], out: _FamilyWriter):
+    """Render disk metrics."""
+    for partition in disk.get('partitions', []):
+        labels = {
+            'device': partition.get('device'),
+            'mountpoint': partition.get('mountpoint'),
+            'fstype': partition.get('fstype'),
+        }
+        usage = partition.get('usage', {})
+        for kind in ('total', 'used', 'free'):
+            if kind in usage:
+                out.add('system_disk_bytes', 'gauge', 'Filesystem space by type.', usage[kind],
+                        dict(labels, type=kind))
+        out.add('system_disk_usage_percent', 'gauge', 'Filesystem space usage.',
+                usage.get('percent'), labels)
+
+        inode = partition.get('inode')
+        if inode:
+            for kind in ('total', 'used', 'free'):
+                out.add('system_disk_inodes', 'gauge', 'Filesystem inodes by type.', inode.get(kind),
+                        dict(labels, type=kind))
+
+    for direction, rates in disk.get('io', {}).items():
+        out.add('system_disk_io_bytes_per_second', 'gauge', 'Disk throughput.', rates.get('bytes'),
+                {'direction': direction})
+        out.add('system_disk_io_ops_per_second', 'gauge', 'Disk operations rate.', rates.get('count'),
+                {'direction': direction})
+
+
+def render_network(network: Dict[str, Any], out: _FamilyWriter):
+    """Render network metrics."""
+    for iface in network.get('interfaces', []):
+        name = iface.get('name')
+        io = iface.get('io', {})
+        for counter, help_text in (('bytes', 'Bytes transferred.'),
+                                   ('packets', 'Packets transferred.'),
+                                   ('errors', 'Interface errors.'),
+                                   ('dropped', 'Dropped packets.')):
+            for direction, value in io.get(counter, {}).items():
+                out.add(f'system_network_{counter}_total', 'counter', help_text, value,
+                        {'interface': name, 'direction': direction})
+        if 'members' in iface:
+            out.add('system_network_group_members', 'gauge',
+                    'Interfaces summed into a group series.', iface['members'],
+                    {'interface': name})
+
+    for state, value in network.get('connections', {}).items():
+        out.add('system_network_connections', 'gauge', 'Socket counts by protocol and state.',
+                value, {'state': state})
+
+
+RENDERERS = {
+    'cpu': render_cpu,
+    'memory': render_memory,
+    'disk': render_disk,
+    'network': render_network,
+}
+
+
+class MetricsExporter:
+    """
+    Serves the latest sample of each metric family over HTTP.
+
+    Each family is rendered once when a new sample for it arrives and the
+    concatenated body is cached, so a scrape only copies bytes and appends
+    the per-family sample age. Scrapes never trigger a collection; they are
+    answered on the collector's event loop. POST /burst starts a burst
+    capture through burst_trigger.
+    """
+
+    def __init__(self, config):
+        """
+        Initialize the exporter.
+
+        Args:
+            config: Configuration object
+        """
+        self.host = config.get('exporter', 'host', default='127.0.0.1')
+        self.port = config.get('exporter', 'port', default=9101)
+
+        self._fragments: Dict[str, bytes] = {}
+        self._updated: Dict[str, float] = {}
+
+        # (body, {family: monotonic update time}); replaced as a whole so a
+        # scrape always sees one consistent sample set
+        self._state: Tuple[bytes, Dict[str, float]] = (b'', {})
+
+        self._server = None
+
+        # Called with (duration, trigger) for POST /burst; set by the runtime
+        self.burst_trigger: Optional[Callable[[Optional[float], str], bool]] = None
+
+    def update(self, metrics: Dict[str, Any]):
+        """
+        Re-render the families contained in a newly collected sample.
+
+        Args:
+            metrics: Sample as returned by MetricsCollector.collect_all()
+        """
+        now = time.monotonic()
+
+        for family, data in metrics.get('metrics', {}).items():
+            renderer = RENDERERS.get(family)
+            if renderer is None:
+                continue
+            out = _FamilyWriter()
+            renderer(data, out)
+            self._fragments[family] = ('\n'.join(out.lines) + '\n').encode('utf-8')
+            self._updated[family] = now
+
+        body = b''.join(self._fragments[family] for family in FAMILY_ORDER
+                        if family in self._fragments)
+        self._state = (body, dict(self._updated))
+
+    def render(self) -> bytes:
+        """
+        Build a scrape response from the cached body.
+
+        Returns:
+            Text exposition bytes
+        """
+        body, updated = self._state
+        if not updated:
+            return body
+
+        now = time.monotonic()
+        lines = [
+            '# HELP collector_sample_age_seconds Seconds since the family was last collected.',
+            '# TYPE collector_sample_age_seconds gauge',
+        ]
+        for family, updated_at in updated.items():
+            lines.append(f'collector_sample_age_seconds{{family="{family}"}} {now - updated_at:.3f}')
+        return body + ('\n'.join(lines) + '\n').encode('utf-8')
+
+    async def start(self):
+        """Start listening for scrapes on the running event loop."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Metrics exporter listening on http://%s:%s/metrics", self.host, self.port)
+
+    async def serve(self):
+        """Serve /metrics until cancelled."""
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _start_burst(self, query: bytes) -> Tuple[str, str, bytes]:
+        """Start a burst capture for a POST /burst request."""
+        duration = None
+        for param in query.split(b'&'):
+            key, _, value = param.partition(b'=')
+            if key == b'duration':
+                try:
+                    duration = float(value)
+                except ValueError:
+                    return '400 Bad Request', 'text/plain', b'invalid duration\n'
+
+        if not self.burst_trigger(duration, 'http'):
+            return '409 Conflict', 'text/plain', b'burst mode is disabled\n'
+        return '202 Accepted', 'text/plain', b'burst capture started\n'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer a single HTTP request."""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            # Skip headers; requests carry no body we care about
+            while True:
+                line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request_line.split()
+            path, _, query = parts[1].partition(b'?') if len(parts) >= 2 else (b'', b'', b'')
+            if path == BURST_PATH and self.burst_trigger is not None:
+                if parts[0] != b'POST':
+                    status, content_type, payload = '405 Method Not Allowed', 'text/plain', b''
+                else:
+                    status, content_type, payload = self._start_burst(query)
+            elif len(parts) < 2 or parts[0] != b'GET':
+                status, content_type, payload = '405 Method Not Allowed', 'text/plain', b''
+            elif path != b'/metrics':
+                status, content_type, payload = '404 Not Found', 'text/plain', b''
+            else:
+                status, content_type, payload = '200 OK', CONTENT_TYPE, self.render()
+
+            writer.write(
+                f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n'.encode('ascii')
+                + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
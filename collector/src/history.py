@@ -0,0 +1,489 @@
+"""
+On-host tiered history of collected metrics.
+
+Every numeric field of a sample is a series (cpu.usage.total,
+disk.partitions[/].usage.percent, ...). Each series is kept in one
+fixed-size ring file per tier, so disk use is known up front and old data
+is overwritten in place instead of being deleted.
+"""
+
+import logging
+import mmap
+import re
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+from load_shedding import COUNTER_PATHS, LIST_KEYS
+
+
+logger = logging.getLogger(__name__)
+
+
+class Tier(NamedTuple):
+    """Resolution and retention of one history tier."""
+
+    name: str
+    resolution: int
+    retention: int
+
+    @property
+    def slots(self) -> int:
+        return self.retention // self.resolution
+
+
+# Retention table from the PRD, finest first
+TIERS = (
+    Tier('5s', 5, 24 * 3600),
+    Tier('1m', 60, 7 * 24 * 3600),
+    Tier('5m', 300, 30 * 24 * 3600),
+)
+
+MAGIC = b'MHST'
+FORMAT_VERSION = 1
+
+# magic, format version, resolution, slots, record size
+HEADER = struct.Struct('<4sHIII')
+
+# Finest tier: slot number, last value
+RAW_RECORD = struct.Struct('<id')
+# Rollup tiers: slot number, sample count, sum, min, max
+ROLLUP_RECORD = struct.Struct('<iIddd')
+
+SERIES_SUFFIX = '.ring'
+
+# From Python 3.13 a mapping need not keep a descriptor of its file open;
+# before that every mapped ring holds one
+_MMAP_OPTIONS = {'trackfd': False} if sys.version_info >= (3, 13) else {}
+
+# Share of the process's descriptor limit that mapped rings may use
+FD_SHARE = 0.25
+
+# Seconds between checks for series that are no longer written
+PRUNE_INTERVAL = 3600
+
+
+class Point(NamedTuple):
+    """One query result point."""
+
+    timestamp: float
+    count: int
+    avg: float
+    min: float
+    max: float
+
+
+def series_file_size(tiers: Sequence[Tier] = TIERS) -> int:
+    """Get the disk space one series takes over all tiers, in bytes."""
+    return sum(
+        HEADER.size + tier.slots * _record_for(index).size for index, tier in enumerate(tiers)
+    )
+
+
+def _record_for(tier_index: int) -> struct.Struct:
+    return RAW_RECORD if tier_index == 0 else ROLLUP_RECORD
+
+
+def _is_counter(path: Tuple[str, ...]) -> bool:
+    return any(path[:len(prefix)] == prefix for prefix in COUNTER_PATHS)
+
+
+def flatten_sample(metrics: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    """
+    Yield (series name, value) for every numeric field of a sample.
+
+    List elements are named by their key (mountpoint, interface name) or
+    position; cumulative counters are skipped since their rates are kept.
+
+    Args:
+        metrics: The 'metrics' section of a sample
+    """
+    def walk(value, path, name):
+        if isinstance(value, bool):
+            return
+        if isinstance(value, (int, float)):
+            yield name, float(value)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                item_path = path + (key,)
+                if not _is_counter(item_path):
+                    yield from walk(item, item_path, f'{name}.{key}' if name else key)
+        elif isinstance(value, list):
+            id_key = LIST_KEYS.get(path)
+            for index, item in enumerate(value):
+                if id_key is not None and isinstance(item, dict):
+                    # The identifying field names the element; it is not a series
+                    fields = {key: field for key, field in item.items() if key != id_key}
+                    yield from walk(fields, path, f'{name}[{item.get(id_key)}]')
+                else:
+                    yield from walk(item, path, f'{name}.{index}')
+
+    yield from walk(metrics, (), '')
+
+
+def _parse_timestamp(value: Optional[str]) -> float:
+    """Parse a sample's UTC ISO timestamp, falling back to the current time."""
+    if value:
+        try:
+            return datetime.fromisoformat(value.rstrip('Z')).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+class _Ring:
+    """One series in one tier: a memory-mapped array of fixed-width slots."""
+
+    __slots__ = ('path', 'tier', 'record', 'writable', '_map')
+
+    def __init__(self, path: Path, tier: Tier, record: struct.Struct, writable: bool):
+        self.path = path
+        self.tier = tier
+        self.record = record
+        self.writable = writable
+
+        # The file is closed once mapped; the mapping stays valid
+        size = HEADER.size + tier.slots * record.size
+        if writable:
+            valid = path.exists() and path.stat().st_size == size and self._header_matches(path)
+            with open(path, 'r+b' if valid else 'w+b') as f:
+                if not valid:
+                    # Sparse until written; empty slots read as slot number 0
+                    f.truncate(size)
+                    f.write(HEADER.pack(MAGIC, FORMAT_VERSION, tier.resolution,
+                                        tier.slots, record.size))
+                    f.flush()
+                self._map = mmap.mmap(f.fileno(), size, **_MMAP_OPTIONS)
+        else:
+            if not self._header_matches(path):
+                raise ValueError(f"Not a history file for tier {tier.name}: {path}")
+            with open(path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ,
+                                      **_MMAP_OPTIONS)
+
+    def _header_matches(self, path: Path) -> bool:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+        return header == HEADER.pack(MAGIC, FORMAT_VERSION, self.tier.resolution,
+                                     self.tier.slots, self.record.size)
+
+    def _offset(self, slot: int) -> int:
+        return HEADER.size + (slot % self.tier.slots) * self.record.size
+
+    def write_raw(self, slot: int, value: float):
+        RAW_RECORD.pack_into(self._map, self._offset(slot), slot, value)
+
+    def add(self, slot: int, value: float):
+        """Fold a value into the rollup slot, starting it over if it is stale."""
+        offset = self._offset(slot)
+        current, count, total, low, high = ROLLUP_RECORD.unpack_from(self._map, offset)
+        if current != slot:
+            ROLLUP_RECORD.pack_into(self._map, offset, slot, 1, value, value, value)
+        else:
+            ROLLUP_RECORD.pack_into(self._map, offset, slot, count + 1, total + value,
+                                    min(low, value), max(high, value))
+
+    def read(self, first: int, last: int) -> List[Point]:
+        """
+        Read the points stored for slots first..last (inclusive).
+
+        Only the ring positions covering the range are unpacked.
+        """
+        slots = self.tier.slots
+        first = max(first, last - slots + 1)
+        if first > last:
+            return []
+
+        start = first % slots
+        count = last - first + 1
+        spans = [(start, min(count, slots - start))]
+        if spans[0][1] < count:
+            spans.append((0, count - spans[0][1]))
+
+        resolution = self.tier.resolution
+        size = self.record.size
+        points = []
+        for position, length in spans:
+            offset = HEADER.size + position * size
+            records = self.record.iter_unpack(self._map[offset:offset + length * size])
+            if self.record is RAW_RECORD:
+                for slot, value in records:
+                    if first <= slot <= last:
+                        points.append(Point(slot * resolution, 1, value, value, value))
+            else:
+                for slot, n, total, low, high in records:
+                    if first <= slot <= last:
+                        points.append(Point(slot * resolution, n, total / n, low, high))
+        return points
+
+    def close(self):
+        if self.writable:
+            self._map.flush()
+        self._map.close()
+
+
+class HistoryStore:
+    """
+    Fixed-size, tiered time series store in a local directory.
+
+    Values are written to the finest tier and folded into the coarser
+    tiers' current slots as they arrive, so rollups are always up to
+    date and no background compaction is needed. The number of series is
+    capped so the store never exceeds its configured size; series not
+    written for the longest retention (interfaces that went away) are
+    removed to make room.
+    """
+
+    def __init__(self, directory: Path, max_size: int, tiers: Sequence[Tier] = TIERS,
+                 read_only: bool = False, max_open: Optional[int] = None):
+        """
+        Initialize the store.
+
+        Args:
+            directory: Directory holding one subdirectory per tier
+            max_size: Maximum disk use in bytes
+            tiers: Tiers, finest first
+            read_only: Open for queries only (e.g. while the collector runs)
+            max_open: Series kept mapped at once, least recently used
+                      unmapped first (default: unlimited where mappings
+                      hold no descriptor, else FD_SHARE of the limit)
+        """
+        self.directory = Path(directory)
+        self.tiers = tuple(tiers)
+        self.read_only = read_only
+        self.max_series = max(0, max_size // series_file_size(self.tiers))
+        self.max_open = max_open if max_open is not None else _open_series_limit(len(self.tiers))
+        self._rings: 'OrderedDict[str, List[_Ring]]' = OrderedDict()
+        self._rejected = 0
+        self._lock = threading.Lock()
+        # Series with files on disk, including ones not written this run
+        self._stored = set(self.series())
+        # Last write (epoch seconds) by series; from file times until written
+        self._written: Dict[str, float] = {}
+        self._next_prune = 0.0
+
+        if not read_only:
+            for tier in self.tiers:
+                (self.directory / tier.name).mkdir(parents=True, exist_ok=True)
+            for series in self._stored:
+                paths = [self._series_path(tier, series) for tier in self.tiers]
+                self._written[series] = max(
+                    (path.stat().st_mtime for path in paths if path.exists()), default=0.0)
+            self._prune_stale(time.time())
+
+    def _series_path(self, tier: Tier, series: str) -> Path:
+        return self.directory / tier.name / (quote(series, safe='') + SERIES_SUFFIX)
+
+    def _prune_stale(self, now: float):
+        """Remove series that have not been written for the longest retention."""
+        cutoff = now - self.tiers[-1].retention
+        for series, written in list(self._written.items()):
+            if written >= cutoff:
+                continue
+            for ring in self._rings.pop(series, ()):
+                ring.close()
+            for tier in self.tiers:
+                self._series_path(tier, series).unlink(missing_ok=True)
+            del self._written[series]
+            self._stored.discard(series)
+            # Room was made; warn again if the store fills up once more
+            self._rejected = 0
+            logger.info("Removed stale history series %s", series)
+        self._next_prune = now + PRUNE_INTERVAL
+
+    def _open_series(self, series: str) -> Optional[List[_Ring]]:
+        rings = self._rings.get(series)
+        if rings is not None:
+            self._rings.move_to_end(series)
+            return rings
+
+        if series not in self._stored:
+            if self.read_only:
+                return None
+            if len(self._stored) >= self.max_series:
+                self._rejected += 1
+                if self._rejected == 1:
+                    logger.warning("History store is full (%s series), not recording new "
+                                   "series such as %s", self.max_series, series)
+                return None
+            self._stored.add(series)
+
+        if self.max_open and len(self._rings) >= self.max_open:
+            for ring in self._rings.popitem(last=False)[1]:
+                ring.close()
+
+        rings = [
+            _Ring(self._series_path(tier, series), tier, _record_for(index),
+                  writable=not self.read_only)
+            for index, tier in enumerate(self.tiers)
+        ]
+        self._rings[series] = rings
+        return rings
+
+    def record(self, sample: Dict[str, Any]):
+        """
+        Record every numeric field of a sample.
+
+        Args:
+            sample: Sample as returned by MetricsCollector.collect()
+        """
+        timestamp = _parse_timestamp(sample.get('timestamp'))
+        slots = [int(timestamp // tier.resolution) for tier in self.tiers]
+        now = time.time()
+        written = self._written
+
+        with self._lock:
+            if now >= self._next_prune:
+                self._prune_stale(now)
+            for series, value in flatten_sample(sample.get('metrics', {})):
+                rings = self._open_series(series)
+                if rings is None:
+                    continue
+                written[series] = now
+                rings[0].write_raw(slots[0], value)
+                for ring, slot in zip(rings[1:], slots[1:]):
+                    ring.add(slot, value)
+
+    def series(self) -> List[str]:
+        """List the stored series names."""
+        directory = self.directory / self.tiers[0].name
+        if not directory.is_dir():
+            return []
+        return sorted(
+            unquote(path.name[:-len(SERIES_SUFFIX)])
+            for path in directory.iterdir() if path.name.endswith(SERIES_SUFFIX)
+        )
+
+    def match(self, patterns: Sequence[str]) -> List[str]:
+        """
+        List stored series matching any of the patterns.
+
+        Only '*' is special in a pattern, since series names contain
+        brackets (disk.partitions[/].usage.percent).
+        """
+        regexes = [re.compile('.*'.join(map(re.escape, pattern.split('*'))) + '$')
+                   for pattern in patterns]
+        return [name for name in self.series() if any(r.match(name) for r in regexes)]
+
+    def select_tier(self, start: float, now: Optional[float] = None) -> Tier:
+        """
+        Pick the finest tier that still holds data from `start`.
+
+        Args:
+            start: Range start (epoch seconds)
+            now: Current time (defaults to time.time())
+        """
+        now = time.time() if now is None else now
+        for tier in self.tiers:
+            if now - start <= tier.retention:
+                return tier
+        return self.tiers[-1]
+
+    def query(self, series: str, start: float, end: float,
+              tier: Optional[Tier] = None) -> List[Point]:
+        """
+        Get the points of a series in a time range.
+
+        Args:
+            series: Series name
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+            tier: Tier to read; by default the finest one covering start
+
+        Returns:
+            Points in chronological order
+        """
+        tier = tier or self.select_tier(start)
+        index = self.tiers.index(tier)
+        first = -(-int(start) // tier.resolution)
+        with self._lock:
+            # Read under the lock; recording may unmap the least recently used series
+            rings = self._open_series(series)
+            if rings is None:
+                return []
+            return rings[index].read(first, int(end // tier.resolution))
+
+    def aggregate(self, series: str, start: float, end: float,
+                  tier: Optional[Tier] = None) -> Optional[Point]:
+        """
+        Summarize a series over a time range.
+
+        Args:
+            series: Series name
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+            tier: Tier to read; by default the finest one covering start
+
+        Returns:
+            Point with the range start, total sample count, mean, min and
+            max, or None if there is no data
+        """
+        points = self.query(series, start, end, tier)
+        if not points:
+            return None
+        count = sum(point.count for point in points)
+        return Point(
+            points[0].timestamp,
+            count,
+            sum(point.avg * point.count for point in points) / count,
+            min(point.min for point in points),
+            max(point.max for point in points),
+        )
+
+    @property
+    def series_count(self) -> int:
+        """Number of series currently mapped."""
+        return len(self._rings)
+
+    def close(self):
+        """Unmap and close all series files."""
+        with self._lock:
+            for rings in self._rings.values():
+                for ring in rings:
+                    ring.close()
+            self._rings.clear()
+
+
+def _open_series_limit(rings_per_series: int) -> Optional[int]:
+    """
+    Get how many series may stay mapped without exhausting file descriptors.
+
+    Returns:
+        Series limit, or None if mappings hold no descriptors
+    """
+    if _MMAP_OPTIONS:
+        return None
+    try:
+        import resource
+    except ImportError:
+        # Windows; handles are not limited like descriptors
+        return None
+
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return None
+    return max(1, int(soft * FD_SHARE) // rings_per_series)
+
+
+def open_history(config, read_only: bool = False) -> HistoryStore:
+    """
+    Open the history store described by a configuration.
+
+    Args:
+        config: Configuration object
+        read_only: Open for queries only
+
+    Returns:
+        HistoryStore instance
+    """
+    return HistoryStore(
+        Path(config.get('history', 'dir', default='./history')),
+        int(config.get('history', 'max_size', default=500) * 1024 * 1024),  # Convert to bytes
+        read_only=read_only,
+    )
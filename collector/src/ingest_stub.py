@@ -0,0 +1,221 @@
+"""
+Local stand-in for the ingest API, for tests, benchmarks and development.
+
+Accepts what HttpSink sends: single samples or JSON arrays on
+COLLECT_PATH, burst captures on CAPTURE_PATH. Samples already stored are
+recognised by their session and sequence number (see sequencing) and
+dropped, the rest are kept in memory or appended to a JSON lines file.
+An artificial delay per request reproduces a high-latency link.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sequencing import SequenceTracker
+from serializer import encode
+from sinks import CAPTURE_PATH, COLLECT_PATH
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds a client may take to send a request; idle keep-alive connections
+# are closed after this too
+REQUEST_TIMEOUT = 30
+
+
+class IngestStub:
+    """Minimal HTTP ingest endpoint that deduplicates by sequence number."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, output: Optional[Path] = None,
+                 delay: float = 0.0):
+        """
+        Initialize the stub.
+
+        Args:
+            host: Address to listen on
+            port: Port to listen on (0 picks a free one)
+            output: JSON lines file for stored samples (default: keep them
+                    in `samples`)
+            delay: Seconds to wait before answering each request
+        """
+        self.host = host
+        self.port = port
+        self.output = Path(output) if output is not None else None
+        self.delay = delay
+        self.samples: List[Dict[str, Any]] = []
+        self.captures: List[bytes] = []
+        self.stats = {'requests': 0, 'stored': 0, 'duplicates': 0}
+        self._tracker = SequenceTracker()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to configure as a sink's url."""
+        return f'http://{self.host}:{self.port}'
+
+    async def start(self):
+        """Start listening on the running event loop."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Ingest stub listening on %s", self.url)
+
+    async def serve(self):
+        """Serve requests until cancelled."""
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def start_in_thread(self):
+        """Serve from a background thread; returns once listening."""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            started.set()
+            try:
+                self._loop.run_until_complete(self.serve())
+            except asyncio.CancelledError:
+                pass
+            finally:
+                # Let connection handlers finish cancelling before closing
+                handlers = asyncio.all_tasks(self._loop)
+                for task in handlers:
+                    task.cancel()
+                self._loop.run_until_complete(
+                    asyncio.gather(*handlers, return_exceptions=True))
+                self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='ingest-stub', daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self):
+        """Stop a stub started with start_in_thread()."""
+        if self._loop is not None and self._thread is not None:
+            def cancel():
+                for task in asyncio.all_tasks(self._loop):
+                    task.cancel()
+            self._loop.call_soon_threadsafe(cancel)
+            self._thread.join(5)
+            self._thread = None
+
+    def ingest(self, body: bytes) -> Dict[str, int]:
+        """
+        Store the samples in a request body, dropping duplicates.
+
+        Args:
+            body: One JSON sample or a JSON array of samples
+
+        Returns:
+            Counts of samples accepted and dropped as duplicates
+
+        Raises:
+            ValueError: If the body is not a sample or a list of samples
+        """
+        document = json.loads(body)
+        samples = document if isinstance(document, list) else [document]
+        if not all(isinstance(sample, dict) for sample in samples):
+            raise ValueError("expected a sample or a list of samples")
+
+        accepted = [sample for sample in samples if self._tracker.accept(sample)]
+        if self.output is not None and accepted:
+            self.output.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.output, 'ab') as f:
+                for sample in accepted:
+                    f.write(encode(sample) + b'\n')
+        elif self.output is None:
+            self.samples.extend(accepted)
+
+        result = {'accepted': len(accepted), 'duplicates': len(samples) - len(accepted)}
+        self.stats['stored'] += result['accepted']
+        self.stats['duplicates'] += result['duplicates']
+        return result
+
+    def _respond(self, method: bytes, path: bytes, body: bytes) -> Tuple[str, bytes]:
+        """Answer one request."""
+        if method != b'POST':
+            return '405 Method Not Allowed', b''
+        if path == CAPTURE_PATH.encode('ascii'):
+            self.captures.append(body)
+            return '200 OK', b'{}'
+        if path != COLLECT_PATH.encode('ascii'):
+            return '404 Not Found', b''
+        try:
+            return '200 OK', encode(self.ingest(body))
+        except ValueError as e:
+            return '400 Bad Request', encode({'error': str(e)})
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer requests on one keep-alive connection."""
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.partition(b':')
+                    if name.strip().lower() == b'content-length':
+                        length = int(value.strip() or 0)
+                body = await asyncio.wait_for(reader.readexactly(length), REQUEST_TIMEOUT)
+
+                parts = request_line.split()
+                method, path = (parts[0], parts[1].partition(b'?')[0]) if len(parts) >= 2 \
+                    else (b'', b'')
+                self.stats['requests'] += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                status, payload = self._respond(method, path, body)
+
+                writer.write(
+                    f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n'
+                    f'Content-Length: {len(payload)}\r\n\r\n'.encode('ascii') + payload
+                )
+                await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Stub shutting down with the connection open
+            pass
+        finally:
+            writer.close()
+
+
+def run_stub(host: str, port: int, output: Optional[Path], delay: float):
+    """
+    Run an ingest stub in the foreground until interrupted.
+
+    Args:
+        host: Address to listen on
+        port: Port to listen on
+        output: JSON lines file for stored samples
+        delay: Seconds to wait before answering each request
+    """
+    stub = IngestStub(host, port, output, delay)
+
+    async def main():
+        await stub.start()
+        print(f"Ingest stub listening on {stub.url}{COLLECT_PATH}")
+        await stub.serve()
+
+    try:
+        asyncio.run(main())
+    finally:
+        print(f"{stub.stats['requests']} requests, {stub.stats['stored']} samples stored, "
+              f"{stub.stats['duplicates']} duplicates dropped")
@@ -0,0 +1,263 @@
+"""
+Per-interface network counter state.
+
+Container hosts create and delete veth and similar interfaces all the
+time, so the interface list changes from one tick to the next. The
+tracker keeps the last counters of each interface that passes the
+filters, forgets interfaces not seen for state_ttl seconds, and reports a
+bounded set of series: up to max_interfaces single interfaces, one series
+per configured group (interfaces matching the group's glob patterns), and
+one OVERFLOW_GROUP series summing the interfaces beyond the cap.
+
+Group counters add up their members' increments since the group was
+first seen, so they keep growing as members come and go. An interface
+that appears between two reads is counted from zero and gets a rate on
+its first tick.
+"""
+
+import re
+from array import array
+from fnmatch import translate
+from operator import add, sub
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+from sample_model import NAN, NetworkMetrics, intern_names
+
+
+# Series summing the single interfaces beyond metrics.network.max_interfaces
+OVERFLOW_GROUP = 'other'
+
+# Defaults for metrics.network.max_interfaces and state_ttl
+DEFAULT_MAX_INTERFACES = 32
+DEFAULT_STATE_TTL = 60.0
+
+# Counters per interface (psutil snetio fields, in NET_COUNTERS order);
+# the first RATE_COUNT have rates
+COUNTER_COUNT = 8
+RATE_COUNT = 4
+
+_ZERO = (0,) * COUNTER_COUNT
+_NO_RATES = (NAN,) * RATE_COUNT
+
+
+class _Group:
+    """Accumulated counters of one group."""
+
+    __slots__ = ('counters', 'seen')
+
+    def __init__(self, counters: Iterable[int]):
+        self.counters = array('Q', counters)
+        self.seen = 0.0
+
+
+def _column_sums(rows: List[Sequence[int]]) -> List[int]:
+    """Sum counter rows column by column."""
+    return [sum(column) for column in zip(*rows)] if rows else list(_ZERO)
+
+
+def compile_groups(groups: Optional[Mapping[str, Union[str, Sequence[str]]]]):
+    """
+    Compile interface groups from configuration.
+
+    Args:
+        groups: Group name to one glob pattern or a list of them
+
+    Returns:
+        (name, compiled pattern) pairs in configuration order
+    """
+    compiled = []
+    for name, patterns in (groups or {}).items():
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        compiled.append((str(name), re.compile('|'.join(translate(p) for p in patterns))))
+    return compiled
+
+
+class InterfaceTracker:
+    """Turns successive per-interface counter reads into bounded series."""
+
+    def __init__(self):
+        # Interface name to (group or None, counters at the last read)
+        self._state: Dict[str, Tuple[Optional[str], Sequence[int]]] = {}
+        # Interfaces with state that are missing, to when they went missing
+        self._vanished: Dict[str, float] = {}
+        self._groups: Dict[str, _Group] = {}
+        # Every interface in the previous read, filtered or not
+        self._previous: Set[str] = set()
+        # Single interfaces holding one of the max_interfaces slots
+        self._reported: Set[str] = set()
+        self._last_time: Optional[float] = None
+        self.configure()
+
+    def configure(self, include: Iterable[str] = (), exclude: Iterable[str] = (),
+                  groups: Optional[Mapping[str, Union[str, Sequence[str]]]] = None,
+                  max_interfaces: int = DEFAULT_MAX_INTERFACES,
+                  state_ttl: float = DEFAULT_STATE_TTL):
+        """
+        Apply filter, grouping and cap settings.
+
+        Counter state is kept; interfaces are regrouped and the
+        max_interfaces slots are handed out again.
+
+        Args:
+            include: Interfaces to report (empty for all)
+            exclude: Interfaces never to report
+            groups: Group name to glob pattern(s); first match wins
+            max_interfaces: Single interfaces reported before the rest
+                            go into OVERFLOW_GROUP
+            state_ttl: Seconds an interface's state is kept after it was
+                       last seen
+        """
+        self._include = frozenset(include)
+        self._exclude = frozenset(exclude)
+        self._patterns = compile_groups(groups)
+        self._group_order = tuple(name for name, _ in self._patterns) + (OVERFLOW_GROUP,)
+        self.max_interfaces = max_interfaces
+        self.state_ttl = state_ttl
+
+        state = self._state
+        for name, (_, counters) in state.items():
+            state[name] = (self._classify(name), counters)
+        self._reported.clear()
+
+    @property
+    def tracked(self) -> int:
+        """Number of interfaces with stored state."""
+        return len(self._state)
+
+    def _classify(self, name: str) -> Optional[str]:
+        """Get the group an interface belongs to, or None."""
+        for group, pattern in self._patterns:
+            if pattern.match(name):
+                return group
+        return None
+
+    def update(self, net_io: Mapping[str, Sequence[int]], now: float) -> NetworkMetrics:
+        """
+        Store a read and build the series to report.
+
+        Args:
+            net_io: Interface name to counters in NET_COUNTERS order
+                    (psutil.net_io_counters(pernic=True))
+            now: Time of the read in seconds
+
+        Returns:
+            NetworkMetrics with interfaces, groups and rates filled in;
+            rates are NaN on the first read
+        """
+        include, exclude = self._include, self._exclude
+        state, previous, reported = self._state, self._previous, self._reported
+        elapsed = now - self._last_time if self._last_time is not None else 0.0
+        rated = elapsed > 0
+        self._last_time = now
+        current = self._previous = set(net_io)
+        room = self.max_interfaces - len(reported)
+
+        metrics = NetworkMetrics()
+        names: List[str] = []
+        members: List[int] = []
+        counters_column = metrics.counters
+        rates_column = metrics.rates
+        # Group name to counter rows of its members: [continuing, their
+        # previous counters, new since the last read, without a rate]
+        totals: Dict[str, List[list]] = {}
+
+        for name, counters in net_io.items():
+            if include and name not in include or name in exclude:
+                continue
+
+            entry = state.get(name)
+            if entry is None:
+                group, prev = self._classify(name), None
+            else:
+                group, prev = entry
+            state[name] = (group, counters)
+
+            if not rated:
+                prev = None
+                fresh = False
+            elif name not in previous:
+                # Created since the last read: everything is new
+                fresh = True
+            elif prev is None:
+                # Present last time but not tracked (filters changed)
+                fresh = False
+            else:
+                # Byte counters going back means the interface was recreated
+                fresh = counters[0] < prev[0] or counters[1] < prev[1]
+
+            if group is None and name not in reported:
+                if room > 0:
+                    reported.add(name)
+                    room -= 1
+                else:
+                    group = OVERFLOW_GROUP
+
+            if group is None:
+                names.append(name)
+                members.append(0)
+                counters_column.extend(counters)
+                if fresh:
+                    rates_column.extend([value / elapsed for value in counters[:RATE_COUNT]])
+                elif prev is not None:
+                    rates_column.extend([(value - before) / elapsed for value, before
+                                         in zip(counters[:RATE_COUNT], prev)])
+                else:
+                    rates_column.extend(_NO_RATES)
+                continue
+
+            rows = totals.get(group)
+            if rows is None:
+                rows = totals[group] = [[], [], [], []]
+            if fresh:
+                rows[2].append(counters)
+            elif prev is not None:
+                rows[0].append(counters)
+                rows[1].append(prev)
+            else:
+                rows[3].append(counters)
+
+        groups = self._groups
+        for group in self._group_order:
+            rows = totals.get(group)
+            if rows is None:
+                continue
+            continuing, before, created, unrated = rows
+            increments = [max(0, value) for value in map(
+                add, map(sub, _column_sums(continuing), _column_sums(before)),
+                _column_sums(created))]
+            record = groups.get(group)
+            if record is None:
+                record = groups[group] = _Group(
+                    _column_sums(continuing + created + unrated))
+            else:
+                record.counters = array('Q', map(add, record.counters, increments))
+            record.seen = now
+
+            names.append(group)
+            members.append(len(continuing) + len(created) + len(unrated))
+            counters_column.extend(record.counters)
+            rates_column.extend([value / elapsed for value in increments[:RATE_COUNT]]
+                                if continuing or created else _NO_RATES)
+
+        metrics.names = intern_names(names)
+        if totals:
+            metrics.members = array('I', members)
+
+        self._evict(current, now)
+        return metrics
+
+    def _evict(self, current: Set[str], now: float):
+        """Drop interfaces and groups not seen within state_ttl."""
+        state, vanished = self._state, self._vanished
+        for name in [name for name in vanished if name in current]:
+            del vanished[name]
+        for name in state.keys() - current:
+            since = vanished.setdefault(name, now)
+            if now - since >= self.state_ttl:
+                del state[name], vanished[name]
+                self._reported.discard(name)
+
+        oldest = now - self.state_ttl
+        for group in [group for group, record in self._groups.items() if record.seen < oldest]:
+            del self._groups[group]
@@ -0,0 +1,339 @@
+"""
+Priority-based load shedding for metrics under ingest backpressure.
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+# Priority classes; lower is more important
+CRITICAL = 0
+HIGH = 1
+NORMAL = 2
+LOW = 3
+
+# Shed levels. At level N everything with priority > LOW - N is dropped,
+# so level 0 keeps everything and level 3 keeps only CRITICAL data.
+SHED_NONE = 0
+SHED_DETAIL = 1
+SHED_AGGREGATE = 2
+SHED_CRITICAL = 3
+
+LEVEL_NAMES = {
+    SHED_NONE: 'none',
+    SHED_DETAIL: 'detail',
+    SHED_AGGREGATE: 'aggregate',
+    SHED_CRITICAL: 'critical',
+}
+
+FAMILY_PRIORITIES = {
+    'cpu': CRITICAL,
+    'memory': CRITICAL,
+    'disk': HIGH,
+    'network': HIGH,
+}
+
+# Field priorities, by path below the family. List elements (partitions,
+# interfaces) share the path of their list.
+FIELD_PRIORITIES = {
+    ('cpu', 'cores'): LOW,
+    ('cpu', 'load'): NORMAL,
+    ('memory', 'buffers'): LOW,
+    ('memory', 'cached'): LOW,
+    ('memory', 'swap'): NORMAL,
+    ('disk', 'partitions', 'inode'): LOW,
+    ('disk', 'partitions', 'fstype'): NORMAL,
+    ('network', 'interfaces', 'io', 'packets'): LOW,
+    ('network', 'interfaces', 'io', 'errors'): NORMAL,
+    ('network', 'interfaces', 'io', 'dropped'): NORMAL,
+    ('network', 'interfaces', 'io_rate', 'packets_sent'): LOW,
+    ('network', 'interfaces', 'io_rate', 'packets_recv'): LOW,
+    ('network', 'connections'): NORMAL,
+}
+
+# Cumulative counters; when samples are merged the newest value wins
+# instead of the weighted mean
+COUNTER_PATHS = (
+    ('network', 'interfaces', 'io'),
+)
+
+# Whole-number counts; merging keeps the newest value so they stay integers
+COUNT_PATHS = (
+    ('cpu', 'cores', 'count'),
+    ('cpu', 'cores', 'physical_count'),
+    ('network', 'interfaces', 'members'),
+)
+
+# Keys identifying list elements when merging
+LIST_KEYS = {
+    ('cpu', 'cores', 'summary', 'top'): 'core',
+    ('disk', 'partitions'): 'mountpoint',
+    ('network', 'interfaces'): 'name',
+}
+
+
+def _max_priority(level: int) -> int:
+    """Get the least important priority still kept at a shed level."""
+    return LOW - level
+
+
+def _shed_value(value: Any, path: Tuple[str, ...], keep: int) -> Any:
+    """Copy a value, dropping fields less important than `keep`."""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            item_path = path + (key,)
+            if FIELD_PRIORITIES.get(item_path, CRITICAL) > keep:
+                continue
+            result[key] = _shed_value(item, item_path, keep)
+        return result
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return [_shed_value(item, path, keep) for item in value]
+    return value
+
+
+def shed(sample: Dict[str, Any], level: int) -> Dict[str, Any]:
+    """
+    Drop low-priority families and fields from a sample.
+
+    The input is not modified.
+
+    Args:
+        sample: Sample as returned by MetricsCollector.collect()
+        level: Shed level (SHED_NONE .. SHED_CRITICAL)
+
+    Returns:
+        Pruned copy of the sample, or the sample itself at SHED_NONE
+    """
+    if level <= SHED_NONE:
+        return sample
+
+    keep = _max_priority(level)
+    metrics = {}
+    for family, data in sample.get('metrics', {}).items():
+        if FAMILY_PRIORITIES.get(family, LOW) > keep:
+            continue
+        metrics[family] = _shed_value(data, (family,), keep)
+
+    result = dict(sample)
+    result['metrics'] = metrics
+    result['shed_level'] = max(level, sample.get('shed_level', SHED_NONE))
+    return result
+
+
+def _keeps_newest(path: Tuple[str, ...]) -> bool:
+    return path in COUNT_PATHS or any(path[:len(prefix)] == prefix for prefix in COUNTER_PATHS)
+
+
+def _merge_values(values: Sequence[Any], weights: Sequence[int], path: Tuple[str, ...]) -> Any:
+    """Merge the same field from consecutive samples, oldest first."""
+    present = [(value, weight) for value, weight in zip(values, weights) if value is not None]
+    if not present:
+        return None
+    last = present[-1][0]
+
+    if isinstance(last, bool) or isinstance(last, str):
+        return last
+
+    if isinstance(last, (int, float)):
+        if _keeps_newest(path):
+            return last
+        numbers = [(v, w) for v, w in present if isinstance(v, (int, float))]
+        total = sum(w for _, w in numbers)
+        return sum(v * w for v, w in numbers) / total
+
+    if isinstance(last, dict):
+        keys: List[str] = []
+        for value, _ in present:
+            if isinstance(value, dict):
+                keys.extend(key for key in value if key not in keys)
+        merged = {}
+        for key in keys:
+            field = _merge_values(
+                [value.get(key) if isinstance(value, dict) else None for value, _ in present],
+                [weight for _, weight in present],
+                path + (key,),
+            )
+            if field is not None:
+                merged[key] = field
+        return merged
+
+    if isinstance(last, list):
+        id_key = LIST_KEYS.get(path)
+        if id_key is not None:
+            # Match elements by identity (mountpoint, interface name)
+            order: List[Any] = []
+            by_id: Dict[Any, List[Tuple[Any, int]]] = {}
+            for value, weight in present:
+                for element in value or []:
+                    element_id = element.get(id_key)
+                    if element_id not in by_id:
+                        order.append(element_id)
+                        by_id[element_id] = []
+                    by_id[element_id].append((element, weight))
+            return [
+                _merge_values([e for e, _ in by_id[element_id]],
+                              [w for _, w in by_id[element_id]], path)
+                for element_id in order
+            ]
+
+        # Positional lists (per-core usage); merge element-wise when shapes match
+        same_shape = [(v, w) for v, w in present if isinstance(v, list) and len(v) == len(last)]
+        return [
+            _merge_values([v[i] for v, _ in same_shape], [w for _, w in same_shape], path)
+            for i in range(len(last))
+        ]
+
+    return last
+
+
+def merge_samples(samples: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge consecutive samples into one coarser aggregate.
+
+    Gauges and rates become count-weighted means, cumulative counters and
+    counts (cores, grouped interfaces) keep the newest value. The result
+    records how many raw samples it covers and their time range, and can
+    itself be merged again.
+
+    Args:
+        samples: Samples in chronological order
+
+    Returns:
+        Aggregated sample
+    """
+    if len(samples) == 1:
+        return samples[0]
+
+    weights = [sample.get('aggregate', {}).get('count', 1) for sample in samples]
+    first, last = samples[0], samples[-1]
+
+    merged = _merge_values([sample.get('metrics', {}) for sample in samples], weights, ())
+    result = {
+        'timestamp': first.get('timestamp'),
+        'hostname': last.get('hostname'),
+        'metrics': merged or {},
+        'aggregate': {
+            'count': sum(weights),
+            'start': first.get('aggregate', {}).get('start', first.get('timestamp')),
+            'end': last.get('aggregate', {}).get('end', last.get('timestamp')),
+        },
+        'shed_level': max(sample.get('shed_level', SHED_NONE) for sample in samples),
+    }
+    if 'slot' in first:
+        # Aligned samples: the aggregate is keyed by its first slot
+        result['slot'] = first['slot']
+    if 'seq' in first and all(sample.get('session') == first.get('session')
+                              for sample in samples):
+        # Sequence numbers covered, for receivers to deduplicate on; merged
+        # samples need not be adjacent (other families sit in between), so
+        # the numbers are listed rather than given as a range
+        result['session'] = first['session']
+        result['seq'] = first['seq']
+        result['aggregate']['seqs'] = sorted(
+            seq for sample in samples
+            for seq in sample.get('aggregate', {}).get('seqs', (sample.get('seq'),)))
+    return result
+
+
+class BackpressureMonitor:
+    """
+    Tracks ingest backpressure and decides the current shed level.
+
+    Pressure comes from the server (HTTP 429/503, slow responses) and from
+    local buffer usage crossing watermarks. Server-side pressure decays
+    after a cooldown without further signals.
+    """
+
+    # HTTP statuses meaning "slow down"
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(self, config):
+        """
+        Initialize the monitor.
+
+        Args:
+            config: Configuration object
+        """
+        self._latency: Optional[float] = None
+        self._pressure_level = SHED_NONE
+        self._pressure_until = 0.0
+        self.retry_after_until = 0.0
+        self.apply_config(config)
+
+    def apply_config(self, config):
+        """
+        Apply thresholds from a configuration.
+
+        Args:
+            config: Configuration object
+        """
+        self.slow_response = config.get('backpressure', 'slow_response', default=2.0)
+        self.cooldown = config.get('backpressure', 'cooldown', default=60)
+        self.watermarks = (
+            (config.get('backpressure', 'watermarks', 'critical', default=0.9), SHED_CRITICAL),
+            (config.get('backpressure', 'watermarks', 'aggregate', default=0.75), SHED_AGGREGATE),
+            (config.get('backpressure', 'watermarks', 'shed', default=0.5), SHED_DETAIL),
+        )
+
+    @property
+    def aggregate_watermark(self) -> float:
+        """Buffer usage fraction above which buffered samples are merged."""
+        return self.watermarks[1][0]
+
+    def record_response(self, status: Optional[int], latency: float,
+                        retry_after: Optional[float] = None):
+        """
+        Record the outcome of a send.
+
+        Args:
+            status: HTTP status code, or None if no response was received
+            latency: Request duration in seconds
+            retry_after: Seconds the server asked us to wait, if any
+        """
+        now = time.monotonic()
+
+        # Exponentially weighted latency so one slow request does not trip it
+        self._latency = latency if self._latency is None else 0.7 * self._latency + 0.3 * latency
+
+        if status in self.THROTTLE_STATUSES:
+            self._raise_pressure(min(self._pressure_level + 1, SHED_AGGREGATE), now)
+            if retry_after:
+                self.retry_after_until = now + retry_after
+        elif self._latency > self.slow_response:
+            self._raise_pressure(max(self._pressure_level, SHED_DETAIL), now)
+
+    def _raise_pressure(self, level: int, now: float):
+        self._pressure_level = level
+        self._pressure_until = now + self.cooldown
+
+    def backing_off(self) -> bool:
+        """Check whether the server asked us to hold off sending."""
+        return time.monotonic() < self.retry_after_until
+
+    def server_level(self) -> int:
+        """Get the shed level implied by server-side signals."""
+        if self._pressure_level and time.monotonic() >= self._pressure_until:
+            self._pressure_level = SHED_NONE
+        return self._pressure_level
+
+    def buffer_level(self, usage: float) -> int:
+        """
+        Get the shed level implied by buffer usage.
+
+        Args:
+            usage: Buffer usage as a fraction of its maximum size
+        """
+        for watermark, level in self.watermarks:
+            if usage >= watermark:
+                return level
+        return SHED_NONE
+
+    def level(self, usage: float = 0.0) -> int:
+        """
+        Get the current shed level.
+
+        Args:
+            usage: Buffer usage as a fraction of its maximum size
+        """
+        return max(self.server_level(), self.buffer_level(usage))
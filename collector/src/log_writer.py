@@ -0,0 +1,232 @@
+"""
+Non-blocking logging: records are queued by the caller and written by a
+background thread, with repeated messages suppressed and summarized.
+"""
+
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# Seconds between checks for summaries when no records arrive
+_POLL_INTERVAL = 1.0
+
+_STOP = object()
+
+
+def _describe_window(seconds: float) -> str:
+    """Format a summary window for humans ('hour', '5 minutes')."""
+    if seconds % 3600 == 0:
+        hours = int(seconds // 3600)
+        return 'hour' if hours == 1 else f'{hours} hours'
+    if seconds % 60 == 0:
+        minutes = int(seconds // 60)
+        return 'minute' if minutes == 1 else f'{minutes} minutes'
+    return f'{seconds:g} seconds'
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets the first `burst` occurrences of a message through per window and
+    counts the rest.
+
+    Messages are identified by logger, level and the unformatted message
+    template, so 'Connection error sending metrics to %s' is one message
+    regardless of its arguments. Counts are turned into summary records
+    by collect_summaries().
+    """
+
+    def __init__(self, burst: int = 5, window: float = 3600.0):
+        """
+        Initialize the filter.
+
+        Args:
+            burst: Occurrences passed through per window before suppressing
+            window: Window length in seconds
+        """
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._lock = threading.Lock()
+        # key -> [window start, occurrences, suppressed, last record]
+        self._seen: Dict[Tuple[str, int, str], list] = {}
+        self._expired: List[logging.LogRecord] = []
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, str(record.msg))
+        now = record.created
+
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                if entry is not None and entry[2]:
+                    # Window ended before the writer collected its summary
+                    self._expired.append(self._summarize(entry, now))
+                self._seen[key] = [now, 1, 0, record]
+                return True
+
+            entry[1] += 1
+            if entry[1] <= self.burst:
+                return True
+            entry[2] += 1
+            entry[3] = record
+            return False
+
+    def collect_summaries(self, now: Optional[float] = None,
+                          force: bool = False) -> List[logging.LogRecord]:
+        """
+        Build summary records for windows that have ended.
+
+        Args:
+            now: Current time (defaults to time.time())
+            force: Summarize all pending counts regardless of window age
+
+        Returns:
+            Summary log records, one per suppressed message
+        """
+        now = time.time() if now is None else now
+
+        with self._lock:
+            summaries, self._expired = self._expired, []
+            for key, entry in list(self._seen.items()):
+                if not force and now - entry[0] < self.window:
+                    continue
+                if entry[2]:
+                    summaries.append(self._summarize(entry, now))
+                del self._seen[key]
+
+        return summaries
+
+    def _summarize(self, entry: list, now: float) -> logging.LogRecord:
+        """Build the summary record for a window with suppressed repeats."""
+        _, occurrences, suppressed, last = entry
+        summary = logging.makeLogRecord(last.__dict__)
+        summary.msg = '%s x %d in last %s (%d suppressed)'
+        summary.args = (last.getMessage(), occurrences, _describe_window(self.window), suppressed)
+        summary.exc_info = None
+        summary.exc_text = None
+        summary.created = now
+        summary.msecs = (now - int(now)) * 1000
+        return summary
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Queue handler that never blocks the logging thread.
+
+    Message formatting is left to the writer thread; only exception
+    tracebacks are rendered here, since they reference live frames. When
+    the queue is full the record is counted and dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._traceback_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = self._traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BackgroundLogWriter:
+    """
+    Writes queued log records to the real handlers on a daemon thread.
+
+    A stalled handler (slow disk, blocked stdout) only fills the queue;
+    the threads producing log records are never delayed.
+    """
+
+    def __init__(self, handlers: Sequence[logging.Handler], queue_size: int = 10000,
+                 rate_limiter: Optional[RateLimitFilter] = None):
+        """
+        Initialize the writer.
+
+        Args:
+            handlers: Handlers that perform the actual output
+            queue_size: Maximum queued records before new ones are dropped
+            rate_limiter: Filter whose summaries should be emitted periodically
+        """
+        self.handlers = list(handlers)
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.queue_handler = NonBlockingQueueHandler(self.queue)
+        self.rate_limiter = rate_limiter
+        if rate_limiter is not None:
+            self.queue_handler.addFilter(rate_limiter)
+
+        self._reported_drops = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the writer thread."""
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        """
+        Flush summaries and stop the writer thread.
+
+        Args:
+            timeout: Seconds to wait for queued records to be written
+        """
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+        for handler in self.handlers:
+            handler.flush()
+
+    def _run(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                self._emit_summaries(force=True)
+                return
+            if record is not None:
+                self._handle(record)
+            self._emit_summaries()
+
+    def _emit_summaries(self, force: bool = False):
+        records = []
+        if self.rate_limiter is not None:
+            records.extend(self.rate_limiter.collect_summaries(force=force))
+
+        dropped = self.queue_handler.dropped
+        if dropped != self._reported_drops:
+            records.append(logging.makeLogRecord({
+                'name': __name__,
+                'levelno': logging.WARNING,
+                'levelname': 'WARNING',
+                'msg': 'Dropped %d log records (log queue full)',
+                'args': (dropped - self._reported_drops,),
+            }))
+            self._reported_drops = dropped
+
+        for record in records:
+            self._handle(record)
+
+    def _handle(self, record: logging.LogRecord):
+        for handler in self.handlers:
+            try:
+                handler.handle(record)
+            except Exception:
+                handler.handleError(record)
@@ -2,40 +2,50 @@
 Main entry point for the metrics collector.
 """
 
-import sys
 import time
-import signal
+
+# Taken before anything else is imported so the startup profile covers imports
+_PROCESS_START = time.perf_counter()
+
+import sys
+import atexit
 import logging
 import argparse
 from pathlib import Path
-from typing import Optional
-
-import schedule
-
-from config import Config
-from metrics_collector import MetricsCollector
-from metrics_sender import MetricsSender
+from typing import List, Optional, TYPE_CHECKING
 
+from log_writer import BackgroundLogWriter, RateLimitFilter
+from startup import StartupProfiler
 
-# Global flag for graceful shutdown
-shutdown_flag = False
+if TYPE_CHECKING:
+    from config import Config
+    from history import HistoryStore
+    from metrics_collector import MetricsCollector
+    from metrics_sender import MetricsSender
+    from exporter import MetricsExporter
+    from shared_state import SharedStateWriter
 
 
-def setup_logging(config: Config):
+def setup_logging(config: 'Config') -> BackgroundLogWriter:
     """
     Setup logging configuration.
 
+    Log calls only enqueue the record; formatting and writing happen on a
+    background thread, and repeated messages are rate limited.
+
     Args:
         config: Configuration object
+
+    Returns:
+        Started log writer, to be stopped on shutdown
     """
     log_level = getattr(logging, config.log_level.upper(), logging.INFO)
 
-    # Configure root logger
+    # Output handlers, driven by the writer thread
     handlers = []
 
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(log_level)
     console_formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
@@ -55,38 +65,85 @@ def setup_logging(config: Config):
             maxBytes=config.get('logging', 'max_size', default=10) * 1024 * 1024,
             backupCount=config.get('logging', 'backup_count', default=3)
         )
-        file_handler.setLevel(log_level)
         file_handler.setFormatter(console_formatter)
         handlers.append(file_handler)
 
+    rate_limiter = RateLimitFilter(
+        burst=config.get('logging', 'burst', default=5),
+        window=config.get('logging', 'summary_interval', default=3600)
+    )
+    writer = BackgroundLogWriter(
+        handlers,
+        queue_size=config.get('logging', 'queue_size', default=10000),
+        rate_limiter=rate_limiter
+    )
+    writer.queue_handler.setLevel(log_level)
+    writer.start()
+    # Records still queued when the process exits on an error get written
+    atexit.register(writer.stop)
+
     # Configure root logger
     logging.basicConfig(
         level=log_level,
-        handlers=handlers
+        handlers=[writer.queue_handler]
     )
+    return writer
 
 
-def signal_handler(signum, frame):
-    """Handle shutdown signals gracefully."""
-    global shutdown_flag
-    logger = logging.getLogger(__name__)
-    logger.info(f"Received signal {signum}, shutting down gracefully...")
-    shutdown_flag = True
+def raise_open_file_limit():
+    """
+    Raise the soft open file limit to the hard limit, as servers commonly do.
+
+    Done once by the collector process, before the history store sizes its
+    set of mapped series from the limit.
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows; handles are not limited like descriptors
+        return
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY or (hard != resource.RLIM_INFINITY and hard <= soft):
+        return
+    target = hard if hard != resource.RLIM_INFINITY else max(soft, 65536)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    except (ValueError, OSError) as e:
+        logging.getLogger(__name__).debug("Could not raise the open file limit: %s", e)
 
 
-def collect_and_send(collector: MetricsCollector, sender: MetricsSender):
+def collect_and_send(collector: 'MetricsCollector', sender: 'MetricsSender',
+                     exporter: Optional['MetricsExporter'] = None,
+                     profiler: Optional[StartupProfiler] = None,
+                     history: Optional['HistoryStore'] = None,
+                     shared: Optional['SharedStateWriter'] = None):
     """
     Collect metrics and send to API server.
 
     Args:
         collector: MetricsCollector instance
         sender: MetricsSender instance
+        exporter: MetricsExporter to publish the sample to, if enabled
+        profiler: Startup profiler to mark the first sample on, if any
+        history: HistoryStore to record the sample in, if enabled
+        shared: SharedStateWriter to publish the sample to, if enabled
     """
     logger = logging.getLogger(__name__)
 
     try:
         logger.debug("Collecting metrics...")
         metrics = collector.collect_all()
+        if profiler is not None:
+            profiler.mark('first_sample_collected')
+
+        if exporter is not None:
+            exporter.update(metrics)
+        if history is not None:
+            history.record(metrics)
+        if shared is not None:
+            from sample_model import Sample
+            shared.publish(Sample.from_dict(metrics))
 
         logger.debug("Sending metrics...")
         success = sender.send(metrics)
@@ -97,81 +154,242 @@ def collect_and_send(collector: MetricsCollector, sender: MetricsSender):
             logger.warning("Failed to send metrics (buffered for later)")
 
     except Exception as e:
-        logger.error(f"Error collecting/sending metrics: {e}", exc_info=True)
+        logger.error("Error collecting/sending metrics: %s", e, exc_info=True)
 
 
-def run_collector(config_path: Optional[str] = None):
+def run_collector(config_path: Optional[str] = None, startup_profile: bool = False,
+                  burst: Optional[float] = None, profile: bool = False):
     """
     Run the metrics collector.
 
+    Startup is split into stages so the first sample is taken as early as
+    possible; modules that are not needed for it (the HTTP stack, the
+    event-loop runtime) are imported afterwards.
+
     Args:
         config_path: Path to configuration file
+        startup_profile: Report import and initialization time per stage
+        burst: Start a burst capture right away, for this many seconds
+               (0 uses burst.duration)
+        profile: Profile ticks over profiler.budget even if the profiler
+                 is disabled in the configuration
     """
-    global shutdown_flag
+    profiler = StartupProfiler(enabled=startup_profile, origin=_PROCESS_START)
 
     # Load configuration
-    config = Config(config_path)
+    with profiler.stage('import:config'):
+        from config import Config
+    with profiler.stage('init:config'):
+        config = Config(config_path)
 
     # Setup logging
-    setup_logging(config)
+    with profiler.stage('init:logging'):
+        writer = setup_logging(config)
     logger = logging.getLogger(__name__)
 
     logger.info("=" * 60)
     logger.info("System Metrics Collector Starting")
     logger.info("=" * 60)
-    logger.info(f"Hostname: {config.hostname}")
-    logger.info(f"API Server: {config.server_url}")
-    logger.info(f"Collection Interval: {config.collector_interval}s")
-    logger.info(f"Buffer Directory: {config.buffer_dir}")
+    logger.info("Hostname: %s", config.hostname)
+    for sink in config.sinks:
+        logger.info("Sink %s: %s", sink['name'], sink.get('url') or sink.get('path'))
+    logger.info("Collection Interval: %ss", config.collector_interval)
+    logger.info("Buffer Directory: %s", config.buffer_dir)
 
     # Log enabled metrics
     enabled_metrics = []
     for metric_type in ['cpu', 'memory', 'disk', 'network']:
         if config.is_metric_enabled(metric_type):
             enabled_metrics.append(metric_type)
-    logger.info(f"Enabled Metrics: {', '.join(enabled_metrics)}")
+    logger.info("Enabled Metrics: %s", ', '.join(enabled_metrics))
     logger.info("=" * 60)
 
     # Initialize collector and sender
-    collector = MetricsCollector(config)
-    sender = MetricsSender(config)
-
-    # Register signal handlers for graceful shutdown
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-
-    # Schedule metric collection
-    interval = config.collector_interval
-    schedule.every(interval).seconds.do(
-        collect_and_send,
-        collector=collector,
-        sender=sender
-    )
+    with profiler.stage('import:collector'):
+        from metrics_collector import MetricsCollector
+    with profiler.stage('init:collector'):
+        collector = MetricsCollector(config)
+    with profiler.stage('import:sender'):
+        from metrics_sender import MetricsSender
+    with profiler.stage('init:sender'):
+        sender = MetricsSender(config)
+
+    # Optional pull endpoint; only imported when enabled
+    exporter = None
+    if config.get('exporter', 'enabled', default=False):
+        with profiler.stage('init:exporter'):
+            from exporter import MetricsExporter
+            exporter = MetricsExporter(config)
+
+    # Optional local history; only imported when enabled
+    history = None
+    if config.get('history', 'enabled', default=False):
+        with profiler.stage('init:history'):
+            from history import open_history
+            raise_open_file_limit()
+            history = open_history(config)
+
+    # Optional shared-memory segment for local consumers; only imported when enabled
+    shared = None
+    if config.get('shared_memory', 'enabled', default=False):
+        with profiler.stage('init:shared_memory'):
+            from shared_state import open_shared_state
+            try:
+                shared = open_shared_state(config)
+            except OSError as e:
+                logger.error("Cannot create shared memory segment, not publishing: %s", e)
+
+    # Burst capture ring, preallocated so a trigger does not allocate
+    burst_capture = None
+    if config.get('burst', 'enabled', default=True) or burst is not None:
+        with profiler.stage('init:burst'):
+            from burst import BurstCapture
+            burst_capture = BurstCapture(config, sender)
+
+    # Slow-tick profiler; its watchdog thread idles until a tick overruns
+    tick_profiler = None
+    if config.get('profiler', 'enabled', default=False) or profile:
+        with profiler.stage('init:tick_profiler'):
+            from tick_profiler import SlowTickProfiler
+            tick_profiler = SlowTickProfiler(config, force=profile)
 
     # Collect immediately on start
     logger.info("Collecting initial metrics...")
-    collect_and_send(collector, sender)
+    with profiler.stage('first_sample'):
+        collect_and_send(collector, sender, exporter=exporter, profiler=profiler,
+                         history=history, shared=shared)
 
-    # Main loop
-    logger.info("Entering main collection loop")
-    while not shutdown_flag:
-        try:
-            schedule.run_pending()
-            time.sleep(1)
-        except Exception as e:
-            logger.error(f"Error in main loop: {e}", exc_info=True)
-            time.sleep(5)
+    with profiler.stage('init:runtime'):
+        from runtime import CollectorRuntime
+        runtime = CollectorRuntime(config, collector, sender, exporter=exporter,
+                                   history=history, burst=burst_capture,
+                                   profiler=tick_profiler, shared=shared)
+
+    profiler.mark('ready')
+    profiler.emit()
 
-    # Shutdown
-    logger.info("Shutting down collector...")
+    if burst is not None:
+        runtime.start_burst(burst, 'cli')
+
+    # Main loop; returns after SIGINT/SIGTERM and a bounded flush
+    runtime.run()
 
     # Log buffer statistics
+    sender.close()
+    if history is not None:
+        history.close()
+    if shared is not None:
+        shared.close()
     buffer_stats = sender.get_buffer_stats()
-    logger.info(f"Buffer stats: {buffer_stats['count']} files, "
-                f"{buffer_stats['total_size'] / 1024:.2f} KB "
-                f"({buffer_stats['usage_percent']:.1f}% of max)")
+    logger.info("Buffer stats: %s samples in %s segments, %.2f KB (%.1f%% of max)",
+                buffer_stats['count'], buffer_stats['segments'],
+                buffer_stats['total_size'] / 1024, buffer_stats['usage_percent'])
 
     logger.info("Collector stopped")
+    writer.stop()
+
+
+def _parse_duration(value: str) -> float:
+    """Parse a duration such as 90, 30s, 15m, 6h or 7d into seconds."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    value = value.strip()
+    try:
+        if value and value[-1] in units:
+            return float(value[:-1]) * units[value[-1]]
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid duration: {value!r}")
+
+
+def _format_time(timestamp: float) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(timestamp))
+
+
+def run_query(config_path: Optional[str], patterns: List[str], since: float,
+              until: float = 0.0, resolution: Optional[str] = None, summary: bool = False):
+    """
+    Print range or aggregate queries against the local history store.
+
+    Args:
+        config_path: Path to configuration file
+        patterns: Series names or '*' patterns; empty lists the stored series
+        since: Range start, in seconds before now
+        until: Range end, in seconds before now
+        resolution: Tier to read (5s, 1m, 5m); by default the finest
+                    one covering the range
+        summary: Print one count/avg/min/max line per series instead of points
+    """
+    from config import Config
+    from history import open_history
+
+    store = open_history(Config(config_path), read_only=True)
+    try:
+        if not patterns:
+            for name in store.series():
+                print(name)
+            return
+
+        series = store.match(patterns)
+        if not series:
+            print("No matching series", file=sys.stderr)
+            return
+
+        now = time.time()
+        start, end = now - since, now - until
+        tier = store.select_tier(start, now)
+        if resolution is not None:
+            tier = next(t for t in store.tiers if t.name == resolution)
+
+        for name in series:
+            began = time.perf_counter()
+            if summary:
+                point = store.aggregate(name, start, end, tier)
+                elapsed = (time.perf_counter() - began) * 1000
+                if point is None:
+                    print(f"{name}  no data")
+                else:
+                    print(f"{name}  n={point.count} avg={point.avg:.6g} min={point.min:.6g} "
+                          f"max={point.max:.6g}  ({tier.name}, {elapsed:.1f} ms)")
+                continue
+
+            points = store.query(name, start, end, tier)
+            elapsed = (time.perf_counter() - began) * 1000
+            print(f"# {name} {_format_time(start)} .. {_format_time(end)} "
+                  f"({tier.name}, {len(points)} points, {elapsed:.1f} ms)")
+            for point in points:
+                if point.count == 1:
+                    print(f"{_format_time(point.timestamp)}  {point.avg:.6g}")
+                else:
+                    print(f"{_format_time(point.timestamp)}  avg={point.avg:.6g} "
+                          f"min={point.min:.6g} max={point.max:.6g} n={point.count}")
+    finally:
+        store.close()
+
+
+def run_read_shared(config_path: Optional[str], path: Optional[Path]):
+    """
+    Print the latest sample published in shared memory as JSON.
+
+    Args:
+        config_path: Configuration file naming the segment, if path is not given
+        path: Segment file
+    """
+    import json
+    from shared_state import DEFAULT_PATH, SharedStateReader
+
+    if path is None:
+        from config import Config
+        path = Config(config_path).get('shared_memory', 'path', default=None) or DEFAULT_PATH
+
+    with SharedStateReader(path) as reader:
+        sample = reader.sample()
+        if sample is None:
+            print("Nothing published yet", file=sys.stderr)
+            return
+        if reader.closed:
+            print(f"Collector (pid {reader.pid}) has stopped; values are stale",
+                  file=sys.stderr)
+        print(json.dumps(sample.to_dict(), indent=2))
 
 
 def main():
@@ -188,16 +406,159 @@ def main():
         help='Path to configuration file (default: config/collector-config.yaml)'
     )
 
+    parser.add_argument(
+        '--startup-profile',
+        action='store_true',
+        help='Report import and initialization time per startup stage'
+    )
+
+    parser.add_argument(
+        '--burst',
+        type=_parse_duration,
+        nargs='?',
+        const=0.0,
+        default=None,
+        metavar='DURATION',
+        help='Start a high-frequency burst capture at startup, e.g. 2m '
+             '(default: burst.duration)'
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Profile collection and send ticks that run over profiler.budget'
+    )
+
     parser.add_argument(
         '--version',
         action='version',
         version='%(prog)s 1.0.0'
     )
 
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.add_parser('run', help='Run the collector (default)')
+
+    query_parser = subparsers.add_parser(
+        'query',
+        help='Query the local history store',
+        description='Range and aggregate queries against the local history store. '
+                    'Without series, lists the stored series.'
+    )
+    query_parser.add_argument(
+        'series',
+        nargs='*',
+        help="Series names, '*' matches any text (e.g. 'cpu.usage.*')"
+    )
+    query_parser.add_argument(
+        '--since',
+        type=_parse_duration,
+        default=_parse_duration('1h'),
+        help='Range start as a time before now, e.g. 30m, 6h, 7d (default: 1h)'
+    )
+    query_parser.add_argument(
+        '--until',
+        type=_parse_duration,
+        default=0.0,
+        help='Range end as a time before now (default: now)'
+    )
+    query_parser.add_argument(
+        '--resolution',
+        choices=['5s', '1m', '5m'],
+        default=None,
+        help='Tier to read (default: finest tier covering the range)'
+    )
+    query_parser.add_argument(
+        '--summary',
+        action='store_true',
+        help='Print count/avg/min/max over the range instead of points'
+    )
+
+    record_parser = subparsers.add_parser(
+        'record',
+        help='Record /proc and /sys snapshots for replay',
+        description='Record the /proc and /sys files the collector reads, for '
+                    'deterministic replay in tests and benchmarks.'
+    )
+    record_parser.add_argument('dest', help='Snapshot directory to create')
+    record_parser.add_argument(
+        '--frames',
+        type=int,
+        default=2,
+        help='Frames to record; rates need at least two (default: 2)'
+    )
+    record_parser.add_argument(
+        '--interval',
+        type=_parse_duration,
+        default=_parse_duration('5s'),
+        help='Time between frames (default: 5s)'
+    )
+
+    stub_parser = subparsers.add_parser(
+        'ingest-stub',
+        help='Run a local ingest endpoint for testing delivery',
+        description='Accept samples the way the ingest API does, dropping duplicates by '
+                    'session and sequence number.'
+    )
+    stub_parser.add_argument('--host', default='127.0.0.1', help='Address (default: 127.0.0.1)')
+    stub_parser.add_argument('--port', type=int, default=8000, help='Port (default: 8000)')
+    stub_parser.add_argument('--output', type=Path, default=None,
+                             help='JSON lines file for stored samples')
+    stub_parser.add_argument(
+        '--delay',
+        type=_parse_duration,
+        default=0.0,
+        help='Delay before each response, to mimic a high-latency link, e.g. 0.2s'
+    )
+
+    shared_parser = subparsers.add_parser(
+        'read-shared',
+        help='Print the latest sample from the shared memory segment',
+        description='Read the values a running collector publishes with '
+                    'shared_memory.enabled, without sampling the host.'
+    )
+    shared_parser.add_argument('--path', type=Path, default=None,
+                               help='Segment file (default: shared_memory.path)')
+
     args = parser.parse_args()
 
+    if args.command == 'read-shared':
+        try:
+            run_read_shared(args.config, args.path)
+        except (OSError, ValueError) as e:
+            print(f"Cannot read shared memory segment: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if args.command == 'ingest-stub':
+        from ingest_stub import run_stub
+        try:
+            run_stub(args.host, args.port, args.output, args.delay)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.command == 'record':
+        from backends import record_snapshot
+        try:
+            frames = record_snapshot(Path(args.dest), frames=args.frames, interval=args.interval)
+        except OSError as e:
+            print(f"Recording failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Recorded {frames} frames to {args.dest}")
+        return
+
+    if args.command == 'query':
+        try:
+            run_query(args.config, args.series, args.since, args.until,
+                      resolution=args.resolution, summary=args.summary)
+        except Exception as e:
+            print(f"Query failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
     try:
-        run_collector(args.config)
+        run_collector(args.config, startup_profile=args.startup_profile, burst=args.burst,
+                      profile=args.profile)
     except KeyboardInterrupt:
         print("\nInterrupted by user")
         sys.exit(0)
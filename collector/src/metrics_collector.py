@@ -2,29 +2,109 @@
 System metrics collector using psutil.
 """
 
-import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
 import psutil
-from typing import Dict, List, Any
-from datetime import datetime
+
+from backends import PsutilBackend
+from cpu_engine import CPU_MODES, PerCoreEngine, summarize
+from interface_tracker import DEFAULT_MAX_INTERFACES, DEFAULT_STATE_TTL, InterfaceTracker
+from sample_model import (
+    CpuMetrics, DiskMetrics, MemoryMetrics, NetworkMetrics, Sample, intern_names
+)
+from serializer import format_timestamp
+
+
+# Metric families in collection order
+FAMILIES = ('cpu', 'memory', 'disk', 'network')
+
+# Seconds CPU usage is measured over when there is no previous tick
+CPU_FIRST_WINDOW = 1.0
+
+# CpuUsage.core_modes columns reported in full mode (idle is implied)
+_FULL_MODE_COLUMNS = tuple(index for index, mode in enumerate(CPU_MODES) if mode != 'idle')
+_USER, _SYSTEM, _IDLE, _IOWAIT = (CPU_MODES.index(mode)
+                                  for mode in ('user', 'system', 'idle', 'iowait'))
 
 
 class MetricsCollector:
     """Collects system metrics using psutil."""
 
-    def __init__(self, config):
+    def __init__(self, config, backend=None):
         """
         Initialize the metrics collector.
 
         Args:
             config: Configuration object
+            backend: System data source (default: PsutilBackend, the live
+                     system); a ProcfsBackend replays a snapshot
         """
         self.config = config
-        self.hostname = config.hostname
+        self._backend = backend or PsutilBackend()
 
-        # Store previous network/disk I/O counters for rate calculation
-        self._prev_net_io = None
+        # Store previous network/disk I/O counters for rate calculation.
+        # Each family keeps its own timestamp since families may be
+        # collected on different schedules and threads.
+        self._net_tracker = InterfaceTracker()
         self._prev_disk_io = None
-        self._prev_time = None
+        self._prev_disk_time = None
+
+        # Per-core CPU times from the previous tick; the physical core
+        # count is looked up again only when the logical count changes
+        self._cpu_engine = PerCoreEngine()
+        self._cpu_count: Optional[int] = None
+        self._physical_count: Optional[int] = None
+
+        self._collectors = {
+            'cpu': self._collect_cpu,
+            'memory': self._collect_memory,
+            'disk': self._collect_disk,
+            'network': self._collect_network,
+        }
+
+        self.apply_config(config)
+
+    def apply_config(self, config):
+        """
+        Resolve the settings used on every tick from a configuration.
+
+        Called at construction and again after a configuration reload.
+        Counter state used for rate calculation is left untouched.
+
+        Args:
+            config: Configuration object
+        """
+        self.config = config
+        self.hostname = config.hostname
+
+        self._enabled = frozenset(
+            metric_type for metric_type in FAMILIES
+            if config.is_metric_enabled(metric_type)
+        )
+        self._per_cpu = config.get('metrics', 'cpu', 'per_cpu', default=True)
+        self._per_cpu_mode = config.get('metrics', 'cpu', 'per_cpu_mode', default='usage')
+        self._top_cores = config.get('metrics', 'cpu', 'top_cores', default=5)
+        self._exclude_fs = frozenset(
+            config.get('metrics', 'disk', 'exclude_filesystems', default=[]) or []
+        )
+        self._exclude_mp = tuple(
+            pattern.rstrip('*')
+            for pattern in config.get('metrics', 'disk', 'exclude_mountpoints', default=[]) or []
+        )
+        self._net_tracker.configure(
+            include=config.get('metrics', 'network', 'interfaces', default=[]) or [],
+            exclude=config.get('metrics', 'network', 'exclude_interfaces', default=[]) or [],
+            groups=config.get('metrics', 'network', 'groups', default={}) or {},
+            max_interfaces=config.get('metrics', 'network', 'max_interfaces',
+                                      default=DEFAULT_MAX_INTERFACES),
+            state_ttl=config.get('metrics', 'network', 'state_ttl', default=DEFAULT_STATE_TTL),
+        )
+
+    @property
+    def enabled_families(self) -> List[str]:
+        """Get the enabled metric families in collection order."""
+        return [family for family in FAMILIES if family in self._enabled]
 
     def collect_all(self) -> Dict[str, Any]:
         """
@@ -33,25 +113,36 @@ class MetricsCollector:
         Returns:
             Dictionary containing all collected metrics
         """
-        metrics = {
-            'timestamp': datetime.utcnow().isoformat() + 'Z',
-            'hostname': self.hostname,
-            'metrics': {}
-        }
+        return self.collect(self.enabled_families)
 
-        if self.config.is_metric_enabled('cpu'):
-            metrics['metrics']['cpu'] = self.collect_cpu_metrics()
+    def collect(self, families: Iterable[str]) -> Dict[str, Any]:
+        """
+        Collect the given metric families into one sample.
 
-        if self.config.is_metric_enabled('memory'):
-            metrics['metrics']['memory'] = self.collect_memory_metrics()
+        Args:
+            families: Metric families to collect (cpu, memory, disk, network)
 
-        if self.config.is_metric_enabled('disk'):
-            metrics['metrics']['disk'] = self.collect_disk_metrics()
+        Returns:
+            Dictionary containing the collected metrics
+        """
+        return self.collect_sample(families).to_dict()
 
-        if self.config.is_metric_enabled('network'):
-            metrics['metrics']['network'] = self.collect_network_metrics()
+    def collect_sample(self, families: Iterable[str]) -> Sample:
+        """
+        Collect the given metric families into one compact sample.
 
-        return metrics
+        Args:
+            families: Metric families to collect (cpu, memory, disk, network)
+
+        Returns:
+            Sample; use to_dict() for the JSON shape
+        """
+        sample = Sample(format_timestamp(self._backend.time()), self.hostname)
+
+        for family in families:
+            setattr(sample, family, self._collectors[family]())
+
+        return sample
 
     def collect_cpu_metrics(self) -> Dict[str, Any]:
         """
@@ -60,45 +151,7 @@ class MetricsCollector:
         Returns:
             Dictionary containing CPU metrics
         """
-        metrics = {}
-
-        # CPU percentages
-        cpu_times = psutil.cpu_times_percent(interval=1)
-        metrics['usage'] = {
-            'total': psutil.cpu_percent(interval=None),
-            'user': cpu_times.user,
-            'system': cpu_times.system,
-            'idle': cpu_times.idle,
-        }
-
-        # Add iowait if available (Linux)
-        if hasattr(cpu_times, 'iowait'):
-            metrics['usage']['iowait'] = cpu_times.iowait
-
-        # Per-CPU metrics if enabled
-        if self.config.get('metrics', 'cpu', 'per_cpu', default=True):
-            per_cpu = psutil.cpu_percent(interval=None, percpu=True)
-            metrics['cores'] = {
-                'usage': per_cpu,
-                'count': psutil.cpu_count(logical=True),
-                'physical_count': psutil.cpu_count(logical=False)
-            }
-
-        # Load average (Unix-like systems)
-        try:
-            load_avg = psutil.getloadavg()
-            metrics['load'] = {
-                'average': {
-                    '1m': load_avg[0],
-                    '5m': load_avg[1],
-                    '15m': load_avg[2]
-                }
-            }
-        except (AttributeError, OSError):
-            # Not available on Windows
-            pass
-
-        return metrics
+        return self._collect_cpu().to_dict()
 
     def collect_memory_metrics(self) -> Dict[str, Any]:
         """
@@ -107,36 +160,7 @@ class MetricsCollector:
         Returns:
             Dictionary containing memory metrics
         """
-        metrics = {}
-
-        # Virtual memory
-        vmem = psutil.virtual_memory()
-        metrics['total'] = vmem.total
-        metrics['used'] = vmem.used
-        metrics['available'] = vmem.available
-        metrics['free'] = vmem.free
-        metrics['usage'] = {
-            'percent': vmem.percent
-        }
-
-        # Add buffers and cached if available (Linux)
-        if hasattr(vmem, 'buffers'):
-            metrics['buffers'] = vmem.buffers
-        if hasattr(vmem, 'cached'):
-            metrics['cached'] = vmem.cached
-
-        # Swap memory
-        swap = psutil.swap_memory()
-        metrics['swap'] = {
-            'total': swap.total,
-            'used': swap.used,
-            'free': swap.free,
-            'usage': {
-                'percent': swap.percent
-            }
-        }
-
-        return metrics
+        return self._collect_memory().to_dict()
 
     def collect_disk_metrics(self) -> Dict[str, Any]:
         """
@@ -145,184 +169,186 @@ class MetricsCollector:
         Returns:
             Dictionary containing disk metrics
         """
-        metrics = {
-            'partitions': [],
-            'io': {}
-        }
+        return self._collect_disk().to_dict()
+
+    def collect_network_metrics(self) -> Dict[str, Any]:
+        """
+        Collect network metrics.
+
+        Returns:
+            Dictionary containing network metrics
+        """
+        return self._collect_network().to_dict()
+
+    def _collect_cpu(self) -> CpuMetrics:
+        """
+        Collect CPU metrics into a compact record.
+
+        System and per-core usage come from one read of every core's
+        cumulative times, compared with the previous tick's read.
+        """
+        backend = self._backend
+        engine = self._cpu_engine
+
+        usage = engine.update(*backend.cpu_stat())
+        if usage is None:
+            # First tick, or CPUs came or went: measure over a short window
+            backend.sleep(CPU_FIRST_WINDOW)
+            usage = engine.update(*backend.cpu_stat())
+            if usage is None:
+                raise RuntimeError("CPU set changed while measuring usage")
+
+        modes = usage.modes
+        metrics = CpuMetrics(usage.total, modes[_USER], modes[_SYSTEM], modes[_IDLE],
+                             modes[_IOWAIT])
+
+        # Per-CPU metrics if enabled
+        if self._per_cpu:
+            count = len(usage.cores)
+            if count != self._cpu_count:
+                self._cpu_count = count
+                self._physical_count = backend.cpu_count(logical=False)
+            metrics.count = count
+            metrics.physical_count = self._physical_count
+
+            if self._per_cpu_mode == 'summary':
+                metrics.summary = summarize(usage, self._top_cores)
+            else:
+                metrics.cores = usage.cores
+                if self._per_cpu_mode == 'full':
+                    metrics.core_modes = tuple(usage.core_modes[index]
+                                               for index in _FULL_MODE_COLUMNS)
+
+        # Load average (Unix-like systems)
+        try:
+            metrics.load = tuple(backend.getloadavg())
+        except (AttributeError, OSError):
+            # Not available on Windows
+            pass
+
+        return metrics
 
-        # Get exclusion lists
-        exclude_fs = self.config.get('metrics', 'disk', 'exclude_filesystems', default=[])
-        exclude_mp = self.config.get('metrics', 'disk', 'exclude_mountpoints', default=[])
+    def _collect_memory(self) -> MemoryMetrics:
+        """Collect memory metrics into a compact record."""
+        vmem = self._backend.virtual_memory()
+        swap = self._backend.swap_memory()
+        # buffers and cached are only reported on Linux
+        return MemoryMetrics(
+            vmem.total, vmem.used, vmem.available, vmem.free, vmem.percent,
+            getattr(vmem, 'buffers', None), getattr(vmem, 'cached', None),
+            swap.total, swap.used, swap.free, swap.percent
+        )
+
+    def _collect_disk(self) -> DiskMetrics:
+        """Collect disk metrics into a compact record."""
+        backend = self._backend
+        metrics = DiskMetrics()
+        devices = []
+        mountpoints = []
+        fstypes = []
+
+        exclude_fs = self._exclude_fs
+        exclude_mp = self._exclude_mp
 
         # Disk usage per partition
-        for partition in psutil.disk_partitions(all=False):
+        for partition in backend.disk_partitions(all=False):
             # Skip excluded filesystems
             if partition.fstype in exclude_fs:
                 continue
 
             # Skip excluded mountpoints
-            if any(partition.mountpoint.startswith(pattern.rstrip('*'))
-                   for pattern in exclude_mp):
+            if exclude_mp and partition.mountpoint.startswith(exclude_mp):
                 continue
 
             try:
-                usage = psutil.disk_usage(partition.mountpoint)
-                partition_metrics = {
-                    'device': partition.device,
-                    'mountpoint': partition.mountpoint,
-                    'fstype': partition.fstype,
-                    'usage': {
-                        'total': usage.total,
-                        'used': usage.used,
-                        'free': usage.free,
-                        'percent': usage.percent
-                    }
-                }
-
-                # Inode information (Unix-like systems)
-                try:
-                    import os
-                    statvfs = os.statvfs(partition.mountpoint)
-                    partition_metrics['inode'] = {
-                        'total': statvfs.f_files,
-                        'used': statvfs.f_files - statvfs.f_ffree,
-                        'free': statvfs.f_ffree,
-                        'usage': {
-                            'percent': ((statvfs.f_files - statvfs.f_ffree) / statvfs.f_files * 100)
-                                      if statvfs.f_files > 0 else 0
-                        }
-                    }
-                except (AttributeError, OSError):
-                    # Not available on Windows
-                    pass
-
-                metrics['partitions'].append(partition_metrics)
+                usage = backend.disk_usage(partition.mountpoint)
             except (PermissionError, OSError):
                 # Skip partitions we can't access
                 continue
 
+            devices.append(partition.device)
+            mountpoints.append(partition.mountpoint)
+            fstypes.append(partition.fstype)
+            metrics.usage_total.append(usage.total)
+            metrics.usage_used.append(usage.used)
+            metrics.usage_free.append(usage.free)
+            metrics.usage_percent.append(usage.percent)
+
+            # Inode information (Unix-like systems)
+            try:
+                statvfs = backend.statvfs(partition.mountpoint)
+                used = statvfs.f_files - statvfs.f_ffree
+                metrics.inode_total.append(statvfs.f_files)
+                metrics.inode_used.append(used)
+                metrics.inode_free.append(statvfs.f_ffree)
+                metrics.inode_percent.append(
+                    used / statvfs.f_files * 100 if statvfs.f_files > 0 else 0
+                )
+            except (AttributeError, OSError):
+                # Not available on Windows
+                metrics.inode_total.append(-1)
+                metrics.inode_used.append(0)
+                metrics.inode_free.append(0)
+                metrics.inode_percent.append(0)
+
+        metrics.devices = intern_names(devices)
+        metrics.mountpoints = intern_names(mountpoints)
+        metrics.fstypes = intern_names(fstypes)
+
         # Disk I/O statistics
-        current_time = time.time()
-        disk_io = psutil.disk_io_counters(perdisk=False)
+        current_time = backend.time()
+        disk_io = backend.disk_io_counters(perdisk=False)
 
         if disk_io:
-            if self._prev_disk_io and self._prev_time:
-                time_delta = current_time - self._prev_time
+            if self._prev_disk_io and self._prev_disk_time:
+                time_delta = current_time - self._prev_disk_time
                 if time_delta > 0:
-                    metrics['io'] = {
-                        'read': {
-                            'bytes': (disk_io.read_bytes - self._prev_disk_io.read_bytes) / time_delta,
-                            'count': (disk_io.read_count - self._prev_disk_io.read_count) / time_delta
-                        },
-                        'write': {
-                            'bytes': (disk_io.write_bytes - self._prev_disk_io.write_bytes) / time_delta,
-                            'count': (disk_io.write_count - self._prev_disk_io.write_count) / time_delta
-                        }
-                    }
+                    prev = self._prev_disk_io
+                    metrics.io = (
+                        (disk_io.read_bytes - prev.read_bytes) / time_delta,
+                        (disk_io.read_count - prev.read_count) / time_delta,
+                        (disk_io.write_bytes - prev.write_bytes) / time_delta,
+                        (disk_io.write_count - prev.write_count) / time_delta,
+                    )
 
             # Store current values for next iteration
             self._prev_disk_io = disk_io
-            self._prev_time = current_time
+            self._prev_disk_time = current_time
 
         return metrics
 
-    def collect_network_metrics(self) -> Dict[str, Any]:
-        """
-        Collect network metrics.
-
-        Returns:
-            Dictionary containing network metrics
-        """
-        metrics = {
-            'interfaces': [],
-            'connections': {}
-        }
-
-        # Get interface filters
-        include_ifaces = self.config.get('metrics', 'network', 'interfaces', default=[])
-        exclude_ifaces = self.config.get('metrics', 'network', 'exclude_interfaces', default=[])
-
-        # Network I/O per interface
-        current_time = time.time()
-        net_io = psutil.net_io_counters(pernic=True)
-
-        for iface, counters in net_io.items():
-            # Filter interfaces
-            if include_ifaces and iface not in include_ifaces:
-                continue
-            if iface in exclude_ifaces:
-                continue
-
-            iface_metrics = {
-                'name': iface,
-                'io': {
-                    'bytes': {
-                        'sent': counters.bytes_sent,
-                        'recv': counters.bytes_recv
-                    },
-                    'packets': {
-                        'sent': counters.packets_sent,
-                        'recv': counters.packets_recv
-                    },
-                    'errors': {
-                        'in': counters.errin,
-                        'out': counters.errout
-                    },
-                    'dropped': {
-                        'in': counters.dropin,
-                        'out': counters.dropout
-                    }
-                }
-            }
-
-            # Calculate rates if we have previous data
-            if self._prev_net_io and iface in self._prev_net_io and self._prev_time:
-                time_delta = current_time - self._prev_time
-                if time_delta > 0:
-                    prev = self._prev_net_io[iface]
-                    iface_metrics['io_rate'] = {
-                        'bytes_sent': (counters.bytes_sent - prev.bytes_sent) / time_delta,
-                        'bytes_recv': (counters.bytes_recv - prev.bytes_recv) / time_delta,
-                        'packets_sent': (counters.packets_sent - prev.packets_sent) / time_delta,
-                        'packets_recv': (counters.packets_recv - prev.packets_recv) / time_delta
-                    }
-
-            metrics['interfaces'].append(iface_metrics)
+    def _collect_network(self) -> NetworkMetrics:
+        """Collect network metrics into a compact record."""
+        backend = self._backend
 
-        # Store current values for next iteration
-        self._prev_net_io = net_io
-        self._prev_time = current_time
+        # Network I/O per interface, filtered, grouped and capped
+        current_time = backend.time()
+        metrics = self._net_tracker.update(backend.net_io_counters(pernic=True), current_time)
 
         # Network connections
         try:
-            connections = psutil.net_connections(kind='inet')
-            conn_stats = {
-                'tcp': 0,
-                'udp': 0,
-                'established': 0,
-                'time_wait': 0,
-                'close_wait': 0,
-                'listen': 0
-            }
+            connections = backend.net_connections(kind='inet')
+            tcp = udp = established = time_wait = close_wait = listen = 0
 
             for conn in connections:
                 if conn.type == 1:  # SOCK_STREAM (TCP)
-                    conn_stats['tcp'] += 1
+                    tcp += 1
                 elif conn.type == 2:  # SOCK_DGRAM (UDP)
-                    conn_stats['udp'] += 1
+                    udp += 1
 
                 if hasattr(conn, 'status'):
                     status = conn.status.lower()
                     if status == 'established':
-                        conn_stats['established'] += 1
+                        established += 1
                     elif status == 'time_wait':
-                        conn_stats['time_wait'] += 1
+                        time_wait += 1
                     elif status == 'close_wait':
-                        conn_stats['close_wait'] += 1
+                        close_wait += 1
                     elif status == 'listen':
-                        conn_stats['listen'] += 1
+                        listen += 1
 
-            metrics['connections'] = conn_stats
+            # CONNECTION_STATES order
+            metrics.connections = (tcp, udp, established, time_wait, close_wait, listen)
         except (psutil.AccessDenied, PermissionError):
             # May require elevated privileges
             pass
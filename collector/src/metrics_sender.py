@@ -1,199 +1,534 @@
 """
-Metrics sender for transmitting collected metrics to the API server.
+Metrics sender for transmitting collected metrics to the configured sinks.
 """
 
+import itertools
 import json
 import logging
-import requests
-from pathlib import Path
-from typing import Dict, Any, List
-from datetime import datetime
+import threading
+from typing import Dict, Any, List, Mapping, Optional, Sequence, Union
+
+from buffer_store import BufferStore
+from load_shedding import BackpressureMonitor, LEVEL_NAMES, SHED_NONE, merge_samples, shed
+from sample_model import Sample
+from sequencing import new_session
+from serializer import encode
+from sinks import Sink, create_sink
 
 
 logger = logging.getLogger(__name__)
 
+# Samples queued per sink before new ones spill to its disk buffer
+DEFAULT_QUEUE_SIZE = 1000
 
-class MetricsSender:
-    """Sends metrics to the API server with local buffering."""
 
-    def __init__(self, config):
+class EncodedSample:
+    """
+    A collected sample and its JSON encodings.
+
+    Each shed level is encoded at most once and the resulting bytes are
+    shared by every sink and buffer that needs them. The sample itself is
+    kept in its compact form (see sample_model) while it waits in a queue.
+    """
+
+    __slots__ = ('sample', '_payloads')
+
+    def __init__(self, sample: Union[Sample, Dict[str, Any]],
+                 metrics: Optional[Dict[str, Any]] = None):
         """
-        Initialize the metrics sender.
+        Initialize the encoded sample.
 
         Args:
-            config: Configuration object
+            sample: Compact sample, or a sample dictionary
+            metrics: Dictionary form of a compact sample, if already built.
+                     It is encoded right away and not retained.
         """
-        self.config = config
-        self.server_url = config.server_url.rstrip('/') + '/api/v1/metrics/collect'
-        self.api_key = config.api_key
-        self.buffer_dir = config.buffer_dir
-        self.buffer_max_size = config.buffer_max_size * 1024 * 1024  # Convert to bytes
+        self.sample = sample
+        self._payloads: Dict[int, Optional[bytes]] = {}
+        if metrics is not None:
+            self._payloads[SHED_NONE] = encode(metrics)
+
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """Get the sample in its dictionary form."""
+        if isinstance(self.sample, dict):
+            return self.sample
+        return self.sample.to_dict()
+
+    def payload(self, level: int = SHED_NONE) -> Optional[bytes]:
+        """
+        Get the sample encoded at a shed level.
+
+        Args:
+            level: Shed level (SHED_NONE sends the full sample)
+
+        Returns:
+            Compact JSON bytes, or None if shedding left no metrics (a
+            sample of one family that is dropped at this level)
+        """
+        if level in self._payloads:
+            return self._payloads[level]
+        sample = shed(self.metrics, level)
+        payload = encode(sample) if sample['metrics'] or level == SHED_NONE else None
+        self._payloads[level] = payload
+        return payload
 
-        # Create buffer directory if it doesn't exist
-        self.buffer_dir.mkdir(parents=True, exist_ok=True)
 
-        # Timeout for HTTP requests (seconds)
-        self.timeout = 10
+class SinkChannel:
+    """
+    Delivery state for one sink: buffer, backpressure and shed level.
 
-    def send(self, metrics: Dict[str, Any]) -> bool:
+    State changes are serialized by a lock, so a configuration reload can
+    be applied from any thread without interleaving with a send; requests
+    to the sink run outside it, so up to `window` of them can be in flight.
+    """
+
+    def __init__(self, spec: Mapping[str, Any], config):
         """
-        Send metrics to the API server.
+        Initialize the channel.
 
         Args:
-            metrics: Metrics data to send
+            spec: Sink definition (see Config.sinks)
+            config: Configuration object
+        """
+        self.name = spec['name']
+        self.backpressure = BackpressureMonitor(config)
+        self._shed_level = SHED_NONE
+        self._lock = threading.RLock()
+        # One replay at a time; it drops self._lock while a request is out
+        self._replay_lock = threading.Lock()
+        self.spec: Optional[Mapping[str, Any]] = None
+        self.sink: Optional[Sink] = None
+        self.store: Optional[BufferStore] = None
+        self.apply_config(spec, config)
+
+    def apply_config(self, spec: Mapping[str, Any], config):
+        """
+        Apply a (possibly changed) sink definition.
+
+        Already buffered metrics are kept unless the buffer directory moves.
+
+        Args:
+            spec: Sink definition (see Config.sinks)
+            config: Configuration object
+        """
+        with self._lock:
+            self.backpressure.apply_config(config)
+            self.batch_size = spec['batch_size']
+            self.window = spec['window']
+            self.queue_size = spec.get(
+                'queue_size', config.get('collector', 'queue_size', default=DEFAULT_QUEUE_SIZE)
+            )
+            self.buffer_max_size = int(spec['buffer_max_size'] * 1024 * 1024)  # Convert to bytes
+
+            if spec != self.spec:
+                if self.sink is not None:
+                    self.sink.close()
+                self.sink = create_sink(spec, self.backpressure)
+
+            if self.store is None or spec['buffer_dir'] != self.buffer_dir:
+                if self.store is not None:
+                    self.store.close()
+                self.buffer_dir = spec['buffer_dir']
+                self.store = BufferStore(self.buffer_dir, self.buffer_max_size)
+                self._import_legacy_buffers()
+            self.store.max_size = self.buffer_max_size
+            self.spec = spec
+
+    def send(self, samples: Sequence[EncodedSample]) -> bool:
+        """
+        Deliver a batch of samples, buffering them if that fails.
+
+        Args:
+            samples: Samples in chronological order
 
         Returns:
             True if successfully sent, False otherwise
         """
-        # Try to send buffered metrics first
-        self._send_buffered_metrics()
-
-        # Try to send current metrics
-        success = self._send_to_api(metrics)
+        with self._lock:
+            # Unless the sink asked us to back off, send; while it is under
+            # pressure, low-priority detail is left out
+            sink = None
+            if not self.backpressure.backing_off():
+                level = self._update_shed_level(self.backpressure.server_level())
+                sink = self.sink
+
+        if sink is not None:
+            payloads = [payload for payload in (sample.payload(level) for sample in samples)
+                        if payload is not None]
+            if not payloads:
+                # Every sample was shed entirely; nothing to send or buffer
+                return True
+            success = sink.deliver(payloads)
+        else:
+            success = False
 
         if not success:
-            # Buffer the metrics if sending failed
-            self._buffer_metrics(metrics)
+            # Buffer the metrics if sending failed; only this batch is
+            # retransmitted, receivers drop any copy they already stored
+            with self._lock:
+                for sample in samples:
+                    self.buffer(sample)
 
         return success
 
-    def _send_to_api(self, metrics: Dict[str, Any]) -> bool:
+    def buffer(self, sample: EncodedSample):
         """
-        Send metrics to the API server via HTTP POST.
+        Save a sample to the local buffer for later transmission.
 
         Args:
-            metrics: Metrics data to send
+            sample: Sample to buffer
+        """
+        with self._lock:
+            # Under buffer pressure, merge older samples into coarser
+            # aggregates first; whole segments are only dropped if that is
+            # not enough
+            usage = self._get_buffer_usage()
+            if usage >= self.backpressure.aggregate_watermark:
+                self._compact_buffers(self.backpressure.level(usage))
+                usage = self._get_buffer_usage()
+            while usage >= 1.0 and self.store.segment_count:
+                dropped = self.store.drop_oldest()
+                logger.warning("Buffer for sink %s is full, dropped %s oldest buffered samples",
+                               self.name, dropped)
+                usage = self._get_buffer_usage()
+
+            level = self._update_shed_level(self.backpressure.level(usage))
+            payload = sample.payload(level)
+            if payload is None:
+                # Nothing of this sample is kept at the current shed level
+                return
+
+            try:
+                self.store.append(payload)
+                logger.debug("Metrics buffered to %s", self.buffer_dir)
+            except Exception as e:
+                logger.error("Failed to buffer metrics for sink %s: %s", self.name, e)
+
+    def replay(self) -> int:
+        """
+        Try to send all buffered samples, oldest first, in batch_size batches.
+
+        Requests run outside the channel lock, so sends, buffering and
+        reloads are not held up while a backlog drains.
 
         Returns:
-            True if successfully sent, False otherwise
+            Number of buffered samples sent
         """
+        if not self._replay_lock.acquire(blocking=False):
+            # Already replaying on another thread
+            return 0
         try:
-            headers = {
-                'Content-Type': 'application/json'
-            }
-
-            if self.api_key:
-                headers['Authorization'] = f'Bearer {self.api_key}'
-
-            response = requests.post(
-                self.server_url,
-                json=metrics,
-                headers=headers,
-                timeout=self.timeout
-            )
+            with self._lock:
+                store = self.store
+                if not store.record_count:
+                    return 0
+
+                logger.info("Replaying %s buffered samples to sink %s",
+                            store.record_count, self.name)
+
+                def deliver(records: List[bytes]) -> bool:
+                    sink = self.sink
+                    self._lock.release()
+                    try:
+                        return sink.deliver(records)
+                    finally:
+                        self._lock.acquire()
+
+                try:
+                    sent = store.replay(
+                        deliver,
+                        should_continue=lambda: not self.backpressure.backing_off(),
+                        batch_size=self.batch_size,
+                    )
+                except Exception as e:
+                    logger.error("Error replaying buffered metrics to sink %s: %s",
+                                 self.name, e)
+                    return 0
+
+            if sent:
+                logger.info("Sent %s buffered samples to sink %s", sent, self.name)
+            return sent
+        finally:
+            self._replay_lock.release()
+
+    def deliver_capture(self, name: str, data: bytes) -> bool:
+        """
+        Upload a burst capture to this sink.
 
-            if response.status_code == 200:
-                logger.debug(f"Successfully sent metrics to {self.server_url}")
-                return True
-            else:
-                logger.warning(
-                    f"Failed to send metrics: HTTP {response.status_code} - {response.text}"
-                )
+        Args:
+            name: Capture file name
+            data: Gzip-compressed JSON document
+
+        Returns:
+            True if the sink accepted the capture, False otherwise
+        """
+        with self._lock:
+            if self.backpressure.backing_off():
                 return False
+            try:
+                return self.sink.deliver_capture(name, data)
+            except Exception as e:
+                logger.error("Error uploading burst capture to sink %s: %s", self.name, e)
+                return False
+
+    def _import_legacy_buffers(self):
+        """Move per-sample JSON files from earlier versions into the store."""
+        for buffer_file in sorted(self.buffer_dir.glob('metrics_*.json')):
+            try:
+                self.store.append(buffer_file.read_bytes().strip())
+                buffer_file.unlink()
+            except OSError as e:
+                logger.error("Failed to import buffer file %s: %s", buffer_file, e)
 
-        except requests.exceptions.Timeout:
-            logger.warning(f"Timeout sending metrics to {self.server_url}")
-            return False
-        except requests.exceptions.ConnectionError:
-            logger.warning(f"Connection error sending metrics to {self.server_url}")
-            return False
-        except Exception as e:
-            logger.error(f"Unexpected error sending metrics: {e}")
-            return False
+    def _get_buffer_usage(self) -> float:
+        """
+        Get buffer usage as a fraction of the maximum size.
 
-    def _buffer_metrics(self, metrics: Dict[str, Any]):
+        Returns:
+            Usage fraction (1.0 means full)
+        """
+        if self.buffer_max_size <= 0:
+            return 1.0
+        return self.store.size / self.buffer_max_size
+
+    def _update_shed_level(self, level: int) -> int:
+        """Remember the shed level, logging transitions."""
+        if level != self._shed_level:
+            logger.warning("Load shedding level for sink %s changed: %s -> %s",
+                           self.name, LEVEL_NAMES[self._shed_level], LEVEL_NAMES[level])
+            self._shed_level = level
+        return level
+
+    def _compact_buffers(self, level: int):
         """
-        Save metrics to local buffer for later transmission.
+        Merge pairs of consecutive buffered samples in the older half of the
+        buffer into aggregates, shedding detail at the given level.
 
         Args:
-            metrics: Metrics data to buffer
+            level: Shed level applied to the merged samples
         """
-        # Check buffer size before adding
-        current_size = self._get_buffer_size()
-        if current_size >= self.buffer_max_size:
-            logger.warning("Buffer is full, dropping oldest metrics")
-            self._cleanup_old_buffers()
+        def merge_pairs(records: List[bytes]) -> List[bytes]:
+            # Only samples covering the same metric families are merged, so
+            # each aggregate's sample count stays accurate per family
+            result: List[Optional[Dict[str, Any]]] = []
+            pending: Dict[frozenset, int] = {}
+
+            for record in records:
+                try:
+                    sample = json.loads(record)
+                except ValueError:
+                    continue
+                families = frozenset(sample.get('metrics', {}))
+                if families in pending:
+                    index = pending.pop(families)
+                    result[index] = merge_samples([result[index], sample])
+                else:
+                    pending[families] = len(result)
+                    result.append(sample)
+
+            # Samples left without metrics at this level are dropped
+            shed_samples = (shed(sample, level) for sample in result)
+            return [encode(sample) for sample in shed_samples if sample.get('metrics')]
+
+        freed = self.store.compact(merge_pairs)
+        if freed:
+            logger.info("Compacted buffered samples for sink %s, freed %.1f KB (shed level %s)",
+                        self.name, freed / 1024, LEVEL_NAMES[level])
+
+    def close(self):
+        """Close the sink and seal the active buffer segment."""
+        with self._lock:
+            if self.sink is not None:
+                self.sink.close()
+            if self.store is not None:
+                self.store.close()
 
-        # Create buffer file with timestamp
-        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')
-        buffer_file = self.buffer_dir / f"metrics_{timestamp}.json"
+    def get_buffer_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about this sink's buffered metrics.
 
-        try:
-            with open(buffer_file, 'w', encoding='utf-8') as f:
-                json.dump(metrics, f)
-            logger.info(f"Metrics buffered to {buffer_file}")
-        except Exception as e:
-            logger.error(f"Failed to buffer metrics: {e}")
+        Returns:
+            Dictionary with buffer statistics
+        """
+        total_size = self.store.size
 
-    def _send_buffered_metrics(self):
-        """Try to send all buffered metrics."""
-        buffer_files = sorted(self.buffer_dir.glob('metrics_*.json'))
+        return {
+            'count': self.store.record_count,
+            'segments': self.store.segment_count,
+            'total_size': total_size,
+            'max_size': self.buffer_max_size,
+            'shed_level': LEVEL_NAMES[self._shed_level],
+            'usage_percent': (total_size / self.buffer_max_size * 100) if self.buffer_max_size > 0 else 0
+        }
 
-        if not buffer_files:
-            return
 
-        logger.info(f"Found {len(buffer_files)} buffered metric files")
+class MetricsSender:
+    """
+    Fans metrics out to the configured sinks.
 
-        for buffer_file in buffer_files:
-            try:
-                with open(buffer_file, 'r', encoding='utf-8') as f:
-                    metrics = json.load(f)
+    Every sample is serialized once; each sink then has its own buffer,
+    retry and load-shedding state. Samples are numbered in encoding order
+    within a session that lasts as long as the sender (see sequencing).
+    """
 
-                if self._send_to_api(metrics):
-                    # Successfully sent, delete the buffer file
-                    buffer_file.unlink()
-                    logger.info(f"Sent buffered metrics from {buffer_file}")
-                else:
-                    # Failed to send, stop trying (server probably still down)
-                    break
+    def __init__(self, config):
+        """
+        Initialize the metrics sender.
 
-            except Exception as e:
-                logger.error(f"Error processing buffer file {buffer_file}: {e}")
-                # Delete corrupted buffer file
-                buffer_file.unlink()
+        Args:
+            config: Configuration object
+        """
+        self.channels: Dict[str, SinkChannel] = {}
+        self.session = new_session()
+        self._sequence = itertools.count(1)
+        self.apply_config(config)
 
-    def _get_buffer_size(self) -> int:
+    def apply_config(self, config):
         """
-        Get total size of buffered metrics.
+        Apply sink settings from a configuration.
+
+        Called at construction and again after a configuration reload.
+        Sinks that remain configured keep their buffered metrics; removed
+        sinks are closed.
+
+        Args:
+            config: Configuration object
+        """
+        self.config = config
+        specs = {spec['name']: spec for spec in config.sinks}
+
+        for name in list(self.channels):
+            if name not in specs:
+                logger.info("Sink %s removed", name)
+                self.channels.pop(name).close()
+
+        channels = {}
+        for name, spec in specs.items():
+            channel = self.channels.get(name)
+            if channel is None:
+                channel = SinkChannel(spec, config)
+            else:
+                channel.apply_config(spec, config)
+            channels[name] = channel
+        # Swapped in one assignment so readers see either set of sinks
+        self.channels = channels
+
+    def stamp(self, sample: Union[Sample, Dict[str, Any]]):
+        """
+        Give a sample the session ID and the next sequence number.
+
+        Samples that already have a sequence number keep it. Safe to call
+        from several collection threads.
+
+        Args:
+            sample: Compact sample, or a sample dictionary
+        """
+        if isinstance(sample, dict):
+            if 'seq' not in sample:
+                sample['session'] = self.session
+                sample['seq'] = next(self._sequence)
+        elif sample.seq is None:
+            sample.session = self.session
+            sample.seq = next(self._sequence)
+
+    def encode(self, sample: Union[Sample, Dict[str, Any]],
+               metrics: Optional[Dict[str, Any]] = None) -> EncodedSample:
+        """
+        Serialize a sample once for all sinks.
+
+        Args:
+            sample: Compact sample, or a sample dictionary; stamped with a
+                    sequence number if it has none
+            metrics: Dictionary form of a compact sample, if already built
+                     (after stamping)
 
         Returns:
-            Total size in bytes
+            EncodedSample with the full encoding already computed
         """
-        total_size = 0
-        for buffer_file in self.buffer_dir.glob('metrics_*.json'):
-            try:
-                total_size += buffer_file.stat().st_size
-            except OSError:
-                pass
-        return total_size
+        self.stamp(sample)
+        encoded = EncodedSample(sample, metrics)
+        encoded.payload()
+        return encoded
 
-    def _cleanup_old_buffers(self):
-        """Remove oldest buffered metrics to free up space."""
-        buffer_files = sorted(self.buffer_dir.glob('metrics_*.json'))
+    def send(self, metrics: Dict[str, Any], replay: bool = True) -> bool:
+        """
+        Send metrics to every sink, one after another.
 
-        # Remove oldest 20% of files
-        num_to_remove = max(1, len(buffer_files) // 5)
+        Args:
+            metrics: Metrics data to send
+            replay: Try to send buffered metrics first. Disabled when a
+                    separate task drains the buffers.
 
-        for buffer_file in buffer_files[:num_to_remove]:
-            try:
-                buffer_file.unlink()
-                logger.info(f"Removed old buffer file {buffer_file}")
-            except OSError as e:
-                logger.error(f"Failed to remove buffer file {buffer_file}: {e}")
+        Returns:
+            True if every sink accepted the metrics, False otherwise
+        """
+        sample = self.encode(metrics)
+        success = True
+        for channel in self.channels.values():
+            if replay:
+                # Try to send buffered metrics first
+                channel.replay()
+            success = channel.send((sample,)) and success
+        return success
+
+    def buffer_metrics(self, metrics: Dict[str, Any]):
+        """
+        Save metrics to every sink's buffer for later transmission.
+
+        Args:
+            metrics: Metrics data to buffer
+        """
+        sample = self.encode(metrics)
+        for channel in self.channels.values():
+            channel.buffer(sample)
+
+    def upload_capture(self, name: str, data: bytes) -> List[str]:
+        """
+        Upload a burst capture to every sink.
+
+        Args:
+            name: Capture file name
+            data: Gzip-compressed JSON document
+
+        Returns:
+            Names of the sinks that did not accept the capture
+        """
+        return [sink for sink, channel in self.channels.items()
+                if not channel.deliver_capture(name, data)]
+
+    def replay_buffered(self) -> int:
+        """
+        Try to send all buffered metrics, oldest first.
+
+        Returns:
+            Number of buffered samples sent, over all sinks
+        """
+        return sum(channel.replay() for channel in self.channels.values())
+
+    def close(self):
+        """Close all sinks and seal their buffers."""
+        for channel in self.channels.values():
+            channel.close()
 
     def get_buffer_stats(self) -> Dict[str, Any]:
         """
         Get statistics about buffered metrics.
 
         Returns:
-            Dictionary with buffer statistics
+            Dictionary with totals over all sinks and per-sink statistics
+            under 'sinks'
         """
-        buffer_files = list(self.buffer_dir.glob('metrics_*.json'))
-        total_size = self._get_buffer_size()
+        sinks = {name: channel.get_buffer_stats() for name, channel in self.channels.items()}
+        total_size = sum(stats['total_size'] for stats in sinks.values())
+        max_size = sum(stats['max_size'] for stats in sinks.values())
 
         return {
-            'count': len(buffer_files),
+            'count': sum(stats['count'] for stats in sinks.values()),
+            'segments': sum(stats['segments'] for stats in sinks.values()),
             'total_size': total_size,
-            'max_size': self.buffer_max_size,
-            'usage_percent': (total_size / self.buffer_max_size * 100) if self.buffer_max_size > 0 else 0
+            'max_size': max_size,
+            'usage_percent': (total_size / max_size * 100) if max_size > 0 else 0,
+            'sinks': sinks,
         }
+
@@ -0,0 +1,500 @@
+"""
+Event-loop runtime driving collection, sending and local endpoints.
+"""
+
+import asyncio
+import logging
+import math
+import signal
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from serializer import format_timestamp
+
+
+logger = logging.getLogger(__name__)
+
+# Most sends in flight per sink, whatever sinks[].window says
+MAX_WINDOW = 32
+
+
+def host_offset(hostname: str, jitter: float) -> float:
+    """
+    Get this host's fixed offset into each aligned interval.
+
+    The offset is derived from the hostname, so it is stable across
+    restarts and spread evenly over [0, jitter) across a fleet.
+
+    Args:
+        hostname: Host name
+        jitter: Upper bound in seconds (0 disables jitter)
+
+    Returns:
+        Offset in seconds
+    """
+    if jitter <= 0:
+        return 0.0
+    return zlib.crc32(hostname.encode('utf-8')) / 2 ** 32 * jitter
+
+
+def next_slot(now: float, interval: float, offset: float = 0.0,
+              after: Optional[float] = None) -> float:
+    """
+    Get the next wall-clock interval boundary to collect for.
+
+    Args:
+        now: Current epoch time
+        interval: Interval in seconds; slots are multiples of it
+        offset: Host offset; the slot is collected at slot + offset
+        after: Last slot collected, which is never returned again
+
+    Returns:
+        Epoch time of the slot (without the offset)
+    """
+    slot = math.floor((now - offset) / interval + 1) * interval
+    if after is not None and slot <= after:
+        slot = after + interval
+    return slot
+
+
+class _SinkWorker:
+    """Queue, send threads and tasks for one sink channel."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=channel.queue_size)
+        # Threads of its own per sink, so a stuck sink only ties up those;
+        # one per send in flight plus the replay, started as needed. The
+        # channel serializes what they do to its state
+        self.executor = ThreadPoolExecutor(
+            max_workers=MAX_WINDOW, thread_name_prefix=f'sink-{channel.name}'
+        )
+        self.replay_wakeup = asyncio.Event()
+        self.send_task: Optional[asyncio.Task] = None
+        self.replay_task: Optional[asyncio.Task] = None
+        # Sends in flight
+        self.sends: Set[asyncio.Task] = set()
+        self.healthy = True
+
+
+class CollectorRuntime:
+    """
+    Runs the collector as a set of asyncio tasks.
+
+    Each enabled metric family is a task that wakes at its own interval on
+    a fixed timeline (no drift, no polling) and runs the blocking psutil
+    calls in a thread pool. Samples are serialized once and put on one
+    queue per sink, each drained by its own sender task and thread, so a
+    slow or unreachable sink never delays collection or the other sinks.
+    Buffered samples are replayed by a drainer task per sink, and the
+    optional exporter is served on the same loop. SIGUSR1 (or POST /burst
+    on the exporter) starts a burst capture. With a tick profiler, each
+    collection and send is timed against its budget and profiled when it
+    runs over. With a shared-memory writer, every sample is also published
+    for other processes on the host as it is collected.
+    """
+
+    def __init__(self, config, collector, sender, exporter=None, history=None, burst=None,
+                 profiler=None, shared=None):
+        """
+        Initialize the runtime.
+
+        Args:
+            config: Configuration object
+            collector: MetricsCollector instance
+            sender: MetricsSender instance
+            exporter: MetricsExporter instance, if enabled
+            history: HistoryStore to record samples in, if enabled
+            burst: BurstCapture for high-frequency captures, if enabled
+            profiler: SlowTickProfiler for ticks over budget, if enabled
+            shared: SharedStateWriter to publish samples to, if enabled
+        """
+        self.config = config
+        self.collector = collector
+        self.sender = sender
+        self.exporter = exporter
+        self.history = history
+        self.burst = burst
+        self.profiler = profiler
+        self.shared = shared
+        if exporter is not None:
+            exporter.burst_trigger = self.start_burst
+
+        # Collection threads are per family so a slow probe (the CPU sample
+        # blocks for a second) does not hold up the others
+        self._collect_executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix='collect'
+        )
+
+        self._stop: Optional[asyncio.Event] = None
+        self._family_tasks: Dict[str, asyncio.Task] = {}
+        self._workers: Dict[str, _SinkWorker] = {}
+
+    def run(self):
+        """Run until SIGINT/SIGTERM."""
+        asyncio.run(self._main())
+
+    def request_stop(self):
+        """Ask the runtime to shut down (safe to call from the loop thread)."""
+        if self._stop is not None:
+            self._stop.set()
+
+    def start_burst(self, duration: Optional[float] = None, trigger: str = 'manual') -> bool:
+        """
+        Start a burst capture, or extend the running one.
+
+        Args:
+            duration: Seconds to capture (default: burst.duration)
+            trigger: What requested the capture
+
+        Returns:
+            True if burst mode is enabled, False otherwise
+        """
+        if self.burst is None:
+            logger.warning("Burst capture requested by %s, but burst mode is disabled", trigger)
+            return False
+        self.burst.start(duration, trigger)
+        return True
+
+    async def _main(self):
+        """Start all tasks, wait for a stop request and shut down."""
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+
+        self._install_signal_handlers(loop)
+
+        self._sync_family_tasks()
+        self._sync_sink_workers()
+        service_tasks = []
+        if self.exporter is not None:
+            await self.exporter.start()
+            service_tasks.append(asyncio.create_task(self.exporter.serve(), name='exporter'))
+
+        logger.info("Entering main collection loop")
+        await self._stop.wait()
+        logger.info("Shutting down collector...")
+
+        # Stop producing; anything already queued gets a bounded flush
+        family_tasks = list(self._family_tasks.values())
+        self._family_tasks.clear()
+        replay_tasks = [worker.replay_task for worker in self._workers.values()]
+        for task in family_tasks + service_tasks + replay_tasks:
+            task.cancel()
+        await asyncio.gather(*family_tasks, *service_tasks, *replay_tasks,
+                             return_exceptions=True)
+
+        timeout = self.config.get('collector', 'shutdown_timeout', default=5)
+        deadline = loop.time() + timeout
+        if self.burst is not None and self.burst.active:
+            # Whatever was captured so far is uploaded before sinks close
+            await loop.run_in_executor(None, self.burst.stop, timeout)
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(worker.queue.join() for worker in self._workers.values())),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Flush did not finish within %ss, buffering %s queued samples",
+                           timeout, sum(w.queue.qsize() for w in self._workers.values()))
+
+        for worker in self._workers.values():
+            await self._stop_worker(worker, timeout=max(0.0, deadline - loop.time()))
+        self._workers.clear()
+
+        self._collect_executor.shutdown(wait=False, cancel_futures=True)
+
+        if self.profiler is not None:
+            await loop.run_in_executor(None, self.profiler.stop, timeout)
+            summary = self.profiler.summary()
+            logger.info("Tick profiler: %s ticks, %s over budget, %s stack samples, "
+                        "%.3fs CPU", summary['ticks'], summary['slow'], summary['samples'],
+                        summary['cpu_seconds'])
+
+    def _install_signal_handlers(self, loop: asyncio.AbstractEventLoop):
+        """Route SIGINT/SIGTERM to shutdown, SIGHUP to reload and SIGUSR1 to a burst."""
+        def on_stop(signum):
+            logger.info("Received signal %s, shutting down gracefully...", signum)
+            self.request_stop()
+
+        def on_reload():
+            asyncio.ensure_future(self._reload())
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, on_stop, signum)
+            except NotImplementedError:
+                # Windows event loops have no signal handler support
+                signal.signal(signum, lambda s, f: loop.call_soon_threadsafe(on_stop, s))
+
+        if hasattr(signal, 'SIGHUP'):
+            loop.add_signal_handler(signal.SIGHUP, on_reload)
+        if hasattr(signal, 'SIGUSR1'):
+            loop.add_signal_handler(signal.SIGUSR1, self.start_burst, None, 'signal')
+
+    def _sync_family_tasks(self):
+        """Start tasks for newly enabled families and stop disabled ones."""
+        enabled = self.collector.enabled_families
+
+        for family in list(self._family_tasks):
+            if family not in enabled:
+                self._family_tasks.pop(family).cancel()
+
+        for family in enabled:
+            if family not in self._family_tasks:
+                self._family_tasks[family] = asyncio.create_task(
+                    self._family_loop(family), name=f'collect-{family}'
+                )
+
+    def _sync_sink_workers(self):
+        """Start workers for new sink channels and stop removed ones."""
+        channels = self.sender.channels
+
+        for name, worker in list(self._workers.items()):
+            if channels.get(name) is not worker.channel:
+                del self._workers[name]
+                asyncio.ensure_future(self._stop_worker(worker, buffer_queued=False))
+
+        for name, channel in channels.items():
+            if name not in self._workers:
+                worker = _SinkWorker(channel)
+                worker.send_task = asyncio.create_task(self._send_loop(worker), name=f'send-{name}')
+                worker.replay_task = asyncio.create_task(self._replay_loop(worker),
+                                                         name=f'replay-{name}')
+                self._workers[name] = worker
+
+    async def _stop_worker(self, worker: _SinkWorker, buffer_queued: bool = True,
+                           timeout: Optional[float] = None):
+        """
+        Cancel a sink worker's tasks and release its thread.
+
+        Args:
+            worker: Worker to stop
+            buffer_queued: Move samples still queued to the sink's disk buffer
+            timeout: Seconds to wait for sends in flight (None waits until done)
+        """
+        tasks = (worker.send_task, worker.replay_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # In-flight sends finish on their threads and buffer what failed
+        if worker.sends:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*worker.sends, return_exceptions=True), timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Sends to sink %s still in flight after the shutdown timeout; "
+                               "they are buffered if they fail", worker.channel.name)
+
+        # Whatever is left goes to disk rather than being lost
+        while buffer_queued and not worker.queue.empty():
+            worker.channel.buffer(worker.queue.get_nowait())
+
+        worker.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _family_loop(self, family: str):
+        """
+        Collect one metric family on a fixed timeline.
+
+        Wakeups are scheduled against the loop clock from the previous
+        deadline rather than from when the work finished, so ticks do not
+        drift. Missed deadlines are skipped instead of bursting.
+
+        With collector.align, ticks are instead phase-locked to wall-clock
+        multiples of the interval (plus this host's jitter offset), and
+        each sample carries its slot and measurement window.
+        """
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + self.config.get_metric_interval(family)
+        last_slot: Optional[float] = None
+
+        while True:
+            interval = self.config.get_metric_interval(family)
+            slot = None
+            if self.config.get('collector', 'align', default=False):
+                offset = host_offset(
+                    self.config.hostname, self.config.get('collector', 'jitter', default=0)
+                ) % interval
+                wall = time.time()
+                slot = next_slot(wall, interval, offset, last_slot)
+                if last_slot is not None and slot - last_slot > interval * 1.5:
+                    logger.warning("%s collection fell behind, skipped %s slot(s)", family,
+                                   round((slot - last_slot) / interval) - 1)
+                last_slot = slot
+                # The loop clock is monotonic; convert once per tick so wall
+                # clock adjustments move the next slot, not the window
+                next_run = loop.time() + (slot + offset - wall)
+                slot = (slot, next_run - offset)
+
+            await asyncio.sleep(max(0.0, next_run - loop.time()))
+
+            try:
+                sample = await loop.run_in_executor(
+                    self._collect_executor, self._profiled, f'collect-{family}',
+                    self._collect, (family,), slot
+                )
+            except Exception as e:
+                logger.error("Error collecting %s metrics: %s", family, e, exc_info=True)
+            else:
+                self._publish(*sample)
+
+            if slot is not None:
+                continue
+
+            interval = self.config.get_metric_interval(family)
+            next_run += interval
+            now = loop.time()
+            if next_run <= now:
+                skipped = int((now - next_run) // interval) + 1
+                next_run += skipped * interval
+                logger.warning("%s collection fell behind, skipped %s tick(s)", family, skipped)
+
+    def _profiled(self, name: str, func, *args):
+        """Run func(*args) as a tick of the slow-tick profiler, if there is one."""
+        if self.profiler is None:
+            return func(*args)
+        with self.profiler.tick(name):
+            return func(*args)
+
+    def _collect(self, families: Tuple[str, ...],
+                 slot: Optional[Tuple[float, float]] = None) -> Tuple[Dict[str, Any], Any]:
+        """
+        Collect, record and serialize a sample (runs on a collection thread).
+
+        Args:
+            families: Metric families to collect
+            slot: (epoch, monotonic) time of the aligned slot, if aligned
+        """
+        start = time.monotonic()
+        sample = self.collector.collect_sample(families)
+        if slot is not None:
+            sample.slot = format_timestamp(slot[0])
+            sample.window = (start - slot[1], time.monotonic() - slot[1])
+        self.sender.stamp(sample)
+        if self.shared is not None:
+            try:
+                self.shared.publish(sample)
+            except Exception as e:
+                logger.error("Error publishing metrics to shared memory: %s", e)
+
+        # The dictionary form only lives for this tick; queues keep the
+        # compact sample and its encoding
+        metrics = sample.to_dict()
+        if self.history is not None:
+            try:
+                self.history.record(metrics)
+            except Exception as e:
+                logger.error("Error recording metrics history: %s", e)
+        return metrics, self.sender.encode(sample, metrics)
+
+    def _publish(self, metrics: Dict[str, Any], sample: Any):
+        """Hand a collected sample to the exporter and every sink queue."""
+        if self.exporter is not None:
+            self.exporter.update(metrics)
+
+        for worker in self._workers.values():
+            if worker.queue.full():
+                # Sink is stuck; move its oldest queued sample to disk
+                oldest = worker.queue.get_nowait()
+                worker.queue.task_done()
+                worker.executor.submit(worker.channel.buffer, oldest)
+            worker.queue.put_nowait(sample)
+
+    async def _send_loop(self, worker: _SinkWorker):
+        """
+        Send queued samples to one sink, in batches, on its own threads.
+
+        Up to the sink's window of batches are in flight at once, so a
+        high-latency link is not limited to one batch per round trip. A
+        batch that fails is buffered and replayed on its own; batches sent
+        around it stay delivered.
+        """
+        channel = worker.channel
+
+        while True:
+            while len(worker.sends) >= min(channel.window, MAX_WINDOW):
+                await asyncio.wait(set(worker.sends), return_when=asyncio.FIRST_COMPLETED)
+
+            batch = [await worker.queue.get()]
+            while len(batch) < channel.batch_size and not worker.queue.empty():
+                batch.append(worker.queue.get_nowait())
+
+            task = asyncio.ensure_future(self._send_batch(worker, batch))
+            worker.sends.add(task)
+            task.add_done_callback(worker.sends.discard)
+
+    async def _send_batch(self, worker: _SinkWorker, batch: List[Any]):
+        """Send one batch to a sink on one of its threads."""
+        loop = asyncio.get_running_loop()
+        channel = worker.channel
+        try:
+            success = await loop.run_in_executor(
+                worker.executor, self._profiled, f'send-{channel.name}', channel.send, batch
+            )
+            if success and not worker.healthy:
+                # Sink is back; replay its backlog now instead of
+                # waiting for the next replay tick
+                worker.replay_wakeup.set()
+            worker.healthy = success
+        except Exception as e:
+            logger.error("Error sending metrics to sink %s: %s", channel.name, e,
+                         exc_info=True)
+        finally:
+            for _ in batch:
+                worker.queue.task_done()
+
+    async def _replay_loop(self, worker: _SinkWorker):
+        """Periodically replay one sink's buffered samples."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            interval = self.config.get('collector', 'replay_interval', default=30)
+            try:
+                await asyncio.wait_for(worker.replay_wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            worker.replay_wakeup.clear()
+
+            try:
+                await loop.run_in_executor(worker.executor, worker.channel.replay)
+            except Exception as e:
+                logger.error("Error replaying buffered metrics to sink %s: %s",
+                             worker.channel.name, e, exc_info=True)
+
+    async def _reload(self):
+        """
+        Reload configuration and apply it to the running components.
+
+        The new snapshot is swapped in only if it loads and validates; the
+        collector keeps its rate counters and sinks keep buffered data.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            # Reads and parses the file and resolves the hostname; kept off
+            # the loop so collection timers are not held up
+            await loop.run_in_executor(None, self.config.reload)
+        except Exception as e:
+            # Missing file, YAML syntax error or failed validation
+            logger.error("Configuration reload failed, keeping current settings: %s", e)
+            return
+
+        log_level = getattr(logging, self.config.log_level.upper(), logging.INFO)
+        root_logger = logging.getLogger()
+        root_logger.setLevel(log_level)
+        for handler in root_logger.handlers:
+            handler.setLevel(log_level)
+
+        self.collector.apply_config(self.config)
+        if self.burst is not None:
+            self.burst.apply_config(self.config)
+        if self.profiler is not None:
+            self.profiler.apply_config(self.config)
+        # Channels serialize this against their own sends; it may wait for
+        # an in-flight send, so it runs off the loop thread
+        await loop.run_in_executor(None, self.sender.apply_config, self.config)
+        self._sync_family_tasks()
+        self._sync_sink_workers()
+
+        logger.info("Configuration reloaded from %s", self.config.config_path)
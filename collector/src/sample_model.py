@@ -0,0 +1,422 @@
+"""
+Compact in-memory representation of collected samples.
+
+Samples wait in per-sink queues, so their footprint matters. Records use
+__slots__ and per-core, per-partition and per-interface values are kept
+in `array` columns instead of one dict per element. The external JSON
+shape is produced by to_dict() only where it is needed (encoding, the
+exporter, the history store).
+"""
+
+import sys
+from array import array
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from cpu_engine import CORE_MODES, SUMMARY_STATS
+
+
+# Order of per-interface counters in NetworkMetrics.counters
+NET_COUNTERS = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv',
+                'errin', 'errout', 'dropin', 'dropout')
+# Order of per-interface rates in NetworkMetrics.rates
+NET_RATES = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv')
+
+CONNECTION_STATES = ('tcp', 'udp', 'established', 'time_wait', 'close_wait', 'listen')
+
+# Rate placeholder for interfaces seen for the first time
+NAN = float('nan')
+
+
+def intern_names(names: Sequence[str]) -> Tuple[str, ...]:
+    """Intern repeated labels (devices, mountpoints, interfaces) so samples share them."""
+    return tuple(sys.intern(name) for name in names)
+
+
+class CpuMetrics:
+    """
+    CPU usage, per-core usage and load average.
+
+    Per-core detail is either per-core usage (cores), optionally with one
+    column per CORE_MODES entry (core_modes), or a fixed-size summary as
+    built by cpu_engine.summarize().
+    """
+
+    __slots__ = ('total', 'user', 'system', 'idle', 'iowait',
+                 'cores', 'core_modes', 'summary', 'count', 'physical_count', 'load')
+
+    def __init__(self, total: float, user: float, system: float, idle: float,
+                 iowait: Optional[float] = None, cores: Optional[array] = None,
+                 count: Optional[int] = None, physical_count: Optional[int] = None,
+                 load: Optional[Tuple[float, float, float]] = None):
+        self.total = total
+        self.user = user
+        self.system = system
+        self.idle = idle
+        self.iowait = iowait
+        self.cores = cores
+        self.core_modes: Optional[Tuple[array, ...]] = None
+        self.summary: Optional[Tuple] = None
+        self.count = count
+        self.physical_count = physical_count
+        self.load = load
+
+    @classmethod
+    def from_dict(cls, metrics: Dict[str, Any]) -> 'CpuMetrics':
+        usage = metrics['usage']
+        record = cls(usage['total'], usage['user'], usage['system'], usage['idle'],
+                     usage.get('iowait'))
+        cores = metrics.get('cores')
+        if cores is not None:
+            if 'usage' in cores:
+                record.cores = array('d', cores['usage'])
+            modes = cores.get('modes')
+            if modes is not None:
+                record.core_modes = tuple(array('d', modes[mode]) for mode in CORE_MODES)
+            summary = cores.get('summary')
+            if summary is not None:
+                record.summary = (
+                    tuple(summary['usage'][stat] for stat in SUMMARY_STATS),
+                    tuple(summary['histogram']),
+                    tuple((top['core'], top['usage']) for top in summary['top']),
+                    tuple((summary['modes'][mode]['mean'], summary['modes'][mode]['max'])
+                          for mode in CORE_MODES),
+                )
+            record.count = cores['count']
+            record.physical_count = cores['physical_count']
+        load = metrics.get('load')
+        if load is not None:
+            average = load['average']
+            record.load = (average['1m'], average['5m'], average['15m'])
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        usage = {'total': self.total, 'user': self.user, 'system': self.system, 'idle': self.idle}
+        if self.iowait is not None:
+            usage['iowait'] = self.iowait
+        metrics: Dict[str, Any] = {'usage': usage}
+
+        if self.cores is not None or self.summary is not None:
+            cores: Dict[str, Any] = {}
+            if self.cores is not None:
+                cores['usage'] = self.cores.tolist()
+            if self.core_modes is not None:
+                cores['modes'] = {mode: column.tolist()
+                                  for mode, column in zip(CORE_MODES, self.core_modes)}
+            if self.summary is not None:
+                stats, histogram, top, modes = self.summary
+                cores['summary'] = {
+                    'usage': dict(zip(SUMMARY_STATS, stats)),
+                    'histogram': list(histogram),
+                    'top': [{'core': core, 'usage': usage} for core, usage in top],
+                    'modes': {mode: {'mean': mean, 'max': peak}
+                              for mode, (mean, peak) in zip(CORE_MODES, modes)},
+                }
+            cores['count'] = self.count
+            cores['physical_count'] = self.physical_count
+            metrics['cores'] = cores
+
+        if self.load is not None:
+            metrics['load'] = {
+                'average': {'1m': self.load[0], '5m': self.load[1], '15m': self.load[2]}
+            }
+        return metrics
+
+
+class MemoryMetrics:
+    """Virtual memory and swap usage."""
+
+    __slots__ = ('total', 'used', 'available', 'free', 'percent', 'buffers', 'cached',
+                 'swap_total', 'swap_used', 'swap_free', 'swap_percent')
+
+    def __init__(self, total: int, used: int, available: int, free: int, percent: float,
+                 buffers: Optional[int], cached: Optional[int], swap_total: int,
+                 swap_used: int, swap_free: int, swap_percent: float):
+        self.total = total
+        self.used = used
+        self.available = available
+        self.free = free
+        self.percent = percent
+        self.buffers = buffers
+        self.cached = cached
+        self.swap_total = swap_total
+        self.swap_used = swap_used
+        self.swap_free = swap_free
+        self.swap_percent = swap_percent
+
+    @classmethod
+    def from_dict(cls, metrics: Dict[str, Any]) -> 'MemoryMetrics':
+        swap = metrics['swap']
+        return cls(metrics['total'], metrics['used'], metrics['available'], metrics['free'],
+                   metrics['usage']['percent'], metrics.get('buffers'), metrics.get('cached'),
+                   swap['total'], swap['used'], swap['free'], swap['usage']['percent'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        metrics: Dict[str, Any] = {
+            'total': self.total,
+            'used': self.used,
+            'available': self.available,
+            'free': self.free,
+            'usage': {'percent': self.percent},
+        }
+        if self.buffers is not None:
+            metrics['buffers'] = self.buffers
+        if self.cached is not None:
+            metrics['cached'] = self.cached
+        metrics['swap'] = {
+            'total': self.swap_total,
+            'used': self.swap_used,
+            'free': self.swap_free,
+            'usage': {'percent': self.swap_percent},
+        }
+        return metrics
+
+
+class DiskMetrics:
+    """
+    Per-partition usage as columns, plus aggregate I/O rates.
+
+    Element i of every column belongs to mountpoints[i]. A partition
+    without inode information has -1 in inode_total.
+    """
+
+    __slots__ = ('devices', 'mountpoints', 'fstypes', 'usage_total', 'usage_used',
+                 'usage_free', 'usage_percent', 'inode_total', 'inode_used', 'inode_free',
+                 'inode_percent', 'io')
+
+    def __init__(self):
+        self.devices: Tuple[str, ...] = ()
+        self.mountpoints: Tuple[str, ...] = ()
+        self.fstypes: Tuple[str, ...] = ()
+        self.usage_total = array('q')
+        self.usage_used = array('q')
+        self.usage_free = array('q')
+        self.usage_percent = array('d')
+        self.inode_total = array('q')
+        self.inode_used = array('q')
+        self.inode_free = array('q')
+        self.inode_percent = array('d')
+        # (read bytes/s, read ops/s, write bytes/s, write ops/s), once a rate is known
+        self.io: Optional[Tuple[float, float, float, float]] = None
+
+    @classmethod
+    def from_dict(cls, metrics: Dict[str, Any]) -> 'DiskMetrics':
+        record = cls()
+        partitions = metrics['partitions']
+        record.devices = intern_names([p['device'] for p in partitions])
+        record.mountpoints = intern_names([p['mountpoint'] for p in partitions])
+        record.fstypes = intern_names([p['fstype'] for p in partitions])
+        for partition in partitions:
+            usage = partition['usage']
+            record.usage_total.append(usage['total'])
+            record.usage_used.append(usage['used'])
+            record.usage_free.append(usage['free'])
+            record.usage_percent.append(usage['percent'])
+            inode = partition.get('inode')
+            if inode is not None:
+                record.inode_total.append(inode['total'])
+                record.inode_used.append(inode['used'])
+                record.inode_free.append(inode['free'])
+                record.inode_percent.append(inode['usage']['percent'])
+            else:
+                record.inode_total.append(-1)
+                record.inode_used.append(0)
+                record.inode_free.append(0)
+                record.inode_percent.append(0)
+        io = metrics.get('io')
+        if io:
+            record.io = (io['read']['bytes'], io['read']['count'],
+                         io['write']['bytes'], io['write']['count'])
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        partitions = []
+        for i, mountpoint in enumerate(self.mountpoints):
+            partition: Dict[str, Any] = {
+                'device': self.devices[i],
+                'mountpoint': mountpoint,
+                'fstype': self.fstypes[i],
+                'usage': {
+                    'total': self.usage_total[i],
+                    'used': self.usage_used[i],
+                    'free': self.usage_free[i],
+                    'percent': self.usage_percent[i],
+                },
+            }
+            if self.inode_total[i] >= 0:
+                partition['inode'] = {
+                    'total': self.inode_total[i],
+                    'used': self.inode_used[i],
+                    'free': self.inode_free[i],
+                    'usage': {'percent': self.inode_percent[i]},
+                }
+            partitions.append(partition)
+
+        io: Dict[str, Any] = {}
+        if self.io is not None:
+            io = {
+                'read': {'bytes': self.io[0], 'count': self.io[1]},
+                'write': {'bytes': self.io[2], 'count': self.io[3]},
+            }
+        return {'partitions': partitions, 'io': io}
+
+
+class NetworkMetrics:
+    """
+    Per-interface counters and rates as strided columns, plus connection counts.
+
+    Interface i's counters are counters[i * 8:(i + 1) * 8] in NET_COUNTERS
+    order and its rates rates[i * 4:(i + 1) * 4] in NET_RATES order; rates
+    are NaN until a previous reading exists. Series that sum a group of
+    interfaces have their member count in members (0 for single
+    interfaces); members is None when there are no groups.
+    """
+
+    __slots__ = ('names', 'counters', 'rates', 'members', 'connections')
+
+    def __init__(self):
+        self.names: Tuple[str, ...] = ()
+        self.counters = array('Q')
+        self.rates = array('d')
+        self.members: Optional[array] = None
+        # Counts in CONNECTION_STATES order, if they could be read
+        self.connections: Optional[Tuple[int, ...]] = None
+
+    @classmethod
+    def from_dict(cls, metrics: Dict[str, Any]) -> 'NetworkMetrics':
+        record = cls()
+        interfaces = metrics['interfaces']
+        record.names = intern_names([interface['name'] for interface in interfaces])
+        members = [interface.get('members', 0) for interface in interfaces]
+        if any(members):
+            record.members = array('I', members)
+        for interface in interfaces:
+            io = interface['io']
+            record.counters.extend((
+                io['bytes']['sent'], io['bytes']['recv'],
+                io['packets']['sent'], io['packets']['recv'],
+                io['errors']['in'], io['errors']['out'],
+                io['dropped']['in'], io['dropped']['out'],
+            ))
+            rate = interface.get('io_rate')
+            if rate is not None:
+                record.rates.extend(rate[key] for key in NET_RATES)
+            else:
+                record.rates.extend((NAN, NAN, NAN, NAN))
+        connections = metrics.get('connections')
+        if connections:
+            record.connections = tuple(connections[state] for state in CONNECTION_STATES)
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        counters = self.counters
+        rates = self.rates
+        members = self.members
+        interfaces = []
+        for i, name in enumerate(self.names):
+            c = i * 8
+            interface: Dict[str, Any] = {'name': name}
+            if members is not None and members[i]:
+                interface['members'] = members[i]
+            interface['io'] = {
+                'bytes': {'sent': counters[c], 'recv': counters[c + 1]},
+                'packets': {'sent': counters[c + 2], 'recv': counters[c + 3]},
+                'errors': {'in': counters[c + 4], 'out': counters[c + 5]},
+                'dropped': {'in': counters[c + 6], 'out': counters[c + 7]},
+            }
+            r = i * 4
+            if rates[r] == rates[r]:  # NaN until a rate is known
+                interface['io_rate'] = {
+                    'bytes_sent': rates[r],
+                    'bytes_recv': rates[r + 1],
+                    'packets_sent': rates[r + 2],
+                    'packets_recv': rates[r + 3],
+                }
+            interfaces.append(interface)
+
+        connections = {}
+        if self.connections is not None:
+            connections = dict(zip(CONNECTION_STATES, self.connections))
+        return {'interfaces': interfaces, 'connections': connections}
+
+
+class Sample:
+    """
+    One collected sample: envelope plus whichever families were collected.
+
+    Aligned samples also carry their nominal slot timestamp and the
+    measurement window as (start, end) seconds after the slot, measured on
+    the monotonic clock. Samples handed to the sender carry its session ID
+    and a sequence number (see sequencing).
+    """
+
+    __slots__ = ('timestamp', 'hostname', 'session', 'seq', 'slot', 'window',
+                 'cpu', 'memory', 'disk', 'network')
+
+    # Family attributes in output order
+    FAMILIES = ('cpu', 'memory', 'disk', 'network')
+
+    def __init__(self, timestamp: str, hostname: str):
+        self.timestamp = timestamp
+        self.hostname = hostname
+        self.session: Optional[str] = None
+        self.seq: Optional[int] = None
+        self.slot: Optional[str] = None
+        self.window: Optional[Tuple[float, float]] = None
+        self.cpu: Optional[CpuMetrics] = None
+        self.memory: Optional[MemoryMetrics] = None
+        self.disk: Optional[DiskMetrics] = None
+        self.network: Optional[NetworkMetrics] = None
+
+    @classmethod
+    def from_dict(cls, sample: Dict[str, Any]) -> 'Sample':
+        """
+        Build a compact sample from its JSON shape.
+
+        Args:
+            sample: Sample dictionary as returned by to_dict()
+
+        Returns:
+            Sample
+        """
+        record = cls(sample['timestamp'], sample['hostname'])
+        record.session = sample.get('session')
+        record.seq = sample.get('seq')
+        record.slot = sample.get('slot')
+        window = sample.get('window')
+        if window is not None:
+            record.window = (window['start'], window['end'])
+        for family, metrics in sample['metrics'].items():
+            setattr(record, family, _RECORDS[family].from_dict(metrics))
+        return record
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert to the external JSON shape.
+
+        Returns:
+            Sample dictionary as sent to the API server
+        """
+        metrics = {}
+        for family in self.FAMILIES:
+            record = getattr(self, family)
+            if record is not None:
+                metrics[family] = record.to_dict()
+        sample: Dict[str, Any] = {'timestamp': self.timestamp, 'hostname': self.hostname}
+        if self.seq is not None:
+            sample['session'] = self.session
+            sample['seq'] = self.seq
+        if self.slot is not None:
+            sample['slot'] = self.slot
+        if self.window is not None:
+            sample['window'] = {'start': round(self.window[0], 6),
+                                'end': round(self.window[1], 6)}
+        sample['metrics'] = metrics
+        return sample
+
+
+_RECORDS = {
+    'cpu': CpuMetrics,
+    'memory': MemoryMetrics,
+    'disk': DiskMetrics,
+    'network': NetworkMetrics,
+}
@@ -0,0 +1,144 @@
+"""
+Per-host sequence numbers on delivered samples, and deduplication.
+
+Each collector process picks a random session ID at startup and numbers
+the samples it encodes 1, 2, 3, ... Both travel inside the sample, so a
+sample delivered twice (a request that timed out after the server stored
+it, then replayed from the disk buffer) or out of order (several requests
+in flight) can be recognised by any receiver. An aggregate merged from
+buffered samples covers the numbers listed in aggregate.seqs.
+
+SequenceTracker is the receiving side, used by the local ingest stub and
+meant for the API server.
+"""
+
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Sequence, Set, Tuple
+
+
+# Sequence numbers remembered above the contiguous prefix per session;
+# beyond this the oldest gaps are given up as lost
+MAX_PENDING = 100000
+
+# Sessions remembered by a tracker, least recently used dropped first
+MAX_SESSIONS = 10000
+
+
+def new_session() -> str:
+    """Generate a session ID for one collector process."""
+    return uuid.uuid4().hex
+
+
+def sequence_numbers(sample: Mapping[str, Any]) -> Optional[Tuple[str, str, Sequence[int]]]:
+    """
+    Get the sequence numbers a sample covers.
+
+    Args:
+        sample: Sample dictionary, possibly an aggregate
+
+    Returns:
+        (hostname, session, sequence numbers), or None for samples without
+        a sequence number
+    """
+    session, seq = sample.get('session'), sample.get('seq')
+    if session is None or not isinstance(seq, int):
+        return None
+    seqs = sample.get('aggregate', {}).get('seqs') or (seq,)
+    return sample.get('hostname', ''), session, [n for n in seqs if isinstance(n, int)]
+
+
+class _Session:
+    """Sequence numbers seen in one session."""
+
+    __slots__ = ('contiguous', 'pending')
+
+    def __init__(self):
+        # Every number up to and including this one has been seen
+        self.contiguous = 0
+        # Numbers seen above the contiguous prefix
+        self.pending: Set[int] = set()
+
+    def seen(self, seq: int) -> bool:
+        return seq <= self.contiguous or seq in self.pending
+
+    def add(self, seq: int):
+        if seq <= self.contiguous:
+            return
+        pending = self.pending
+        pending.add(seq)
+        contiguous = self.contiguous
+        while contiguous + 1 in pending:
+            contiguous += 1
+            pending.discard(contiguous)
+        if len(pending) > MAX_PENDING:
+            # Skip over the oldest gap
+            contiguous = min(pending)
+            pending.discard(contiguous)
+            while contiguous + 1 in pending:
+                contiguous += 1
+                pending.discard(contiguous)
+        self.contiguous = contiguous
+
+
+class SequenceTracker:
+    """
+    Remembers which samples a receiver has stored, per host and session.
+
+    Not thread-safe; receivers serialize calls.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        """
+        Initialize the tracker.
+
+        Args:
+            max_sessions: Sessions remembered before the least recently
+                          used one is forgotten
+        """
+        self.max_sessions = max_sessions
+        self._sessions: 'OrderedDict[Tuple[str, str], _Session]' = OrderedDict()
+
+    def accept(self, sample: Mapping[str, Any]) -> bool:
+        """
+        Record a received sample.
+
+        Args:
+            sample: Sample dictionary
+
+        Returns:
+            False if every sequence number it covers was already received,
+            True otherwise (including samples without sequence numbers)
+        """
+        covered = sequence_numbers(sample)
+        if covered is None:
+            return True
+        hostname, session, seqs = covered
+
+        key = (hostname, session)
+        state = self._sessions.get(key)
+        if state is None:
+            state = self._sessions[key] = _Session()
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(key)
+
+        if all(state.seen(seq) for seq in seqs):
+            return False
+        for seq in seqs:
+            state.add(seq)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get tracker counters.
+
+        Returns:
+            Sessions tracked and sequence numbers held above their
+            contiguous prefixes
+        """
+        return {
+            'sessions': len(self._sessions),
+            'pending': sum(len(state.pending) for state in self._sessions.values()),
+        }
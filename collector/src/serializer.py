@@ -0,0 +1,57 @@
+"""
+Sample serialization shared by every consumer of the encoded bytes.
+"""
+
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+# One encoder for the process. json.dumps() with custom separators builds
+# a new JSONEncoder on every call; samples never contain reference cycles,
+# so the per-container cycle bookkeeping is switched off as well.
+_ENCODER = json.JSONEncoder(separators=(',', ':'), check_circular=False)
+_encode_str = _ENCODER.encode
+
+# (epoch second, 'YYYY-MM-DDTHH:MM:SS') of the last formatted timestamp.
+# Replaced as a whole tuple, so concurrent collection threads never see a
+# second paired with another second's prefix.
+_timestamp_cache: Tuple[int, str] = (-1, '')
+
+
+def encode(sample: Dict[str, Any]) -> bytes:
+    """
+    Serialize a sample to compact JSON.
+
+    Args:
+        sample: Sample or any JSON-compatible structure
+
+    Returns:
+        UTF-8 encoded JSON (ASCII only, non-ASCII text is escaped)
+    """
+    return _encode_str(sample).encode('utf-8')
+
+
+def format_timestamp(now: Optional[float] = None) -> str:
+    """
+    Format a UTC timestamp as ISO 8601 with microseconds and a 'Z' suffix.
+
+    The date and time of day are formatted once per second; later calls
+    in the same second only format the microseconds.
+
+    Args:
+        now: Epoch seconds (defaults to time.time())
+
+    Returns:
+        Timestamp such as '2026-01-01T00:00:00.000000Z'
+    """
+    global _timestamp_cache
+
+    if now is None:
+        now = time.time()
+    second = int(now)
+    cached_second, prefix = _timestamp_cache
+    if second != cached_second:
+        prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+        _timestamp_cache = (second, prefix)
+    return f'{prefix}.{int((now - second) * 1000000):06d}Z'
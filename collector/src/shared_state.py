@@ -0,0 +1,514 @@
+"""
+Latest sample published in shared memory for other processes on the host.
+
+With shared_memory.enabled, the collector writes every collected family
+into a memory-mapped file (by default under /dev/shm), so a sidecar or a
+local exporter can read current CPU, memory, disk and network values
+without sampling the host again or talking to the collector.
+
+The segment has a fixed layout: a header, then one block per family at
+a 64-byte aligned offset that depends only on the header's capacities.
+Each block starts with a sequence counter used as a seqlock: the writer
+makes it odd, writes the block and makes it even again, and a reader
+retries if the counter was odd or changed while it copied the block.
+Readers never take a lock or block the collector. Entries beyond a
+block's capacity are dropped (the block records how many there were).
+
+All values are little-endian. Layout (LAYOUT_VERSION 1):
+
+    header     HEADER at offset 0, HEADER_SIZE bytes
+    cpu        BLOCK, CPU, then max_cores doubles (per-core usage)
+    memory     BLOCK, MEMORY
+    disk       BLOCK, DISK_IO, then max_partitions PARTITION entries
+    network    BLOCK, CONNECTIONS, then max_interfaces INTERFACE entries
+
+Unknown values are NaN in doubles and -1 in signed integers. A restarted
+collector replaces the file, and the old segment is marked closed when
+the collector stops; readers check `stale` and reopen.
+"""
+
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, Union
+
+from sample_model import (CONNECTION_STATES, CpuMetrics, DiskMetrics, MemoryMetrics,
+                          NetworkMetrics, Sample, intern_names)
+from serializer import format_timestamp
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MSHM'
+LAYOUT_VERSION = 1
+
+DEFAULT_PATH = Path('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()) \
+    / 'system-metrics-collector'
+
+# Defaults for shared_memory.max_cores, max_partitions and max_interfaces
+DEFAULT_MAX_CORES = 1024
+DEFAULT_MAX_PARTITIONS = 64
+DEFAULT_MAX_INTERFACES = 64
+
+# magic, layout version, closed (0/1), writer pid, max cores, max partitions,
+# max interfaces, start time, hostname
+HEADER = struct.Struct('<4sHHIIIId64s')
+HEADER_SIZE = 128
+
+# Every block: seqlock counter, sample time (epoch seconds), entries
+# written, entries in the sample
+BLOCK = struct.Struct('<QdII')
+SEQ = struct.Struct('<Q')
+
+# usage total/user/system/idle/iowait, load 1m/5m/15m, logical and
+# physical core count (0 if unknown); per-core usage follows
+CPU = struct.Struct('<8dII')
+# total, used, available, free, percent, buffers, cached, swap total,
+# used, free, percent
+MEMORY = struct.Struct('<4qd2q3qd')
+# read bytes/s, read ops/s, write bytes/s, write ops/s
+DISK_IO = struct.Struct('<4d')
+# mountpoint, device, fstype, usage total/used/free/percent, inode
+# total/used/free/percent (inode total -1 if unknown)
+PARTITION = struct.Struct('<64s64s16s3qd3qd')
+# counts in CONNECTION_STATES order
+CONNECTIONS = struct.Struct(f'<{len(CONNECTION_STATES)}q')
+# name, group member count, counters in NET_COUNTERS order, rates in
+# NET_RATES order
+INTERFACE = struct.Struct('<32sI4x8Q4d')
+
+CORE = 8
+
+# Attempts at a consistent copy before a read gives up
+READ_RETRIES = 100
+
+
+class Reading(NamedTuple):
+    """One family's latest values as read from the segment."""
+
+    timestamp: float
+    seq: int
+    metrics: Any
+    # Cores, partitions or interfaces in the sample; more than metrics
+    # holds if the block's capacity was exceeded
+    total: int
+
+
+def _align(offset: int) -> int:
+    """Round up to a cache line, so blocks written by different threads do not share one."""
+    return (offset + 63) & ~63
+
+
+def layout(max_cores: int, max_partitions: int,
+           max_interfaces: int) -> Tuple[Dict[str, int], int]:
+    """
+    Compute block offsets for the given capacities.
+
+    Args:
+        max_cores: Per-core entries in the cpu block
+        max_partitions: Entries in the disk block
+        max_interfaces: Entries in the network block
+
+    Returns:
+        (family to block offset, segment size)
+    """
+    offsets = {'cpu': HEADER_SIZE}
+    offsets['memory'] = _align(offsets['cpu'] + BLOCK.size + CPU.size + CORE * max_cores)
+    offsets['disk'] = _align(offsets['memory'] + BLOCK.size + MEMORY.size)
+    offsets['network'] = _align(offsets['disk'] + BLOCK.size + DISK_IO.size
+                                + PARTITION.size * max_partitions)
+    size = _align(offsets['network'] + BLOCK.size + CONNECTIONS.size
+                  + INTERFACE.size * max_interfaces)
+    return offsets, size
+
+
+def _epoch(timestamp: str) -> float:
+    """Parse a sample's UTC ISO timestamp, falling back to the current time."""
+    try:
+        parsed = datetime.fromisoformat(timestamp.rstrip('Z'))
+        return parsed.replace(tzinfo=timezone.utc).timestamp()
+    except (AttributeError, ValueError):
+        return time.time()
+
+
+def _name(value: str, size: int) -> bytes:
+    return value.encode('utf-8', 'replace')[:size]
+
+
+def _text(value: bytes) -> str:
+    return value.rstrip(b'\0').decode('utf-8', 'ignore')
+
+
+def _known(value: Optional[float]) -> float:
+    return math.nan if value is None else value
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if value != value else value
+
+
+class SharedStateWriter:
+    """Publishes collected samples into a shared-memory segment."""
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_PATH, hostname: str = '',
+                 max_cores: int = DEFAULT_MAX_CORES,
+                 max_partitions: int = DEFAULT_MAX_PARTITIONS,
+                 max_interfaces: int = DEFAULT_MAX_INTERFACES):
+        """
+        Create the segment, replacing any left by a previous collector.
+
+        Args:
+            path: File to map (on tmpfs, so it never touches disk)
+            hostname: Host name stored in the header
+            max_cores: Per-core entries in the cpu block
+            max_partitions: Entries in the disk block
+            max_interfaces: Entries in the network block
+
+        Raises:
+            OSError: If the file cannot be created
+        """
+        self.path = Path(path)
+        self.max_cores = max_cores
+        self.max_partitions = max_partitions
+        self.max_interfaces = max_interfaces
+        self.offsets, self.size = layout(max_cores, max_partitions, max_interfaces)
+        self._seqs = dict.fromkeys(self.offsets, 0)
+        # Families are collected on separate threads; one writer per block
+        # at a time keeps the counters odd/even as readers expect
+        self._lock = threading.Lock()
+
+        # Built under a temporary name so readers never map a half-written header
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_name(self.path.name + '.tmp')
+        fd = os.open(temp, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, self.size)
+            self._mm = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self._mm, 0, MAGIC, LAYOUT_VERSION, 0, os.getpid(), max_cores,
+                         max_partitions, max_interfaces, time.time(), _name(hostname, 64))
+        os.replace(temp, self.path)
+
+        self._pack = {
+            'cpu': self._pack_cpu,
+            'memory': self._pack_memory,
+            'disk': self._pack_disk,
+            'network': self._pack_network,
+        }
+        logger.info("Publishing samples to shared memory at %s (%s bytes)", self.path, self.size)
+
+    def publish(self, sample: Sample):
+        """
+        Write every family present in a sample.
+
+        Args:
+            sample: Compact sample, as collected
+        """
+        timestamp = _epoch(sample.timestamp)
+        for family in Sample.FAMILIES:
+            record = getattr(sample, family)
+            if record is not None:
+                self._write(family, timestamp, record)
+
+    def _write(self, family: str, timestamp: float, record: Any):
+        """Write one block under its seqlock."""
+        mm = self._mm
+        offset = self.offsets[family]
+        with self._lock:
+            seq = self._seqs[family] + 1
+            SEQ.pack_into(mm, offset, seq)
+            written, total = self._pack[family](offset + BLOCK.size, record)
+            BLOCK.pack_into(mm, offset, seq, timestamp, written, total)
+            SEQ.pack_into(mm, offset, seq + 1)
+            self._seqs[family] = seq + 1
+
+    def _pack_cpu(self, offset: int, cpu: CpuMetrics) -> Tuple[int, int]:
+        load = cpu.load or (math.nan, math.nan, math.nan)
+        CPU.pack_into(self._mm, offset, cpu.total, cpu.user, cpu.system, cpu.idle,
+                      _known(cpu.iowait), *load, cpu.count or 0, cpu.physical_count or 0)
+        cores = cpu.cores
+        if cores is None:
+            return 0, 0
+        written = min(len(cores), self.max_cores)
+        start = offset + CPU.size
+        self._mm[start:start + CORE * written] = cores[:written].tobytes()
+        return written, len(cores)
+
+    def _pack_memory(self, offset: int, memory: MemoryMetrics) -> Tuple[int, int]:
+        MEMORY.pack_into(self._mm, offset, memory.total, memory.used, memory.available,
+                         memory.free, memory.percent,
+                         -1 if memory.buffers is None else memory.buffers,
+                         -1 if memory.cached is None else memory.cached,
+                         memory.swap_total, memory.swap_used, memory.swap_free,
+                         memory.swap_percent)
+        return 1, 1
+
+    def _pack_disk(self, offset: int, disk: DiskMetrics) -> Tuple[int, int]:
+        mm = self._mm
+        DISK_IO.pack_into(mm, offset, *(disk.io or (math.nan,) * 4))
+        total = len(disk.mountpoints)
+        written = min(total, self.max_partitions)
+        entry = offset + DISK_IO.size
+        for i in range(written):
+            PARTITION.pack_into(
+                mm, entry, _name(disk.mountpoints[i], 64), _name(disk.devices[i], 64),
+                _name(disk.fstypes[i], 16), disk.usage_total[i], disk.usage_used[i],
+                disk.usage_free[i], disk.usage_percent[i], disk.inode_total[i],
+                disk.inode_used[i], disk.inode_free[i], disk.inode_percent[i])
+            entry += PARTITION.size
+        return written, total
+
+    def _pack_network(self, offset: int, network: NetworkMetrics) -> Tuple[int, int]:
+        mm = self._mm
+        CONNECTIONS.pack_into(mm, offset,
+                              *(network.connections or (-1,) * len(CONNECTION_STATES)))
+        counters, rates, members = network.counters, network.rates, network.members
+        total = len(network.names)
+        written = min(total, self.max_interfaces)
+        entry = offset + CONNECTIONS.size
+        for i in range(written):
+            INTERFACE.pack_into(mm, entry, _name(network.names[i], 32),
+                                members[i] if members is not None else 0,
+                                *counters[i * 8:(i + 1) * 8], *rates[i * 4:(i + 1) * 4])
+            entry += INTERFACE.size
+        return written, total
+
+    def close(self):
+        """Mark the segment closed so readers know the values are no longer updated."""
+        if self._mm is None:
+            return
+        values = list(HEADER.unpack_from(self._mm, 0))
+        values[2] = 1
+        HEADER.pack_into(self._mm, 0, *values)
+        self._mm.close()
+        self._mm = None
+
+
+class SharedStateReader:
+    """
+    Reads the latest values from a collector's shared-memory segment.
+
+    Uses only the standard library and the record classes in
+    sample_model, so a sidecar can ship this module with them. Reads copy
+    one block out of the mapping and never wait for the collector.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_PATH):
+        """
+        Map a segment.
+
+        Args:
+            path: File the collector publishes to (shared_memory.path)
+
+        Raises:
+            FileNotFoundError: If no collector has created the segment
+            ValueError: If the file is not a segment of a supported version
+        """
+        self.path = Path(path)
+        self._mm: Optional[mmap.mmap] = None
+        self.reopen()
+
+    def reopen(self):
+        """Map the current segment, e.g. after the collector restarted."""
+        self.close()
+        with open(self.path, 'rb') as f:
+            self._inode = os.fstat(f.fileno()).st_ino
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mm) < HEADER_SIZE:
+            mm.close()
+            raise ValueError(f"{self.path} is not a shared metrics segment")
+        (magic, version, _, self.pid, self.max_cores, self.max_partitions,
+         self.max_interfaces, self.started, hostname) = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            mm.close()
+            raise ValueError(f"{self.path} is not a shared metrics segment")
+        if version != LAYOUT_VERSION:
+            mm.close()
+            raise ValueError(f"Unsupported shared metrics layout version {version}")
+        self.hostname = _text(hostname)
+        self.offsets, size = layout(self.max_cores, self.max_partitions, self.max_interfaces)
+        if len(mm) < size:
+            mm.close()
+            raise ValueError(f"{self.path} is truncated")
+        self._mm = mm
+
+    @property
+    def closed(self) -> bool:
+        """True once the collector that owns the segment has stopped."""
+        return HEADER.unpack_from(self._mm, 0)[2] != 0
+
+    @property
+    def stale(self) -> bool:
+        """True if the collector stopped or the segment was replaced; call reopen()."""
+        if self.closed:
+            return True
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            return True
+
+    def _read(self, family: str, fixed: int, entry: int, capacity: int,
+              parse: Callable[[bytes, int], Any]) -> Optional[Reading]:
+        """
+        Copy one block consistently and parse it.
+
+        Returns:
+            Reading, or None if the block was never written or no
+            consistent copy was obtained in READ_RETRIES attempts
+        """
+        mm = self._mm
+        offset = self.offsets[family]
+        for _ in range(READ_RETRIES):
+            seq, _, written, _ = BLOCK.unpack_from(mm, offset)
+            if seq == 0:
+                return None
+            if seq & 1:
+                time.sleep(0)
+                continue
+            end = offset + BLOCK.size + fixed + entry * min(written, capacity)
+            data = mm[offset:end]
+            if SEQ.unpack_from(mm, offset)[0] == seq:
+                # The copy is consistent; parse it at leisure
+                _, timestamp, written, total = BLOCK.unpack_from(data, 0)
+                return Reading(timestamp, seq, parse(data, min(written, capacity)), total)
+        return None
+
+    def cpu(self) -> Optional[Reading]:
+        """Latest CPU values; metrics is a CpuMetrics."""
+        return self._read('cpu', CPU.size, CORE, self.max_cores, _parse_cpu)
+
+    def memory(self) -> Optional[Reading]:
+        """Latest memory values; metrics is a MemoryMetrics."""
+        return self._read('memory', MEMORY.size, 0, 0, _parse_memory)
+
+    def disk(self) -> Optional[Reading]:
+        """Latest disk values; metrics is a DiskMetrics."""
+        return self._read('disk', DISK_IO.size, PARTITION.size, self.max_partitions,
+                          _parse_disk)
+
+    def network(self) -> Optional[Reading]:
+        """Latest network values; metrics is a NetworkMetrics."""
+        return self._read('network', CONNECTIONS.size, INTERFACE.size, self.max_interfaces,
+                          _parse_network)
+
+    def sample(self) -> Optional[Sample]:
+        """
+        Latest values of every family as one sample.
+
+        Returns:
+            Sample stamped with the newest family's time (use to_dict() for
+            the JSON shape), or None if nothing was published yet
+        """
+        readings = {family: getattr(self, family)() for family in Sample.FAMILIES}
+        times = [reading.timestamp for reading in readings.values() if reading is not None]
+        if not times:
+            return None
+        sample = Sample(format_timestamp(max(times)), self.hostname)
+        for family, reading in readings.items():
+            if reading is not None:
+                setattr(sample, family, reading.metrics)
+        return sample
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def __enter__(self) -> 'SharedStateReader':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _parse_cpu(data: bytes, written: int) -> CpuMetrics:
+    (total, user, system, idle, iowait, load_1m, load_5m, load_15m, count,
+     physical_count) = CPU.unpack_from(data, BLOCK.size)
+    cpu = CpuMetrics(total, user, system, idle, _optional(iowait), count=count or None,
+                     physical_count=physical_count or None)
+    if load_1m == load_1m:
+        cpu.load = (load_1m, load_5m, load_15m)
+    if written:
+        start = BLOCK.size + CPU.size
+        cpu.cores = array('d')
+        cpu.cores.frombytes(data[start:start + CORE * written])
+    return cpu
+
+
+def _parse_memory(data: bytes, written: int) -> MemoryMetrics:
+    (total, used, available, free, percent, buffers, cached, swap_total, swap_used,
+     swap_free, swap_percent) = MEMORY.unpack_from(data, BLOCK.size)
+    return MemoryMetrics(total, used, available, free, percent,
+                         None if buffers < 0 else buffers, None if cached < 0 else cached,
+                         swap_total, swap_used, swap_free, swap_percent)
+
+
+def _parse_disk(data: bytes, written: int) -> DiskMetrics:
+    disk = DiskMetrics()
+    io = DISK_IO.unpack_from(data, BLOCK.size)
+    if io[0] == io[0]:
+        disk.io = io
+    mountpoints, devices, fstypes = [], [], []
+    for values in PARTITION.iter_unpack(data[BLOCK.size + DISK_IO.size:]):
+        mountpoints.append(_text(values[0]))
+        devices.append(_text(values[1]))
+        fstypes.append(_text(values[2]))
+        disk.usage_total.append(values[3])
+        disk.usage_used.append(values[4])
+        disk.usage_free.append(values[5])
+        disk.usage_percent.append(values[6])
+        disk.inode_total.append(values[7])
+        disk.inode_used.append(values[8])
+        disk.inode_free.append(values[9])
+        disk.inode_percent.append(values[10])
+    disk.mountpoints = intern_names(mountpoints)
+    disk.devices = intern_names(devices)
+    disk.fstypes = intern_names(fstypes)
+    return disk
+
+
+def _parse_network(data: bytes, written: int) -> NetworkMetrics:
+    network = NetworkMetrics()
+    connections = CONNECTIONS.unpack_from(data, BLOCK.size)
+    if connections[0] >= 0:
+        network.connections = connections
+    names, members = [], array('I')
+    for values in INTERFACE.iter_unpack(data[BLOCK.size + CONNECTIONS.size:]):
+        names.append(_text(values[0]))
+        members.append(values[1])
+        network.counters.extend(values[2:10])
+        network.rates.extend(values[10:14])
+    network.names = intern_names(names)
+    if any(members):
+        network.members = members
+    return network
+
+
+def open_shared_state(config) -> SharedStateWriter:
+    """
+    Create the shared-memory segment described by a configuration.
+
+    Args:
+        config: Configuration object
+
+    Returns:
+        SharedStateWriter instance
+    """
+    return SharedStateWriter(
+        config.get('shared_memory', 'path', default=None) or DEFAULT_PATH,
+        config.hostname,
+        max_cores=config.get('shared_memory', 'max_cores', default=DEFAULT_MAX_CORES),
+        max_partitions=config.get('shared_memory', 'max_partitions',
+                                  default=DEFAULT_MAX_PARTITIONS),
+        max_interfaces=config.get('shared_memory', 'max_interfaces',
+                                  default=DEFAULT_MAX_INTERFACES),
+    )
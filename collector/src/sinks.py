@@ -0,0 +1,302 @@
+"""
+Destinations that encoded metrics are delivered to.
+"""
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Mapping, Optional, Sequence
+
+from load_shedding import BackpressureMonitor
+
+
+logger = logging.getLogger(__name__)
+
+# Ingest endpoints below an HTTP sink's base URL
+COLLECT_PATH = '/api/v1/metrics/collect'
+CAPTURE_PATH = '/api/v1/metrics/burst'
+
+# The requests module, imported by the first HTTP sink that sends
+_requests = None
+
+
+class Sink:
+    """
+    Base class for a metrics destination.
+
+    A sink only moves bytes; queueing, buffering and retries are handled
+    per sink by the sender, so one sink failing never affects another.
+    """
+
+    def __init__(self, spec: Mapping[str, Any]):
+        """
+        Initialize the sink.
+
+        Args:
+            spec: Sink definition from the configuration
+        """
+        self.name = spec['name']
+
+    def deliver(self, payloads: Sequence[bytes]) -> bool:
+        """
+        Deliver a batch of encoded samples.
+
+        Args:
+            payloads: JSON-encoded samples, oldest first
+
+        Returns:
+            True if the whole batch was accepted, False otherwise
+        """
+        raise NotImplementedError
+
+    def deliver_capture(self, name: str, data: bytes) -> bool:
+        """
+        Deliver a burst capture (see burst.BurstCapture).
+
+        Args:
+            name: Capture file name, e.g. 'burst-20260101T000000Z.json.gz'
+            data: Gzip-compressed JSON document
+
+        Returns:
+            True if the capture was accepted, False otherwise
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release any open resources."""
+
+
+class HttpSink(Sink):
+    """
+    POSTs samples to an ingest API; batches are sent as a JSON array.
+
+    Safe to use from several threads at once (sinks[].window). Any 2xx
+    response acknowledges the whole request; the ingest API deduplicates
+    by the session and seq fields of each sample, so a retransmitted
+    sample is stored once.
+    """
+
+    def __init__(self, spec: Mapping[str, Any], backpressure: BackpressureMonitor):
+        """
+        Initialize the sink.
+
+        Args:
+            spec: Sink definition from the configuration
+            backpressure: Monitor fed with this sink's responses
+        """
+        super().__init__(spec)
+        base_url = str(spec['url']).rstrip('/')
+        self.url = base_url + COLLECT_PATH
+        self.capture_url = base_url + CAPTURE_PATH
+        self.api_key = spec.get('api_key') or ''
+        self.timeout = spec.get('timeout', 10)
+        self.window = spec.get('window', 1)
+        self.backpressure = backpressure
+
+        # HTTP session, created on first send so `requests` is only imported
+        # once there is something to transmit
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def _get_session(self):
+        """
+        Get the HTTP session, importing `requests` on first use.
+
+        Returns:
+            requests.Session instance
+        """
+        global _requests
+
+        with self._session_lock:
+            if self._session is None:
+                if _requests is None:
+                    import requests
+                    _requests = requests
+                session = _requests.Session()
+                # One pooled connection per request that may be in flight
+                adapter = _requests.adapters.HTTPAdapter(pool_maxsize=max(10, self.window))
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def deliver(self, payloads: Sequence[bytes]) -> bool:
+        if len(payloads) == 1:
+            body = payloads[0]
+        else:
+            body = b'[' + b','.join(payloads) + b']'
+
+        if self._post(self.url, body, {}):
+            logger.debug("Successfully sent %s samples to %s", len(payloads), self.url)
+            return True
+        return False
+
+    def deliver_capture(self, name: str, data: bytes) -> bool:
+        if self._post(self.capture_url, data, {'Content-Encoding': 'gzip'}):
+            logger.info("Uploaded burst capture %s to %s", name, self.capture_url)
+            return True
+        return False
+
+    def _post(self, url: str, body: bytes, extra_headers: Mapping[str, str]) -> bool:
+        """
+        POST a JSON body, feeding the response to the backpressure monitor.
+
+        Returns:
+            True on HTTP 2xx, False otherwise
+        """
+        session = self._get_session()
+
+        start = time.monotonic()
+        try:
+            headers = {
+                'Content-Type': 'application/json'
+            }
+            headers.update(extra_headers)
+
+            if self.api_key:
+                headers['Authorization'] = f'Bearer {self.api_key}'
+
+            response = session.post(
+                url,
+                data=body,
+                headers=headers,
+                timeout=self.timeout
+            )
+
+            self.backpressure.record_response(
+                response.status_code,
+                time.monotonic() - start,
+                _parse_retry_after(response.headers.get('Retry-After'))
+            )
+
+            if 200 <= response.status_code < 300:
+                return True
+            else:
+                logger.warning("Failed to send metrics to sink %s: HTTP %s - %s",
+                               self.name, response.status_code, response.text)
+                return False
+
+        except _requests.exceptions.Timeout:
+            self.backpressure.record_response(None, time.monotonic() - start)
+            logger.warning("Timeout sending metrics to %s", url)
+            return False
+        except _requests.exceptions.ConnectionError:
+            logger.warning("Connection error sending metrics to %s", url)
+            return False
+        except Exception as e:
+            logger.error("Unexpected error sending metrics to sink %s: %s", self.name, e)
+            return False
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class FileSink(Sink):
+    """Appends samples as JSON lines to a local file, rotating by size."""
+
+    def __init__(self, spec: Mapping[str, Any]):
+        """
+        Initialize the sink.
+
+        Args:
+            spec: Sink definition from the configuration
+        """
+        super().__init__(spec)
+        self.path = Path(spec['path'])
+        self.max_size = int(spec.get('max_size', 100) * 1024 * 1024)  # Convert to bytes
+        self.backup_count = spec.get('backup_count', 3)
+        self._file = None
+        # Lines from concurrent deliveries must not interleave
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'ab')
+        return self._file
+
+    def _rotate(self):
+        self.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f'{self.path.name}.{index}')
+            if source.exists():
+                os.replace(source, self.path.with_name(f'{self.path.name}.{index + 1}'))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f'{self.path.name}.1'))
+        else:
+            self.path.unlink()
+
+    def deliver(self, payloads: Sequence[bytes]) -> bool:
+        with self._lock:
+            try:
+                f = self._open()
+                for payload in payloads:
+                    f.write(payload)
+                    f.write(b'\n')
+                f.flush()
+                if self.max_size > 0 and f.tell() >= self.max_size:
+                    self._rotate()
+                return True
+            except OSError as e:
+                logger.error("Failed to write metrics to %s: %s", self.path, e)
+                self.close()
+                return False
+
+    def deliver_capture(self, name: str, data: bytes) -> bool:
+        # Written next to the JSON lines file, under the capture's own name
+        target = self.path.with_name(name)
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            temp = target.with_name(target.name + '.tmp')
+            temp.write_bytes(data)
+            os.replace(temp, target)
+            return True
+        except OSError as e:
+            logger.error("Failed to write burst capture to %s: %s", target, e)
+            return False
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+
+def create_sink(spec: Mapping[str, Any], backpressure: BackpressureMonitor) -> Sink:
+    """
+    Build a sink from its configuration.
+
+    Args:
+        spec: Validated sink definition (see Config.sinks)
+        backpressure: Monitor for the sink's channel
+
+    Returns:
+        Sink instance
+    """
+    if spec['type'] == 'file':
+        return FileSink(spec)
+    return HttpSink(spec, backpressure)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given in seconds.
+
+    Args:
+        value: Header value, if present
+
+    Returns:
+        Delay in seconds, or None if absent or not a number
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
@@ -0,0 +1,75 @@
+"""
+Startup stage timing for the metrics collector.
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+
+class StartupProfiler:
+    """Records how long each startup stage takes."""
+
+    def __init__(self, enabled: bool = False, origin: Optional[float] = None):
+        """
+        Initialize the startup profiler.
+
+        Args:
+            enabled: Whether a report should be emitted at the end of startup
+            origin: perf_counter() value startup is measured from.
+                    If None, the time of construction is used.
+        """
+        self.enabled = enabled
+        self.origin = origin if origin is not None else time.perf_counter()
+        self._stages: List[Tuple[str, float]] = []
+        self._marks: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a startup stage.
+
+        Args:
+            name: Stage name (e.g. 'import:sender', 'init:collector')
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stages.append((name, time.perf_counter() - start))
+
+    def mark(self, name: str):
+        """
+        Record a milestone relative to the profiler origin.
+
+        Args:
+            name: Milestone name (e.g. 'first_sample')
+        """
+        self._marks.append((name, time.perf_counter() - self.origin))
+
+    def report(self) -> str:
+        """
+        Format the recorded stages and milestones.
+
+        Returns:
+            Human readable multi-line report
+        """
+        lines = ["Startup profile:"]
+        width = max([len(name) for name, _ in self._stages + self._marks] + [10])
+
+        for name, elapsed in self._stages:
+            lines.append(f"  {name:<{width}}  {elapsed * 1000:9.2f} ms")
+
+        total = sum(elapsed for _, elapsed in self._stages)
+        lines.append(f"  {'stages total':<{width}}  {total * 1000:9.2f} ms")
+
+        for name, offset in self._marks:
+            lines.append(f"  {name:<{width}}  {offset * 1000:9.2f} ms since start")
+
+        return "\n".join(lines)
+
+    def emit(self):
+        """Write the report to stderr if profiling is enabled."""
+        if self.enabled:
+            print(self.report(), file=sys.stderr, flush=True)
@@ -0,0 +1,188 @@
+"""
+Synthetic host snapshots for tests and benchmarks.
+
+generate_host() writes the snapshot layout ProcfsBackend replays, for a
+host with any number of cores, network interfaces, disks and sockets.
+Counters advance by seeded random amounts between frames, so the same
+arguments always produce the same snapshot.
+"""
+
+import json
+import random
+from pathlib import Path
+
+from backends import CPU_FIELDS, USER_HZ
+
+
+# Epoch seconds of the first frame
+START_TIME = 1767225600.0
+
+# /proc/net/tcp state codes cycled through by synthetic sockets, weighted
+# roughly like a busy server
+TCP_STATE_MIX = ('01',) * 6 + ('06',) * 2 + ('08', '0A')
+
+
+def _disk_name(index: int) -> str:
+    """Block device name for a disk index: sda ... sdz, sdaa, ..."""
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(ord('a') + remainder) + name
+    return 'sd' + name
+
+
+def _socket_line(index: int, state: str) -> str:
+    return (f'{index:4d}: 0100007F:{1024 + index % 60000:04X} 0200007F:{index % 65535:04X} '
+            f'{state} 00000000:00000000 00:00000000 00000000     0        0 {10000 + index} '
+            f'1 0000000000000000 20 4 30 10 -1')
+
+
+def _nic_counters(rng: random.Random, scale: int = 1) -> list:
+    """/proc/net/dev columns: bytes and packets in 0, 1 (rx) and 8, 9 (tx)."""
+    return [rng.randrange(10**9 // scale) if column in (0, 8) else
+            rng.randrange(10**6 // scale) if column in (1, 9) else rng.randrange(100)
+            for column in range(16)]
+
+
+def generate_host(dest: Path, cores: int = 8, interfaces: int = 2, disks: int = 2,
+                  sockets: int = 100, frames: int = 2, interval: float = 5.0,
+                  seed: int = 0, veths: int = 0, churn: float = 0.0) -> Path:
+    """
+    Write a synthetic host snapshot.
+
+    Args:
+        dest: Snapshot directory to create
+        cores: Logical CPUs (two per physical core)
+        interfaces: Network interfaces besides loopback
+        disks: Disks, each with one mounted ext4 partition
+        sockets: TCP sockets (plus one UDP socket per 10)
+        frames: Frames to write
+        interval: Seconds between frames
+        seed: Random seed
+        veths: Container veth interfaces, as on a Kubernetes node
+        churn: Fraction of veth interfaces replaced by new ones each frame
+
+    Returns:
+        The snapshot directory
+    """
+    dest = Path(dest)
+    rng = random.Random(seed)
+    ticks = interval * USER_HZ
+
+    cpu = [[rng.randrange(10**6) for _ in CPU_FIELDS[:8]] for _ in range(cores)]
+    nics = {f'eth{index}': _nic_counters(rng) for index in range(interfaces)}
+    pods = {f'veth{index:08x}': _nic_counters(rng, 1000) for index in range(veths)}
+    next_pod = veths
+    disk_io = [[rng.randrange(10**6) for _ in range(11)] for _ in range(disks)]
+    mem_total = 4 * 1024 * 1024 * max(1, cores)  # kB, 4 GiB per core
+    statvfs = {
+        ('/' if index == 0 else f'/data{index}'): [4096, 2**28, 0, 0, 2**24, 0]
+        for index in range(disks)
+    }
+
+    names = [_disk_name(index) for index in range(disks)]
+    filesystems = 'nodev\tsysfs\nnodev\tproc\nnodev\ttmpfs\n\text4\n\txfs\n'
+    mounts = ['sysfs /sys sysfs rw,nosuid,nodev,noexec,relatime 0 0',
+              'proc /proc proc rw,nosuid,nodev,noexec,relatime 0 0',
+              'tmpfs /run tmpfs rw,nosuid,nodev,mode=755 0 0']
+    mounts += [f'/dev/{name}1 {mountpoint} ext4 rw,relatime 0 0'
+               for name, mountpoint in zip(names, statvfs)]
+    cpuinfo = ''.join(
+        f'processor\t: {index}\nphysical id\t: 0\ncore id\t\t: {index // 2}\n'
+        f'cpu cores\t: {max(1, cores // 2)}\n\n'
+        for index in range(cores)
+    )
+    tcp_lines = [_socket_line(index, TCP_STATE_MIX[index % len(TCP_STATE_MIX)])
+                 for index in range(sockets)]
+    udp_lines = [_socket_line(index, '07') for index in range(sockets // 10)]
+    header = '  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt' \
+             '   uid  timeout inode'
+
+    for frame_index in range(frames):
+        if frame_index:
+            for times in cpu:
+                # Split the interval's ticks between user, system, idle, iowait
+                busy = rng.random()
+                times[0] += int(ticks * busy * 0.7)
+                times[2] += int(ticks * busy * 0.25)
+                times[4] += int(ticks * busy * 0.05)
+                times[3] += int(ticks * (1 - busy))
+            # Pods come and go; new interfaces start from zero
+            for name in rng.sample(sorted(pods), int(len(pods) * churn)):
+                del pods[name]
+                pods[f'veth{next_pod:08x}'] = [0] * 16
+                next_pod += 1
+            for counters in list(nics.values()) + list(pods.values()):
+                for column in (0, 8):
+                    counters[column] += rng.randrange(int(10**6 * interval))
+                for column in (1, 9):
+                    counters[column] += rng.randrange(int(10**3 * interval))
+            for counters in disk_io:
+                for column in (0, 2, 4, 6):
+                    counters[column] += rng.randrange(int(10**4 * interval))
+
+        frame = dest / f'{frame_index:04d}'
+        proc = frame / 'proc'
+        (proc / 'net').mkdir(parents=True, exist_ok=True)
+        (frame / 'sys' / 'block').mkdir(parents=True, exist_ok=True)
+        (frame / 'sys' / 'cpu').mkdir(parents=True, exist_ok=True)
+
+        total = [sum(column) for column in zip(*cpu)] if cpu else [0] * 8
+        stat = ['cpu  ' + ' '.join(map(str, total + [0, 0]))]
+        stat += [f'cpu{index} ' + ' '.join(map(str, times + [0, 0]))
+                 for index, times in enumerate(cpu)]
+        stat.append(f'ctxt {frame_index * 1000}')
+        (proc / 'stat').write_text('\n'.join(stat) + '\n')
+
+        available = int(mem_total * (0.4 + 0.2 * rng.random()))
+        (proc / 'meminfo').write_text(
+            f'MemTotal:       {mem_total} kB\n'
+            f'MemFree:        {available // 4} kB\n'
+            f'MemAvailable:   {available} kB\n'
+            f'Buffers:        {mem_total // 50} kB\n'
+            f'Cached:         {mem_total // 5} kB\n'
+            f'SwapTotal:      {mem_total // 4} kB\n'
+            f'SwapFree:       {mem_total // 4} kB\n'
+            f'SReclaimable:   {mem_total // 100} kB\n'
+        )
+        load = [round(rng.random() * cores, 2) for _ in range(3)]
+        (proc / 'loadavg').write_text(f'{load[0]} {load[1]} {load[2]} 2/{sockets + 100} 12345\n')
+        (proc / 'cpuinfo').write_text(cpuinfo)
+        (proc / 'filesystems').write_text(filesystems)
+        (proc / 'mounts').write_text('\n'.join(mounts) + '\n')
+
+        diskstats = []
+        for number, (name, counters) in enumerate(zip(names, disk_io)):
+            diskstats.append(f'   8 {number * 16:7d} {name} ' + ' '.join(map(str, counters)))
+            diskstats.append(f'   8 {number * 16 + 1:7d} {name}1 ' + ' '.join(map(str, counters)))
+            (frame / 'sys' / 'block' / name).touch()
+        (proc / 'diskstats').write_text('\n'.join(diskstats) + '\n')
+
+        dev = ['Inter-|   Receive                                                |  Transmit',
+               ' face |bytes    packets errs drop fifo frame compressed multicast|'
+               'bytes    packets errs drop fifo colls carrier compressed',
+               '    lo: ' + ' '.join(['0'] * 16)]
+        dev += [f'  {name}: ' + ' '.join(map(str, counters))
+                for name, counters in list(nics.items()) + list(pods.items())]
+        (proc / 'net' / 'dev').write_text('\n'.join(dev) + '\n')
+        (proc / 'net' / 'tcp').write_text('\n'.join([header] + tcp_lines) + '\n')
+        (proc / 'net' / 'udp').write_text('\n'.join([header] + udp_lines) + '\n')
+        (proc / 'net' / 'tcp6').write_text(header + '\n')
+        (proc / 'net' / 'udp6').write_text(header + '\n')
+
+        for index in range(cores):
+            core = index // 2 * 2
+            (frame / 'sys' / 'cpu' / str(index)).write_text(
+                f'{core}-{core + 1}\n' if core + 1 < cores else f'{core}\n')
+
+        for values in statvfs.values():
+            # Disks fill up slowly; inodes follow
+            values[2] = values[2] or int(values[1] * rng.random())
+            values[2] = max(0, values[2] - rng.randrange(1000))
+            values[3] = values[2] * 95 // 100
+            values[5] = values[4] * values[2] // values[1]
+        (frame / 'statvfs.json').write_text(json.dumps(statvfs))
+        (frame / 'time').write_text(repr(START_TIME + frame_index * interval))
+
+    return dest
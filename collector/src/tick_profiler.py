@@ -0,0 +1,267 @@
+"""
+Slow-tick profiler.
+
+Every collection and send tick is timed against a budget. A watchdog
+thread sleeps until the earliest running tick's deadline; a tick that is
+still running then has its thread's stack sampled until it ends, and the
+samples are written as collapsed stacks (one 'frame;frame;... count' line
+per stack, the input format of flamegraph.pl and speedscope). A tick
+within budget costs a lock round trip as it starts and ends, and the
+watchdog takes no samples.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from serializer import format_timestamp
+
+
+logger = logging.getLogger(__name__)
+
+# Samples taken from one tick before its profile is written and sampling
+# of it stops; bounds the cost of a tick that hangs
+MAX_SAMPLES = 2000
+
+# Frames kept per stack, innermost first
+MAX_DEPTH = 64
+
+
+def collapse_stack(frame) -> str:
+    """
+    Render a frame and its callers as one collapsed stack line prefix.
+
+    Args:
+        frame: Innermost frame
+
+    Returns:
+        Frames joined with ';', outermost first
+    """
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+class _Tick:
+    """A running tick and the stacks sampled from it."""
+
+    __slots__ = ('name', 'thread', 'start', 'end', 'budget', 'deadline', 'stacks',
+                 'samples', 'written')
+
+    def __init__(self, name: str, budget: float):
+        self.name = name
+        self.thread = threading.get_ident()
+        self.start = self.end = time.monotonic()
+        self.budget = budget
+        self.deadline = self.start + budget
+        self.stacks: Optional[Counter] = None
+        self.samples = 0
+        self.written = False
+
+
+class SlowTickProfiler:
+    """
+    Profiles ticks that run over their time budget.
+
+    Use tick() around each unit of work. Profiles go to profiler.dir as
+    slow-<tick>-<time>.folded, keeping the newest profiler.max_files.
+    """
+
+    def __init__(self, config, force: bool = False):
+        """
+        Initialize the profiler.
+
+        Args:
+            config: Configuration object
+            force: Profile even if profiler.enabled is off (--profile)
+        """
+        self.force = force
+        self._cond = threading.Condition()
+        self._active: List[_Tick] = []
+        self._finished: List[_Tick] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._stats = {'ticks': 0, 'slow': 0, 'samples': 0, 'cpu_seconds': 0.0}
+        self.apply_config(config)
+
+    def apply_config(self, config):
+        """
+        Apply profiler settings from a configuration.
+
+        Args:
+            config: Configuration object
+        """
+        self.enabled = self.force or bool(config.get('profiler', 'enabled', default=False))
+        self.budget = float(config.get('profiler', 'budget', default=2.0))
+        self.sample_interval = max(0.001, float(
+            config.get('profiler', 'sample_interval', default=0.01)))
+        self.dir = Path(config.get('profiler', 'dir', default='./profiles'))
+        self.max_files = int(config.get('profiler', 'max_files', default=50))
+        if self.enabled:
+            self.start()
+
+    def start(self):
+        """Start the watchdog thread, if it is not running."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._watch, name='tick-profiler',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop the watchdog after writing finished profiles.
+
+        Args:
+            timeout: Seconds to wait (None waits until done)
+        """
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify()
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    @contextmanager
+    def tick(self, name: str, budget: Optional[float] = None) -> Iterator[None]:
+        """
+        Time the enclosed work as one tick.
+
+        Args:
+            name: Tick name used in logs and profile file names
+            budget: Seconds allowed before the tick is profiled
+                    (default: profiler.budget)
+        """
+        if not self.enabled:
+            yield
+            return
+
+        tick = _Tick(name, self.budget if budget is None else budget)
+        cond = self._cond
+        with cond:
+            # Wake the watchdog if it is sleeping towards a later deadline
+            pending = [t.deadline for t in self._active if not t.written]
+            self._active.append(tick)
+            if not pending or tick.deadline < min(pending):
+                cond.notify()
+        try:
+            yield
+        finally:
+            with cond:
+                self._active.remove(tick)
+                self._stats['ticks'] += 1
+                if tick.stacks is not None:
+                    tick.end = time.monotonic()
+                    self._finished.append(tick)
+                    cond.notify()
+
+    def _watch(self):
+        """Watchdog: sample overrunning ticks and write their profiles."""
+        cond = self._cond
+        current_frames = sys._current_frames
+        began = time.thread_time()
+
+        while True:
+            full = []
+            with cond:
+                finished, self._finished = self._finished, []
+                if self._stopping and not finished:
+                    break
+                now = time.monotonic()
+                due = [tick for tick in self._active
+                       if tick.deadline <= now and not tick.written]
+                if not due and not finished:
+                    pending = [tick.deadline for tick in self._active if not tick.written]
+                    cond.wait(min(pending) - now if pending else None)
+                    continue
+
+                # Sampled under the lock so a tick cannot end mid-sample
+                frames = current_frames()
+                for tick in due:
+                    frame = frames.get(tick.thread)
+                    if frame is None:
+                        continue
+                    if tick.stacks is None:
+                        tick.stacks = Counter()
+                        self._stats['slow'] += 1
+                    tick.stacks[collapse_stack(frame)] += 1
+                    tick.samples += 1
+                    self._stats['samples'] += 1
+                    if tick.samples >= MAX_SAMPLES:
+                        full.append(tick)
+                del frames
+
+            for tick in finished:
+                if not tick.written:
+                    self._write(tick, tick.end - tick.start)
+            for tick in full:
+                # Still running; write what we have and stop sampling it
+                self._write(tick, time.monotonic() - tick.start, complete=False)
+
+            self._stats['cpu_seconds'] = time.thread_time() - began
+            if due:
+                with cond:
+                    if not self._stopping:
+                        cond.wait(self.sample_interval)
+
+        # Ticks still running at shutdown keep what was sampled
+        with cond:
+            running = [tick for tick in self._active if tick.stacks and not tick.written]
+        for tick in running:
+            self._write(tick, time.monotonic() - tick.start, complete=False)
+        self._stats['cpu_seconds'] = time.thread_time() - began
+
+    def _write(self, tick: _Tick, elapsed: float, complete: bool = True):
+        """Write a tick's samples as collapsed stacks and rotate old profiles."""
+        tick.written = True
+        stacks = tick.stacks or {}
+        name = tick.name.replace('/', '_')
+        path = self.dir / (f'slow-{name}-'
+                           f'{format_timestamp().replace(":", "").replace("-", "")}.folded')
+        hottest = max(stacks, key=stacks.get, default='')
+
+        logger.warning(
+            "Tick %s %s %.2fs (budget %gs); %s samples%s written to %s; hottest: %s",
+            tick.name, 'took' if complete else 'still running after', elapsed, tick.budget,
+            tick.samples, '' if complete else ' so far', path,
+            hottest.rsplit(';', 1)[-1] or 'none'
+        )
+
+        try:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w') as f:
+                for stack, count in sorted(stacks.items()):
+                    f.write(f'{tick.name};{stack} {count}\n')
+        except OSError as e:
+            logger.error("Failed to write tick profile %s: %s", path, e)
+            return
+
+        kept = sorted(self.dir.glob('slow-*.folded'), key=lambda p: p.stat().st_mtime)
+        for old in kept[:max(0, len(kept) - self.max_files)]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Get profiler counters.
+
+        Returns:
+            Ticks timed, slow ticks, stack samples taken and the watchdog's
+            own CPU seconds
+        """
+        return dict(self._stats)
@@ -0,0 +1,133 @@
+"""
+Unit tests for system data backends and synthetic snapshots.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import psutil
+import pytest
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from backends import ProcfsBackend, record_snapshot
+from metrics_collector import MetricsCollector
+from synthetic import START_TIME, generate_host
+
+
+class MockConfig:
+    """Mock configuration with every metric family enabled."""
+
+    hostname = 'test-host'
+
+    def is_metric_enabled(self, metric_type: str) -> bool:
+        return True
+
+    def get(self, *keys, default=None):
+        return default
+
+
+@pytest.fixture
+def host(tmp_path):
+    """Synthetic host with 8 cores, 3 NICs, 4 disks and 500 sockets."""
+    return generate_host(tmp_path / 'host', cores=8, interfaces=3, disks=4, sockets=500,
+                         frames=3, interval=5.0)
+
+
+class TestProcfsBackend:
+    """Tests for replaying snapshots."""
+
+    def test_frames_advance(self, host):
+        """Test that replay walks the frames in order and stops at the last."""
+        backend = ProcfsBackend(host)
+
+        assert backend.frame_count == 3
+        assert backend.time() == START_TIME
+        assert backend.advance() and backend.advance()
+        assert backend.time() == START_TIME + 10
+        assert not backend.advance()
+
+    def test_empty_snapshot_rejected(self, tmp_path):
+        """Test that a directory without frames is refused."""
+        with pytest.raises(ValueError):
+            ProcfsBackend(tmp_path)
+
+    def test_host_shape(self, host):
+        """Test that counts follow the synthetic host's size."""
+        backend = ProcfsBackend(host)
+
+        assert backend.cpu_count() == 8
+        assert backend.cpu_count(logical=False) == 4
+        assert [p.mountpoint for p in backend.disk_partitions()] == \
+            ['/', '/data1', '/data2', '/data3']
+        assert len(backend.disk_partitions(all=True)) == 7
+        assert list(backend.net_io_counters(pernic=True)) == ['lo', 'eth0', 'eth1', 'eth2']
+
+        connections = backend.net_connections()
+        assert sum(1 for conn in connections if conn.type == 1) == 500
+        assert sum(1 for conn in connections if conn.type == 2) == 50
+        assert sum(1 for conn in connections if conn.status == 'LISTEN') == 50
+
+    def test_disk_usage_matches_statvfs(self, host):
+        """Test that usage is derived from statvfs the way psutil does."""
+        backend = ProcfsBackend(host)
+        st = backend.statvfs('/')
+        usage = backend.disk_usage('/')
+
+        assert usage.total == st.f_blocks * st.f_frsize
+        assert usage.free == st.f_bavail * st.f_frsize
+        assert usage.percent == round(usage.used / (usage.used + usage.free) * 100, 1)
+        with pytest.raises(OSError):
+            backend.statvfs('/missing')
+
+
+class TestReplayCollection:
+    """Tests for MetricsCollector on a replay backend."""
+
+    def collect(self, snapshot):
+        backend = ProcfsBackend(snapshot)
+        collector = MetricsCollector(MockConfig(), backend)
+        samples = [collector.collect_all()]
+        while backend.advance():
+            samples.append(collector.collect_all())
+        return samples
+
+    def test_rates_from_second_frame(self, host):
+        """Test that rates appear once a previous frame exists."""
+        first, second, _ = self.collect(host)
+
+        assert first['timestamp'] == '2026-01-01T00:00:00.000000Z'
+        assert first['metrics']['disk']['io'] == {}
+        assert 'io_rate' not in first['metrics']['network']['interfaces'][1]
+
+        assert second['metrics']['disk']['io']['read']['bytes'] > 0
+        assert second['metrics']['network']['interfaces'][1]['io_rate']['bytes_sent'] > 0
+        assert second['metrics']['network']['connections']['tcp'] == 500
+
+    def test_deterministic(self, tmp_path):
+        """Test that the same seed replays to identical samples."""
+        samples = [
+            self.collect(generate_host(tmp_path / str(run), cores=4, sockets=20, seed=7))
+            for run in range(2)
+        ]
+
+        assert json.dumps(samples[0]) == json.dumps(samples[1])
+
+    @pytest.mark.skipif(not sys.platform.startswith('linux'), reason='reads /proc')
+    def test_recorded_host_matches_psutil(self, tmp_path):
+        """Test that a snapshot of this host replays to what psutil reports."""
+        record_snapshot(tmp_path, frames=2, interval=0.05)
+        backend = ProcfsBackend(tmp_path)
+        backend.advance()
+
+        assert backend.virtual_memory().total == psutil.virtual_memory().total
+        assert backend.cpu_count() == psutil.cpu_count()
+        assert [p.mountpoint for p in backend.disk_partitions()] == \
+            [p.mountpoint for p in psutil.disk_partitions()]
+        assert set(backend.net_io_counters(pernic=True)) == \
+            set(psutil.net_io_counters(pernic=True))
+
+        sample = MetricsCollector(MockConfig(), backend).collect_all()
+        assert set(sample['metrics']) == {'cpu', 'memory', 'disk', 'network'}
@@ -0,0 +1,136 @@
+"""
+Unit tests for the compressed buffer store.
+"""
+
+import json
+import pytest
+import sys
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from buffer_store import BufferStore
+
+
+def make_record(index):
+    """Build an encoded sample record."""
+    return json.dumps({
+        'timestamp': f'2026-01-01T00:00:{index:02d}.000000Z',
+        'hostname': 'test-host',
+        'metrics': {'cpu': {'usage': {'total': index * 1.5, 'user': 1.0}}},
+    }, separators=(',', ':')).encode('utf-8')
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Create a store with small segments."""
+    return BufferStore(tmp_path, max_size=1024 * 1024, segment_size=512)
+
+
+class TestBufferStore:
+    """Tests for BufferStore class."""
+
+    def test_append_and_replay(self, store):
+        """Test that records come back in order and are removed once sent."""
+        records = [make_record(i) for i in range(50)]
+        for record in records:
+            store.append(record)
+
+        assert store.record_count == 50
+        assert store.segment_count > 1
+
+        sent = []
+        assert store.replay(lambda batch: sent.extend(batch) or True) == 50
+        assert sent == records
+        assert store.record_count == 0
+        assert store.segment_count == 0
+
+    def test_compressed_size(self, store):
+        """Test that size is accounted in compressed bytes."""
+        records = [make_record(i % 60) for i in range(200)]
+        for record in records:
+            store.append(record)
+
+        raw_size = sum(len(record) + 1 for record in records)
+        assert store.size * 5 < raw_size
+
+    def test_partial_replay_resumes(self, store, tmp_path):
+        """Test that a failed replay resumes after the last delivered record."""
+        records = [make_record(i) for i in range(30)]
+        for record in records:
+            store.append(record)
+
+        sent = []
+
+        def send_ten(batch):
+            if len(sent) == 10:
+                return False
+            sent.extend(batch)
+            return True
+
+        assert store.replay(send_ten, batch_size=5) == 10
+        store.close()
+
+        reopened = BufferStore(tmp_path, max_size=1024 * 1024, segment_size=512)
+        assert reopened.record_count == 20
+        assert list(reopened.iter_records()) == records[10:]
+
+    def test_unsealed_segment_recovered(self, tmp_path):
+        """Test that records of a segment left open by a crash are readable."""
+        store = BufferStore(tmp_path, max_size=1024 * 1024)
+        records = [make_record(i) for i in range(5)]
+        for record in records:
+            store.append(record)
+        # Simulate a crash: no close(), segment never sealed
+
+        reopened = BufferStore(tmp_path, max_size=1024 * 1024)
+        assert list(reopened.iter_records()) == records
+
+    def test_compact(self, store):
+        """Test rewriting old segments through a transform."""
+        for i in range(50):
+            store.append(make_record(i))
+        before = store.record_count
+
+        freed = store.compact(lambda records: records[::2], fraction=1.0)
+
+        assert freed > 0
+        assert store.record_count < before
+
+    def test_drop_oldest(self, store):
+        """Test dropping the oldest segment."""
+        for i in range(50):
+            store.append(make_record(i))
+        first = next(store.iter_records())
+
+        assert store.drop_oldest() > 0
+        assert next(store.iter_records()) != first
+
+    def test_replay_batches_within_segments(self, store):
+        """Test that replay sends up to batch_size records from one segment."""
+        for i in range(50):
+            store.append(make_record(i))
+        segment_records = [segment.records for segment in store._segments]
+
+        batches = []
+        assert store.replay(lambda batch: batches.append(batch) or True, batch_size=4) == 50
+
+        assert all(len(batch) <= 4 for batch in batches)
+        expected = sum(-(-count // 4) for count in segment_records)
+        assert len(batches) == expected
+
+    def test_replay_stops_when_store_changes(self, store):
+        """Test that a drop during a request ends replay without acking."""
+        for i in range(50):
+            store.append(make_record(i))
+        dropped = []
+
+        def send(batch):
+            if not dropped:
+                dropped.append(store.drop_oldest())
+            return True
+
+        assert store.replay(send, batch_size=5) == 0
+        assert store.record_count == 50 - dropped[0]
+        assert next(store.iter_records()) != make_record(0)
@@ -0,0 +1,175 @@
+"""
+Unit tests for burst capture.
+"""
+
+import gzip
+import json
+import pytest
+import sys
+import time
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+import burst
+from burst import BurstCapture, BurstRing
+
+
+class MockConfig:
+    """Mock configuration with burst settings."""
+
+    def __init__(self, tmp_path, **burst_settings):
+        self.hostname = 'test-host'
+        self._burst = {'interval': 0.02, 'duration': 0.3, 'dir': tmp_path / 'burst'}
+        self._burst.update(burst_settings)
+
+    def get(self, *keys, default=None):
+        if keys[0] == 'burst' and len(keys) == 2:
+            return self._burst.get(keys[1], default)
+        return default
+
+
+class MockSender:
+    """Sender recording uploaded captures; can be switched off."""
+
+    def __init__(self):
+        self.up = True
+        self.uploads = []
+
+    def upload_capture(self, name, data):
+        if not self.up:
+            return ['primary']
+        self.uploads.append((name, json.loads(gzip.decompress(data))))
+        return []
+
+
+def wait_idle(capture, timeout=5.0):
+    """Wait until a capture has finished and been uploaded."""
+    deadline = time.monotonic() + timeout
+    while capture.active or (capture._thread is not None and capture._thread.is_alive()):
+        assert time.monotonic() < deadline, "capture did not finish"
+        time.sleep(0.01)
+
+
+class TestBurstRing:
+    """Tests for BurstRing class."""
+
+    def test_columns_in_order(self):
+        """Test that rows come back as columns, oldest first."""
+        ring = BurstRing(capacity=4, width=2)
+        for index in range(3):
+            ring.append((index, index * 10))
+
+        assert ring.columns() == [[0.0, 1.0, 2.0], [0.0, 10.0, 20.0]]
+        assert ring.dropped == 0
+
+    def test_wraps_around(self):
+        """Test that the oldest rows are overwritten once the ring is full."""
+        ring = BurstRing(capacity=3, width=1)
+        for index in range(5):
+            ring.append((index,))
+
+        assert ring.columns() == [[2.0, 3.0, 4.0]]
+        assert ring.dropped == 2
+
+        ring.clear()
+        assert ring.columns() == [[]]
+
+
+class TestBurstCapture:
+    """Tests for BurstCapture class."""
+
+    def test_capture_uploaded_as_one_document(self, tmp_path):
+        """Test that a capture samples at the burst interval and is uploaded once."""
+        sender = MockSender()
+        capture = BurstCapture(MockConfig(tmp_path), sender)
+
+        assert capture.start(trigger='signal')
+        wait_idle(capture)
+
+        assert len(sender.uploads) == 1
+        name, document = sender.uploads[0]
+        assert name.startswith('burst-') and name.endswith('.json.gz')
+        assert document['trigger'] == 'signal'
+        assert document['columns'][:5] == ['timestamp', 'cpu.user', 'cpu.system', 'cpu.idle',
+                                           'cpu.iowait']
+        assert len(document['values']) == len(document['columns'])
+        rows = len(document['values'][0])
+        # 0.3s at 20ms; allow for a loaded test machine
+        assert 5 <= rows <= 17
+        assert document['values'][0] == sorted(document['values'][0])
+        assert document['overhead']['cpu_seconds'] >= 0
+        # Uploaded captures are not kept
+        assert not list((tmp_path / 'burst').glob('*.json.gz'))
+
+    def test_trigger_extends_running_capture(self, tmp_path):
+        """Test that a second trigger extends instead of starting a new capture."""
+        sender = MockSender()
+        capture = BurstCapture(MockConfig(tmp_path), sender)
+
+        assert capture.start(0.2)
+        assert not capture.start(0.5)
+        wait_idle(capture)
+
+        assert len(sender.uploads) == 1
+        document = sender.uploads[0][1]
+        timestamps = document['values'][0]
+        # The ring holds burst.duration worth of rows; extending past that
+        # keeps the newest ones
+        assert len(timestamps) + document['dropped_rows'] >= 18
+        assert document['dropped_rows'] > 0
+
+    def test_stop_ends_capture_early(self, tmp_path):
+        """Test that stop() uploads what was captured so far."""
+        sender = MockSender()
+        capture = BurstCapture(MockConfig(tmp_path, duration=60), sender)
+
+        capture.start()
+        time.sleep(0.1)
+        capture.stop(timeout=5)
+
+        assert not capture.active
+        assert len(sender.uploads) == 1
+
+    def test_failed_upload_kept_on_disk(self, tmp_path):
+        """Test that a capture no sink accepted stays in the burst directory."""
+        sender = MockSender()
+        sender.up = False
+        capture = BurstCapture(MockConfig(tmp_path, duration=0.1), sender)
+
+        capture.start()
+        wait_idle(capture)
+
+        kept = list((tmp_path / 'burst').glob('burst-*.json.gz'))
+        assert len(kept) == 1
+        assert json.loads(gzip.decompress(kept[0].read_bytes()))['type'] == 'burst'
+
+    def test_overhead_cap_raises_interval(self, tmp_path, monkeypatch):
+        """Test that a capture over its CPU budget backs off, then ends early."""
+        def expensive_probe():
+            end = time.thread_time() + 0.005
+            while time.thread_time() < end:
+                pass
+            return (1.0,)
+
+        monkeypatch.setattr(burst, 'PROBES', {'cpu': (('cpu.spin',), expensive_probe)})
+        monkeypatch.setattr(burst, 'MAX_INTERVAL', 0.08)
+        monkeypatch.setattr(burst, 'OVERHEAD_WINDOW', 0.1)
+        sender = MockSender()
+        capture = BurstCapture(MockConfig(tmp_path, interval=0.01, duration=3,
+                                          max_overhead=1), sender)
+
+        capture.start()
+        wait_idle(capture)
+
+        overhead = sender.uploads[0][1]['overhead']
+        assert overhead['throttled'] >= 3
+        assert overhead['max_interval'] == pytest.approx(0.08)
+        assert overhead['over_budget']
+
+    def test_unknown_family_ignored(self, tmp_path):
+        """Test that unknown families are left out of the columns."""
+        capture = BurstCapture(MockConfig(tmp_path, families=['memory', 'gpu']), MockSender())
+
+        assert capture._columns == ('timestamp', 'memory.used', 'memory.available')
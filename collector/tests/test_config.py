@@ -0,0 +1,200 @@
+"""
+Unit tests for the configuration loader.
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from config import Config
+
+
+CONFIG_TEMPLATE = """
+collector:
+  interval: {interval}
+  server_url: http://localhost:8000
+  hostname: test-host
+  buffer_dir: {buffer_dir}
+metrics:
+  cpu:
+    enabled: true
+  disk:
+    enabled: false
+    exclude_filesystems: [tmpfs]
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    """Write a minimal configuration file."""
+    path = tmp_path / 'collector-config.yaml'
+    path.write_text(CONFIG_TEMPLATE.format(interval=5, buffer_dir=tmp_path / 'buffer'))
+    return path
+
+
+class TestConfig:
+    """Tests for Config class."""
+
+    def test_snapshot_fields(self, config_file):
+        """Test typed fields resolved at load time."""
+        config = Config(str(config_file))
+
+        assert config.collector_interval == 5
+        assert config.hostname == 'test-host'
+        assert config.is_metric_enabled('cpu')
+        assert not config.is_metric_enabled('disk')
+        assert not config.is_metric_enabled('network')
+        assert config.get_metric_interval('cpu') == 5
+
+    def test_get(self, config_file):
+        """Test nested lookups against the flattened snapshot."""
+        config = Config(str(config_file))
+
+        assert config.get('collector', 'interval') == 5
+        assert config.get('metrics', 'disk', 'exclude_filesystems') == ('tmpfs',)
+        assert config.get('metrics', 'cpu')['enabled'] is True
+        assert config.get('metrics', 'missing', 'enabled', default=False) is False
+
+    def test_snapshot_is_immutable(self, config_file):
+        """Test that the loaded configuration cannot be modified."""
+        config = Config(str(config_file))
+
+        with pytest.raises(TypeError):
+            config.config['collector']['interval'] = 1
+        with pytest.raises(AttributeError):
+            config.snapshot.collector_interval = 1
+
+    def test_reload(self, config_file, tmp_path):
+        """Test that reload swaps in the new configuration."""
+        config = Config(str(config_file))
+        old_snapshot = config.snapshot
+
+        config_file.write_text(CONFIG_TEMPLATE.format(interval=10, buffer_dir=tmp_path))
+        config.reload()
+
+        assert config.collector_interval == 10
+        assert old_snapshot.collector_interval == 5
+
+    def test_invalid_reload_keeps_snapshot(self, config_file):
+        """Test that an invalid file leaves the active snapshot in place."""
+        config = Config(str(config_file))
+        snapshot = config.snapshot
+
+        config_file.write_text("collector:\n  interval: -1\n  server_url: x\n")
+        with pytest.raises(ValueError):
+            config.reload()
+
+        assert config.snapshot is snapshot
+        assert config.collector_interval == 5
+
+    def test_default_sink(self, config_file, tmp_path):
+        """Test that server_url becomes a single sink using the buffer dir."""
+        config = Config(str(config_file))
+
+        assert len(config.sinks) == 1
+        sink = config.sinks[0]
+        assert sink['name'] == 'default'
+        assert sink['url'] == 'http://localhost:8000'
+        assert sink['buffer_dir'] == tmp_path / 'buffer'
+
+    def test_sinks(self, config_file, tmp_path):
+        """Test explicit sinks get per-sink buffer directories."""
+        config_file.write_text(CONFIG_TEMPLATE.format(interval=5, buffer_dir=tmp_path) + """
+sinks:
+  - name: primary
+    url: http://ingest:8000
+    batch_size: 20
+  - name: forensics
+    type: file
+    path: /var/log/metrics.jsonl
+""")
+        config = Config(str(config_file))
+
+        primary, forensics = config.sinks
+        assert primary['type'] == 'http'
+        assert primary['batch_size'] == 20
+        assert primary['buffer_dir'] == tmp_path / 'primary'
+        assert forensics['batch_size'] == 1
+        assert forensics['window'] == 1
+        assert forensics['buffer_dir'] == tmp_path / 'forensics'
+
+    @pytest.mark.parametrize('sinks', [
+        "  - {name: a, url: x}\n  - {name: a, url: y}\n",
+        "  - {name: a, type: ftp}\n",
+        "  - {name: a, type: file}\n",
+        "  - {url: x}\n",
+        "  - {name: a, url: x, batch_size: 0}\n",
+        "  - {name: a, url: x, window: 0}\n",
+    ])
+    def test_invalid_sinks(self, config_file, tmp_path, sinks):
+        """Test that malformed sink definitions are rejected."""
+        config_file.write_text(CONFIG_TEMPLATE.format(interval=5, buffer_dir=tmp_path)
+                               + "sinks:\n" + sinks)
+        with pytest.raises(ValueError):
+            Config(str(config_file))
+
+    @pytest.mark.parametrize('cpu', ['per_cpu_mode: sparse', 'top_cores: -1',
+                                     'top_cores: many'])
+    def test_invalid_per_cpu_settings(self, config_file, tmp_path, cpu):
+        """Test that unknown per-core modes and bad top-core counts are rejected."""
+        config_file.write_text(CONFIG_TEMPLATE.format(interval=5, buffer_dir=tmp_path)
+                               .replace('  cpu:\n', f'  cpu:\n    {cpu}\n'))
+        with pytest.raises(ValueError):
+            Config(str(config_file))
+
+    @pytest.mark.parametrize('budget', ['0', '-2', 'fast'])
+    def test_invalid_profiler_budget(self, config_file, tmp_path, budget):
+        """Test that a non-positive or non-numeric tick budget is rejected."""
+        config_file.write_text(CONFIG_TEMPLATE.format(interval=5, buffer_dir=tmp_path)
+                               + f"profiler:\n  budget: {budget}\n")
+        with pytest.raises(ValueError):
+            Config(str(config_file))
+
+    @pytest.mark.parametrize('max_files', ['0', '-1', '2.5'])
+    def test_invalid_profiler_max_files(self, config_file, tmp_path, max_files):
+        """Test that keeping fewer than one profile is rejected."""
+        config_file.write_text(CONFIG_TEMPLATE.format(interval=5, buffer_dir=tmp_path)
+                               + f"profiler:\n  max_files: {max_files}\n")
+        with pytest.raises(ValueError):
+            Config(str(config_file))
+
+    @pytest.mark.parametrize('jitter', ['-1', 'soon', 'true'])
+    def test_invalid_jitter(self, config_file, tmp_path, jitter):
+        """Test that a negative or non-numeric jitter is rejected."""
+        config_file.write_text(CONFIG_TEMPLATE.format(interval=5, buffer_dir=tmp_path)
+                               .replace('  hostname: test-host\n',
+                                        f'  hostname: test-host\n  jitter: {jitter}\n'))
+        with pytest.raises(ValueError):
+            Config(str(config_file))
+
+    @pytest.mark.parametrize('network', ['groups: [veth]', 'groups: {veth: []}',
+                                         'groups: {veth: [1]}', 'max_interfaces: -1',
+                                         'state_ttl: 0', 'state_ttl: never'])
+    def test_invalid_network_settings(self, config_file, tmp_path, network):
+        """Test that malformed interface groups, caps and state TTLs are rejected."""
+        config_file.write_text(CONFIG_TEMPLATE.format(interval=5, buffer_dir=tmp_path)
+                               + f"  network:\n    {network}\n")
+        with pytest.raises(ValueError):
+            Config(str(config_file))
+
+    @pytest.mark.parametrize('shared', ['max_cores: 0', 'max_partitions: -1',
+                                        'max_interfaces: many'])
+    def test_invalid_shared_memory_capacity(self, config_file, tmp_path, shared):
+        """Test that non-positive shared-memory capacities are rejected."""
+        config_file.write_text(CONFIG_TEMPLATE.format(interval=5, buffer_dir=tmp_path)
+                               + f"shared_memory:\n  {shared}\n")
+        with pytest.raises(ValueError):
+            Config(str(config_file))
+
+    def test_network_groups(self, config_file, tmp_path):
+        """Test that a group may be given as one pattern or a list of them."""
+        config_file.write_text(CONFIG_TEMPLATE.format(interval=5, buffer_dir=tmp_path)
+                               + "  network:\n    groups: {veth: 'veth*', calico: [cali*, tunl*]}\n")
+
+        config = Config(str(config_file))
+
+        assert dict(config.get('metrics', 'network', 'groups')) == {
+            'veth': 'veth*', 'calico': ('cali*', 'tunl*')}
@@ -0,0 +1,185 @@
+"""
+Unit tests for the per-core CPU engine.
+"""
+
+import json
+import sys
+from array import array
+from pathlib import Path
+
+import pytest
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from backends import ProcfsBackend, parse_cpu_stat
+from cpu_engine import CORE_MODES, CpuUsage, PerCoreEngine, summarize
+from metrics_collector import MetricsCollector
+from sample_model import CpuMetrics
+from synthetic import generate_host
+
+
+def core_times(*cores):
+    """Flat core-major times from per-core (user, system, idle, iowait, steal) tuples."""
+    flat = array('d')
+    for user, system, idle, iowait, steal in cores:
+        flat.extend((user, 0, system, idle, iowait, 0, 0, steal))
+    return flat
+
+
+def system_times(cores):
+    return tuple(sum(cores[mode::8]) for mode in range(8))
+
+
+class MockConfig:
+    """Mock configuration with CPU metrics in a given per-core mode."""
+
+    hostname = 'test-host'
+
+    def __init__(self, mode='usage', top_cores=2):
+        self._cpu = {'per_cpu': True, 'per_cpu_mode': mode, 'top_cores': top_cores}
+
+    def is_metric_enabled(self, metric_type: str) -> bool:
+        return metric_type == 'cpu'
+
+    def get(self, *keys, default=None):
+        if keys[:2] == ('metrics', 'cpu') and len(keys) == 3:
+            return self._cpu.get(keys[2], default)
+        return default
+
+
+class TestPerCoreEngine:
+    """Tests for PerCoreEngine class."""
+
+    def test_percentages_from_deltas(self):
+        """Test per-core usage and modes from the difference of two reads."""
+        engine = PerCoreEngine()
+        before = core_times((100, 100, 100, 0, 0), (100, 100, 100, 0, 0))
+        after = core_times((150, 125, 125, 0, 0), (100, 110, 160, 20, 10))
+
+        assert engine.update(system_times(before), before) is None
+        usage = engine.update(system_times(after), after)
+
+        assert list(usage.cores) == [75.0, 20.0]
+        user, nice, system, idle, iowait, irq, softirq, steal = usage.core_modes
+        assert list(user) == [50.0, 0.0]
+        assert list(iowait) == [0.0, 20.0]
+        assert list(steal) == [0.0, 10.0]
+        # 95 of 200 ticks busy across both cores
+        assert usage.total == 47.5
+        assert usage.modes[4] == 10.0
+
+    def test_core_count_change_restarts(self):
+        """Test that a read with a different number of cores is only stored."""
+        engine = PerCoreEngine()
+        two = core_times((1, 1, 1, 0, 0), (1, 1, 1, 0, 0))
+        three = core_times((2, 2, 2, 0, 0), (2, 2, 2, 0, 0), (2, 2, 2, 0, 0))
+
+        engine.update(system_times(two), two)
+
+        assert engine.update(system_times(three), three) is None
+        assert engine.update(system_times(three), three) is not None
+
+    def test_parse_cpu_stat(self):
+        """Test that /proc/stat cpu lines become one flat core-major array."""
+        total, cores = parse_cpu_stat(
+            'cpu  10 1 5 100 2 0 1 0 0 0\n'
+            'cpu0 6 1 3 50 1 0 1 0 0 0\n'
+            'cpu1 4 0 2 50 1 0 0 0\n'
+            'intr 12345\n'
+        )
+
+        assert total == (10, 1, 5, 100, 2, 0, 1, 0)
+        assert list(cores) == [6, 1, 3, 50, 1, 0, 1, 0, 4, 0, 2, 50, 1, 0, 0, 0]
+
+
+class TestSummarize:
+    """Tests for summarize function."""
+
+    def make_usage(self, values):
+        columns = tuple(array('d', [0.0] * len(values)) for _ in range(8))
+        return CpuUsage(0.0, (0.0,) * 8, array('d', values), columns)
+
+    def test_statistics(self):
+        """Test quantiles, histogram and hottest cores."""
+        stats, histogram, top, modes = summarize(
+            self.make_usage([float(value) for value in range(100)]), top=3)
+
+        assert stats == (0.0, 49.0, 89.0, 98.0, 99.0, 49.5)
+        assert histogram == (10,) * 10
+        assert top == ((99, 99.0), (98, 98.0), (97, 97.0))
+        assert len(modes) == len(CORE_MODES)
+
+    def test_size_independent_of_core_count(self):
+        """Test that a summary of many cores encodes to about the same size as of few."""
+        def encoded(count):
+            metrics = CpuMetrics(50.0, 25.0, 20.0, 50.0, 5.0, count=count, physical_count=count)
+            metrics.summary = summarize(
+                self.make_usage([count * 7 % 1000 / 10 for count in range(count)]), top=5)
+            return len(json.dumps(metrics.to_dict()))
+
+        assert encoded(256) <= encoded(16) * 1.1
+
+
+class TestCollectorModes:
+    """Tests for per-core reporting modes in MetricsCollector."""
+
+    @pytest.fixture
+    def host(self, tmp_path):
+        return generate_host(tmp_path, cores=32, interfaces=1, disks=1, sockets=0)
+
+    def collect(self, host, mode):
+        backend = ProcfsBackend(host)
+        collector = MetricsCollector(MockConfig(mode), backend)
+        collector.collect_cpu_metrics()
+        backend.advance()
+        return collector.collect_cpu_metrics()
+
+    def test_usage_mode(self, host):
+        """Test that usage mode keeps the per-core usage list."""
+        cores = self.collect(host, 'usage')['cores']
+
+        assert list(cores) == ['usage', 'count', 'physical_count']
+        assert len(cores['usage']) == cores['count'] == 32
+        assert cores['physical_count'] == 16
+
+    def test_summary_mode(self, host):
+        """Test that summary mode reports fixed-size statistics instead of a list."""
+        cores = self.collect(host, 'summary')['cores']
+
+        assert 'usage' not in cores
+        summary = cores['summary']
+        assert sum(summary['histogram']) == 32
+        assert len(summary['top']) == 2
+        assert summary['top'][0]['usage'] == summary['usage']['max']
+        assert set(summary['modes']) == set(CORE_MODES)
+
+    def test_full_mode(self, host):
+        """Test that full mode adds every mode per core."""
+        cores = self.collect(host, 'full')['cores']
+
+        assert list(cores['modes']) == list(CORE_MODES)
+        assert all(len(values) == 32 for values in cores['modes'].values())
+        for core, usage in enumerate(cores['usage']):
+            busy = sum(cores['modes'][mode][core] for mode in CORE_MODES if mode != 'iowait')
+            assert busy == pytest.approx(usage, abs=1)
+
+    def test_round_trip(self, host):
+        """Test that every mode survives the compact sample model."""
+        for mode in ('usage', 'summary', 'full'):
+            metrics = json.loads(json.dumps(self.collect(host, mode)))
+            assert CpuMetrics.from_dict(metrics).to_dict() == metrics
+
+    def test_physical_count_cached(self, host):
+        """Test that the physical core count is looked up once, not every tick."""
+        backend = ProcfsBackend(host)
+        calls = []
+        count = backend.cpu_count
+        backend.cpu_count = lambda logical=True: calls.append(logical) or count(logical)
+        collector = MetricsCollector(MockConfig(), backend)
+
+        collector.collect_cpu_metrics()
+        backend.advance()
+        collector.collect_cpu_metrics()
+
+        assert calls == [False]
@@ -0,0 +1,190 @@
+"""
+Unit tests for the Prometheus-style exporter.
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from exporter import MetricsExporter
+
+
+class MockConfig:
+    """Mock configuration for testing."""
+
+    def get(self, *keys, default=None):
+        if keys == ('exporter', 'port'):
+            return 0
+        return default
+
+
+SAMPLE = {
+    'timestamp': '2026-01-01T00:00:00Z',
+    'hostname': 'test-host',
+    'metrics': {
+        'cpu': {
+            'usage': {'total': 12.5, 'user': 10.0, 'system': 2.5, 'idle': 87.5},
+            'cores': {'usage': [10.0, 15.0], 'count': 2, 'physical_count': 1},
+        },
+        'memory': {
+            'total': 1024, 'used': 512, 'available': 512, 'free': 256,
+            'usage': {'percent': 50.0},
+            'swap': {'total': 0, 'used': 0, 'free': 0, 'usage': {'percent': 0.0}},
+        },
+        'network': {
+            'interfaces': [{
+                'name': 'eth"0',
+                'io': {'bytes': {'sent': 1, 'recv': 2}, 'packets': {'sent': 3, 'recv': 4}},
+            }],
+            'connections': {'tcp': 7},
+        },
+    },
+}
+
+
+@pytest.fixture
+def exporter():
+    """Create an exporter instance."""
+    return MetricsExporter(MockConfig())
+
+
+class TestMetricsExporter:
+    """Tests for MetricsExporter class."""
+
+    def test_render_before_first_sample(self, exporter):
+        """Test that nothing is exposed before a sample arrives."""
+        assert exporter.render() == b''
+
+    def test_render(self, exporter):
+        """Test exposition output for a sample."""
+        exporter.update(SAMPLE)
+        text = exporter.render().decode('utf-8')
+
+        assert '# TYPE system_cpu_usage_percent gauge' in text
+        assert 'system_cpu_usage_percent{mode="user"} 10.0' in text
+        assert 'system_cpu_core_usage_percent{core="1"} 15.0' in text
+        assert 'system_memory_usage_percent 50.0' in text
+        assert 'system_network_bytes_total{interface="eth\\"0",direction="recv"} 2.0' in text
+        assert 'collector_sample_age_seconds{family="cpu"}' in text
+        assert text.count('# TYPE system_cpu_usage_percent') == 1
+
+    def test_render_core_summary(self, exporter):
+        """Test that a per-core summary is exposed as fixed-size series."""
+        sample = dict(SAMPLE, metrics=dict(SAMPLE['metrics'], cpu={
+            'usage': {'total': 12.5},
+            'cores': {'summary': {
+                'usage': {'min': 1.0, 'p50': 10.0, 'p90': 60.0, 'p99': 95.0, 'max': 99.0,
+                          'mean': 20.0},
+                'histogram': [100, 0, 0, 0, 0, 0, 0, 0, 0, 28],
+                'top': [{'core': 17, 'usage': 99.0}],
+                'modes': {'steal': {'mean': 0.5, 'max': 30.0}},
+            }, 'count': 128, 'physical_count': 64},
+        }))
+        exporter.update(sample)
+        text = exporter.render().decode('utf-8')
+
+        assert 'system_cpu_core_usage_summary_percent{stat="p99"} 95.0' in text
+        assert 'system_cpu_cores_by_usage{usage="90-100"} 28.0' in text
+        assert 'system_cpu_core_usage_percent{core="17"} 99.0' in text
+        assert 'system_cpu_core_mode_summary_percent{mode="steal",stat="max"} 30.0' in text
+        assert 'system_cpu_cores 128.0' in text
+
+    def test_render_interface_group(self, exporter):
+        """Test that a group series exposes its member count."""
+        sample = dict(SAMPLE, metrics=dict(SAMPLE['metrics'], network={
+            'interfaces': [{'name': 'veth', 'members': 1200,
+                            'io': {'bytes': {'sent': 10, 'recv': 20}}}],
+        }))
+        exporter.update(sample)
+        text = exporter.render().decode('utf-8')
+
+        assert 'system_network_bytes_total{interface="veth",direction="sent"} 10.0' in text
+        assert 'system_network_group_members{interface="veth"} 1200.0' in text
+
+    def test_metric_lines_contiguous(self, exporter):
+        """Test that each metric is one HELP/TYPE block across interfaces and partitions."""
+        partitions = [{'device': f'/dev/sd{name}', 'mountpoint': mountpoint, 'fstype': 'ext4',
+                       'usage': {'total': 100, 'used': 40, 'free': 60, 'percent': 40.0},
+                       'inode': {'total': 10, 'used': 1, 'free': 9}}
+                      for name, mountpoint in (('a', '/'), ('b', '/data'))]
+        interfaces = [{'name': name, 'io': {'bytes': {'sent': 1, 'recv': 2},
+                                            'packets': {'sent': 3, 'recv': 4}}}
+                      for name in ('eth0', 'eth1')]
+        exporter.update({'metrics': {'disk': {'partitions': partitions},
+                                     'network': {'interfaces': interfaces}}})
+        lines = exporter.render().decode('utf-8').splitlines()
+
+        names = [line.split()[2] if line.startswith('#') else line.split('{')[0].split()[0]
+                 for line in lines]
+        blocks = [name for index, name in enumerate(names)
+                  if index == 0 or names[index - 1] != name]
+        assert len(blocks) == len(set(blocks))
+        assert names.count('system_network_bytes_total') == 2 + 4
+        assert names.count('system_disk_bytes') == 2 + 6
+        for name in set(names):
+            first = names.index(name)
+            assert lines[first].startswith(f'# HELP {name} ')
+            assert lines[first + 1].startswith(f'# TYPE {name} ')
+
+    def test_body_cached_between_samples(self, exporter):
+        """Test that scrapes reuse the rendered body until a new sample arrives."""
+        exporter.update(SAMPLE)
+        body = exporter._state[0]
+        exporter.render()
+        assert exporter._state[0] is body
+
+        exporter.update({'metrics': {'memory': SAMPLE['metrics']['memory']}})
+        assert exporter._state[0] is not body
+        assert b'system_cpu_usage_percent' in exporter._state[0]
+
+    def test_http_scrape(self, exporter):
+        """Test serving the cached sample over HTTP."""
+        exporter.update(SAMPLE)
+
+        async def scrape(path):
+            await exporter.start()
+            server = asyncio.ensure_future(exporter.serve())
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', exporter.port)
+                writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode('ascii'))
+                response = await reader.read()
+                writer.close()
+                return response
+            finally:
+                server.cancel()
+                await asyncio.gather(server, return_exceptions=True)
+
+        response = asyncio.run(scrape('/metrics'))
+        assert response.startswith(b'HTTP/1.1 200 OK')
+        assert b'system_memory_bytes{type="total"} 1024.0' in response
+
+        response = asyncio.run(scrape('/other'))
+        assert response.startswith(b'HTTP/1.1 404')
+
+    def test_burst_request(self, exporter):
+        """Test that POST /burst calls the burst trigger."""
+        calls = []
+        exporter.burst_trigger = lambda duration, trigger: calls.append((duration, trigger)) or True
+
+        async def request(method, path):
+            await exporter.start()
+            server = asyncio.ensure_future(exporter.serve())
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', exporter.port)
+                writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode('ascii'))
+                response = await reader.read()
+                writer.close()
+                return response
+            finally:
+                server.cancel()
+                await asyncio.gather(server, return_exceptions=True)
+
+        assert asyncio.run(request('POST', '/burst?duration=90')).startswith(b'HTTP/1.1 202')
+        assert asyncio.run(request('POST', '/burst')).startswith(b'HTTP/1.1 202')
+        assert asyncio.run(request('GET', '/burst')).startswith(b'HTTP/1.1 405')
+        assert asyncio.run(request('POST', '/burst?duration=x')).startswith(b'HTTP/1.1 400')
+        assert calls == [(90.0, 'http'), (None, 'http')]
@@ -0,0 +1,197 @@
+"""
+Unit tests for the on-host history store.
+"""
+
+import pytest
+import sys
+import time
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+import history
+from history import HistoryStore, Tier, flatten_sample, series_file_size
+
+
+# Small tiers so ring wraparound is quick to exercise
+TIERS = (
+    Tier('5s', 5, 60),
+    Tier('1m', 60, 600),
+)
+
+START = 1767225600  # 2026-01-01T00:00:00Z
+
+
+def make_sample(timestamp, total, disk_percent=50.0):
+    """Build a sample at an epoch time."""
+    from datetime import datetime, timezone
+    iso = datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return {
+        'timestamp': iso,
+        'hostname': 'test-host',
+        'metrics': {
+            'cpu': {'usage': {'total': total}, 'cores': {'usage': [1.0, 2.0]}},
+            'disk': {'partitions': [{'mountpoint': '/', 'fstype': 'ext4',
+                                     'usage': {'percent': disk_percent}}]},
+            'network': {'interfaces': [{'name': 'eth0', 'io': {'bytes': {'sent': 10}},
+                                        'io_rate': {'bytes_sent': 5.0}}]},
+        },
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path, max_size=10 * 1024 * 1024, tiers=TIERS)
+    yield store
+    store.close()
+
+
+class TestFlattenSample:
+    """Tests for flatten_sample function."""
+
+    def test_series_names(self):
+        """Test naming of nested, keyed and positional fields."""
+        series = dict(flatten_sample(make_sample(START, 10.0)['metrics']))
+
+        assert series == {
+            'cpu.usage.total': 10.0,
+            'cpu.cores.usage.0': 1.0,
+            'cpu.cores.usage.1': 2.0,
+            'disk.partitions[/].usage.percent': 50.0,
+            'network.interfaces[eth0].io_rate.bytes_sent': 5.0,
+        }
+
+
+class TestHistoryStore:
+    """Tests for HistoryStore class."""
+
+    def test_raw_range_query(self, store):
+        """Test that the finest tier returns every stored slot in range."""
+        for i in range(10):
+            store.record(make_sample(START + i * 5, float(i)))
+
+        points = store.query('cpu.usage.total', START + 10, START + 30, TIERS[0])
+
+        assert [p.timestamp for p in points] == [START + 10, START + 15, START + 20,
+                                                 START + 25, START + 30]
+        assert [p.avg for p in points] == [2.0, 3.0, 4.0, 5.0, 6.0]
+
+    def test_rollup(self, store):
+        """Test that coarser tiers hold count/mean/min/max per slot."""
+        for i in range(24):
+            store.record(make_sample(START + i * 5, float(i)))
+
+        points = store.query('cpu.usage.total', START, START + 119, TIERS[1])
+
+        assert len(points) == 2
+        assert (points[0].count, points[0].avg, points[0].min, points[0].max) == (12, 5.5, 0.0, 11.0)
+        assert (points[1].count, points[1].min, points[1].max) == (12, 12.0, 23.0)
+
+        summary = store.aggregate('cpu.usage.total', START, START + 119, TIERS[1])
+        assert summary.count == 24
+        assert summary.avg == pytest.approx(11.5)
+
+    def test_ring_overwrites_old_data(self, store):
+        """Test that data older than the retention is replaced in place."""
+        for i in range(30):
+            store.record(make_sample(START + i * 5, float(i)))
+
+        points = store.query('cpu.usage.total', START, START + 145, TIERS[0])
+
+        # 12 slots of 5s; only the newest minute survives
+        assert len(points) == 12
+        assert points[0].avg == 18.0
+        assert points[-1].avg == 29.0
+
+    def test_series_cap(self, tmp_path):
+        """Test that new series are refused once the size limit is reached."""
+        store = HistoryStore(tmp_path, max_size=3 * series_file_size(TIERS), tiers=TIERS)
+        store.record(make_sample(START, 1.0))
+        store.close()
+
+        assert len(store.series()) == 3
+        total = sum(f.stat().st_size for f in tmp_path.rglob('*.ring'))
+        assert total <= 3 * series_file_size(TIERS)
+
+    @pytest.mark.skipif(not Path('/proc/self/fd').is_dir(), reason='needs /proc/self/fd')
+    def test_series_files_closed(self, tmp_path):
+        """Test that mapped series hold at most one descriptor per ring."""
+        store = HistoryStore(tmp_path, max_size=10 * 1024 * 1024, tiers=TIERS)
+        before = len(list(Path('/proc/self/fd').iterdir()))
+        try:
+            for index in range(50):
+                store.record({'timestamp': make_sample(START, 0.0)['timestamp'],
+                              'metrics': {'cpu': {'usage': {f'series{index}': 1.0}}}})
+            opened = len(list(Path('/proc/self/fd').iterdir())) - before
+        finally:
+            store.close()
+
+        assert store.series_count == 0
+        assert opened <= 50 * len(TIERS)
+
+    def test_least_recently_used_series_unmapped(self, tmp_path):
+        """Test that only max_open series stay mapped and evicted ones reopen."""
+        store = HistoryStore(tmp_path, max_size=10 * 1024 * 1024, tiers=TIERS, max_open=2)
+        try:
+            store.record(make_sample(START, 7.0))
+            assert store.series_count == 2
+            points = store.query('cpu.usage.total', START, START, TIERS[0])
+            assert [p.avg for p in points] == [7.0]
+        finally:
+            store.close()
+
+    def test_stale_series_pruned_while_running(self, tmp_path, monkeypatch):
+        """Test that series no longer written free their slots for new ones."""
+        now = [time.time()]
+        monkeypatch.setattr(history.time, 'time', lambda: now[0])
+        store = HistoryStore(tmp_path, max_size=2 * series_file_size(TIERS), tiers=TIERS)
+
+        def record(*names):
+            store.record({'timestamp': make_sample(START, 0.0)['timestamp'],
+                          'metrics': {'network': {'io_rate': {name: 1.0 for name in names}}}})
+
+        try:
+            record('veth1', 'veth2')
+            now[0] += 300
+            record('veth2', 'veth3')
+            # Full until the next check, so veth3 is refused
+            assert store.series() == ['network.io_rate.veth1', 'network.io_rate.veth2']
+
+            # Neither written within the longest retention (600s) by then
+            now[0] += history.PRUNE_INTERVAL - 300
+            record('veth3')
+            assert store.series() == ['network.io_rate.veth3']
+            assert not list(tmp_path.rglob('*veth1*')) and not list(tmp_path.rglob('*veth2*'))
+        finally:
+            store.close()
+
+    def test_open_does_not_change_file_limit(self, tmp_path):
+        """Test that opening a store leaves the process descriptor limit alone."""
+        resource = pytest.importorskip('resource')
+        before = resource.getrlimit(resource.RLIMIT_NOFILE)
+
+        HistoryStore(tmp_path, max_size=10 * 1024 * 1024, tiers=TIERS).close()
+        HistoryStore(tmp_path, max_size=0, tiers=TIERS, read_only=True).close()
+
+        assert resource.getrlimit(resource.RLIMIT_NOFILE) == before
+
+    def test_read_only_reopen(self, store, tmp_path):
+        """Test that a second read-only store sees the written data."""
+        store.record(make_sample(START, 42.0))
+        store.close()
+
+        reader = HistoryStore(tmp_path, max_size=0, tiers=TIERS, read_only=True)
+        try:
+            assert reader.match(['disk.*']) == ['disk.partitions[/].usage.percent']
+            points = reader.query('cpu.usage.total', START, START, TIERS[0])
+            assert [p.avg for p in points] == [42.0]
+            assert reader.query('missing', START, START, TIERS[0]) == []
+        finally:
+            reader.close()
+
+    def test_select_tier(self, store):
+        """Test that the finest tier covering the range start is chosen."""
+        assert store.select_tier(START - 30, now=START).name == '5s'
+        assert store.select_tier(START - 300, now=START).name == '1m'
+        assert store.select_tier(START - 3000, now=START).name == '1m'
@@ -0,0 +1,176 @@
+"""
+Unit tests for the per-interface network counter state.
+"""
+
+import math
+import sys
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from backends import ProcfsBackend, snetio
+from interface_tracker import OVERFLOW_GROUP, InterfaceTracker
+from metrics_collector import MetricsCollector
+from synthetic import generate_host
+
+
+def counters(sent, recv=0):
+    """Interface counters with the given byte counts and one packet per 100 bytes."""
+    return snetio(sent, recv, sent // 100, recv // 100, 0, 0, 0, 0)
+
+
+def series(metrics):
+    """Reported series as name -> (members, counters, rates)."""
+    result = {}
+    for i, name in enumerate(metrics.names):
+        members = metrics.members[i] if metrics.members is not None else 0
+        result[name] = (members, tuple(metrics.counters[i * 8:(i + 1) * 8]),
+                        tuple(metrics.rates[i * 4:(i + 1) * 4]))
+    return result
+
+
+class MockConfig:
+    """Mock configuration with network metrics only."""
+
+    hostname = 'test-host'
+
+    def __init__(self, **network):
+        self._network = network
+
+    def is_metric_enabled(self, metric_type: str) -> bool:
+        return metric_type == 'network'
+
+    def get(self, *keys, default=None):
+        if keys[:2] == ('metrics', 'network') and len(keys) == 3:
+            return self._network.get(keys[2], default)
+        return default
+
+
+class TestInterfaceTracker:
+    """Tests for InterfaceTracker class."""
+
+    def test_rates_between_reads(self):
+        """Test that rates are NaN on the first read and per second afterwards."""
+        tracker = InterfaceTracker()
+
+        first = series(tracker.update({'eth0': counters(1000, 500)}, 100.0))
+        second = series(tracker.update({'eth0': counters(2000, 1500)}, 105.0))
+
+        assert all(math.isnan(rate) for rate in first['eth0'][2])
+        assert second['eth0'][1][:2] == (2000, 1500)
+        assert second['eth0'][2] == (200.0, 200.0, 2.0, 2.0)
+
+    def test_new_interface_rated_from_zero(self):
+        """Test that an interface created since the last read gets a rate at once."""
+        tracker = InterfaceTracker()
+        tracker.update({'eth0': counters(1000)}, 100.0)
+
+        result = series(tracker.update({'eth0': counters(1000), 'eth1': counters(500)}, 105.0))
+
+        assert result['eth1'][2][0] == 100.0
+
+    def test_counter_reset(self):
+        """Test that an interface recreated under the same name is counted from zero."""
+        tracker = InterfaceTracker()
+        tracker.update({'eth0': counters(10**6)}, 100.0)
+
+        result = series(tracker.update({'eth0': counters(500)}, 105.0))
+
+        assert result['eth0'][2][0] == 100.0
+
+    def test_filtered_interfaces_not_tracked(self):
+        """Test that excluded interfaces get no series and no state."""
+        tracker = InterfaceTracker()
+        tracker.configure(exclude=['lo'])
+
+        metrics = tracker.update({'lo': counters(1), 'eth0': counters(1)}, 100.0)
+
+        assert metrics.names == ('eth0',)
+        assert tracker.tracked == 1
+
+    def test_groups(self):
+        """Test that grouped interfaces are reported as one monotonic series."""
+        tracker = InterfaceTracker()
+        tracker.configure(groups={'veth': ['veth*'], 'calico': 'cali*'})
+        tracker.update({'eth0': counters(100), 'veth1': counters(1000),
+                        'veth2': counters(2000), 'cali1': counters(10)}, 100.0)
+
+        # veth2 is deleted and veth3 created
+        result = series(tracker.update({'eth0': counters(100), 'veth1': counters(1500),
+                                        'veth3': counters(250), 'cali1': counters(10)}, 105.0))
+
+        assert list(result) == ['eth0', 'veth', 'calico']
+        members, totals, rates = result['veth']
+        assert members == 2
+        assert totals[0] == 3000 + 500 + 250
+        assert rates[0] == (500 + 250) / 5
+        assert result['eth0'][0] == 0
+        assert result['calico'][0] == 1
+
+    def test_overflow_group(self):
+        """Test that interfaces beyond the cap are summed and slots stay put."""
+        tracker = InterfaceTracker()
+        tracker.configure(max_interfaces=2)
+        tracker.update({'eth0': counters(1), 'eth1': counters(2), 'eth2': counters(4)}, 100.0)
+
+        # eth0 keeps its slot although a new interface is listed first
+        metrics = tracker.update({'eth3': counters(8), 'eth0': counters(1),
+                                  'eth1': counters(2), 'eth2': counters(4)}, 105.0)
+
+        result = series(metrics)
+        assert list(result) == ['eth0', 'eth1', OVERFLOW_GROUP]
+        assert result[OVERFLOW_GROUP][0] == 2
+        assert result[OVERFLOW_GROUP][1][0] == 4 + 8
+
+    def test_state_expires(self):
+        """Test that state of vanished interfaces is dropped after the TTL."""
+        tracker = InterfaceTracker()
+        tracker.configure(max_interfaces=1, state_ttl=10)
+        tracker.update({'eth0': counters(1)}, 100.0)
+
+        tracker.update({'eth1': counters(1)}, 105.0)
+        assert tracker.tracked == 2
+        assert series(tracker.update({'eth1': counters(1)}, 110.0)).keys() == {OVERFLOW_GROUP}
+
+        # eth0's slot is handed out once its state has expired
+        tracker.update({'eth1': counters(1)}, 115.0)
+        assert tracker.tracked == 1
+        assert tracker.update({'eth1': counters(1)}, 120.0).names == ('eth1',)
+
+    def test_regrouped_on_configure(self):
+        """Test that a reload moves tracked interfaces into new groups."""
+        tracker = InterfaceTracker()
+        tracker.update({'veth1': counters(1000)}, 100.0)
+
+        tracker.configure(groups={'veth': ['veth*']})
+        result = series(tracker.update({'veth1': counters(1500)}, 105.0))
+
+        assert result['veth'][0] == 1
+        assert result['veth'][2][0] == 100.0
+
+
+class TestNetworkChurn:
+    """Tests for network collection on a host with many short-lived interfaces."""
+
+    def test_series_bounded(self, tmp_path):
+        """Test that veth churn does not grow the reported series."""
+        generate_host(tmp_path, cores=2, interfaces=4, disks=1, sockets=0, frames=4,
+                      veths=500, churn=0.2)
+        backend = ProcfsBackend(tmp_path)
+        collector = MetricsCollector(MockConfig(groups={'veth': ['veth*']}, max_interfaces=3,
+                                                exclude_interfaces=['lo']), backend)
+
+        sizes = []
+        while True:
+            network = collector.collect_network_metrics()
+            sizes.append(len(network['interfaces']))
+            if not backend.advance():
+                break
+
+        assert sizes == [5, 5, 5, 5]
+        names = [interface['name'] for interface in network['interfaces']]
+        assert names == ['eth0', 'eth1', 'eth2', 'veth', OVERFLOW_GROUP]
+        veth = network['interfaces'][3]
+        assert veth['members'] == 500
+        assert veth['io_rate']['bytes_sent'] > 0
@@ -0,0 +1,178 @@
+"""
+Unit tests for priority-based load shedding.
+"""
+
+import sys
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from load_shedding import (
+    BackpressureMonitor, SHED_AGGREGATE, SHED_CRITICAL, SHED_DETAIL, SHED_NONE,
+    merge_samples, shed,
+)
+
+
+class MockConfig:
+    """Mock configuration using the defaults."""
+
+    def get(self, *keys, default=None):
+        return default
+
+
+def make_sample(timestamp, cpu_total, bytes_sent, cores=(10.0, 20.0)):
+    """Build a sample in the collector's output shape."""
+    return {
+        'timestamp': timestamp,
+        'hostname': 'test-host',
+        'metrics': {
+            'cpu': {
+                'usage': {'total': cpu_total},
+                'cores': {'usage': list(cores), 'count': len(cores)},
+            },
+            'network': {
+                'interfaces': [{
+                    'name': 'eth0',
+                    'io': {'bytes': {'sent': bytes_sent}, 'packets': {'sent': 1}},
+                }],
+                'connections': {'tcp': 3},
+            },
+        },
+    }
+
+
+class TestShed:
+    """Tests for the shed() function."""
+
+    def test_level_none_keeps_sample(self):
+        """Test that nothing is dropped without pressure."""
+        sample = make_sample('t0', 10.0, 100)
+        assert shed(sample, SHED_NONE) is sample
+
+    def test_detail_dropped_first(self):
+        """Test that low-priority detail goes before anything else."""
+        sample = make_sample('t0', 10.0, 100)
+        result = shed(sample, SHED_DETAIL)
+
+        assert 'cores' not in result['metrics']['cpu']
+        assert 'packets' not in result['metrics']['network']['interfaces'][0]['io']
+        assert result['metrics']['network']['connections'] == {'tcp': 3}
+        assert result['shed_level'] == SHED_DETAIL
+        # Input is left untouched
+        assert 'cores' in sample['metrics']['cpu']
+
+    def test_critical_keeps_key_signals(self):
+        """Test that only critical families survive the highest level."""
+        result = shed(make_sample('t0', 10.0, 100), SHED_CRITICAL)
+
+        assert list(result['metrics']) == ['cpu']
+        assert result['metrics']['cpu']['usage'] == {'total': 10.0}
+
+
+class TestMergeSamples:
+    """Tests for the merge_samples() function."""
+
+    def test_merge(self):
+        """Test weighted means for gauges and newest value for counters."""
+        merged = merge_samples([
+            make_sample('t0', 10.0, 100, cores=(0.0, 10.0)),
+            make_sample('t1', 30.0, 300, cores=(20.0, 30.0)),
+        ])
+
+        assert merged['timestamp'] == 't0'
+        assert merged['aggregate'] == {'count': 2, 'start': 't0', 'end': 't1'}
+        assert merged['metrics']['cpu']['usage']['total'] == 20.0
+        assert merged['metrics']['cpu']['cores']['usage'] == [10.0, 20.0]
+        assert merged['metrics']['network']['interfaces'][0]['io']['bytes']['sent'] == 300
+
+    def test_merge_keeps_counts(self):
+        """Test that core and group member counts stay whole numbers."""
+        samples = [make_sample(f't{index}', 0.0, index, cores=(0.0,) * cores)
+                   for index, cores in enumerate((4, 4, 6))]
+        for index, sample in enumerate(samples):
+            sample['metrics']['cpu']['cores']['physical_count'] = 2
+            sample['metrics']['network']['interfaces'][0]['members'] = 3 + index
+
+        merged = merge_samples(samples)
+
+        cores = merged['metrics']['cpu']['cores']
+        assert cores['count'] == 6 and isinstance(cores['count'], int)
+        assert cores['physical_count'] == 2 and isinstance(cores['physical_count'], int)
+        assert merged['metrics']['network']['interfaces'][0]['members'] == 5
+
+    def test_merge_aggregates_by_weight(self):
+        """Test that merging an aggregate again weights by sample count."""
+        first = merge_samples([make_sample('t0', 0.0, 1), make_sample('t1', 0.0, 2),
+                               make_sample('t2', 0.0, 3)])
+        merged = merge_samples([first, make_sample('t3', 40.0, 4)])
+
+        assert merged['aggregate'] == {'count': 4, 'start': 't0', 'end': 't3'}
+        assert merged['metrics']['cpu']['usage']['total'] == 10.0
+
+    def test_merge_keeps_first_slot(self):
+        """Test that an aggregate of aligned samples is keyed by its first slot."""
+        first = dict(make_sample('t0', 0.0, 1), slot='s0')
+        second = dict(make_sample('t1', 0.0, 2), slot='s1')
+
+        assert merge_samples([first, second])['slot'] == 's0'
+        assert 'slot' not in merge_samples([make_sample('t0', 0.0, 1), make_sample('t1', 0.0, 2)])
+
+    def test_merge_keeps_sequence_numbers(self):
+        """Test that an aggregate lists the sequence numbers of the samples it merges."""
+        samples = [dict(make_sample(f't{seq}', 0.0, seq), session='a', seq=seq)
+                   for seq in (4, 6, 9)]
+
+        merged = merge_samples([merge_samples(samples[:2]), samples[2]])
+
+        assert (merged['session'], merged['seq']) == ('a', 4)
+        assert merged['aggregate']['seqs'] == [4, 6, 9]
+        # Numbers from different sessions cannot be deduplicated
+        restarted = dict(samples[2], session='b', seq=1)
+        assert 'seq' not in merge_samples([samples[0], restarted])
+
+    def test_merge_hottest_cores_by_core(self):
+        """Test that hottest-core lists of summaries are matched by core, not position."""
+        samples = []
+        for timestamp, top in (('t0', [(3, 90.0), (1, 50.0)]), ('t1', [(1, 70.0), (3, 80.0)])):
+            sample = make_sample(timestamp, 10.0, 1)
+            sample['metrics']['cpu']['cores'] = {'summary': {
+                'top': [{'core': core, 'usage': usage} for core, usage in top]
+            }, 'count': 4}
+            samples.append(sample)
+
+        top = merge_samples(samples)['metrics']['cpu']['cores']['summary']['top']
+
+        assert top == [{'core': 3, 'usage': 85.0}, {'core': 1, 'usage': 60.0}]
+
+
+class TestBackpressureMonitor:
+    """Tests for BackpressureMonitor class."""
+
+    def test_buffer_watermarks(self):
+        """Test shed levels derived from buffer usage."""
+        monitor = BackpressureMonitor(MockConfig())
+
+        assert monitor.level(0.1) == SHED_NONE
+        assert monitor.level(0.6) == SHED_DETAIL
+        assert monitor.level(0.8) == SHED_AGGREGATE
+        assert monitor.level(0.95) == SHED_CRITICAL
+
+    def test_throttling_raises_level(self):
+        """Test that 429/503 responses escalate and honor Retry-After."""
+        monitor = BackpressureMonitor(MockConfig())
+
+        monitor.record_response(429, 0.1, retry_after=30)
+        assert monitor.level() == SHED_DETAIL
+        assert monitor.backing_off()
+
+        monitor.record_response(503, 0.1)
+        assert monitor.level() == SHED_AGGREGATE
+
+    def test_pressure_decays(self):
+        """Test that server pressure clears after the cooldown."""
+        monitor = BackpressureMonitor(MockConfig())
+        monitor.cooldown = 0
+
+        monitor.record_response(503, 0.1)
+        assert monitor.level() == SHED_NONE
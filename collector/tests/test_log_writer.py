@@ -0,0 +1,128 @@
+"""
+Tests for the background log writer and rate limiting.
+"""
+
+import logging
+import sys
+import threading
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from log_writer import BackgroundLogWriter, RateLimitFilter
+
+
+def make_record(msg, *args, created=1000.0):
+    record = logging.LogRecord('test', logging.WARNING, __file__, 1, msg, args, None)
+    record.created = created
+    return record
+
+
+class ListHandler(logging.Handler):
+    """Collects formatted messages."""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class BlockedHandler(logging.Handler):
+    """Handler stuck until released, like a stalled disk."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.messages = []
+
+    def emit(self, record):
+        self.release.wait(5)
+        self.messages.append(record.getMessage())
+
+
+class TestRateLimitFilter:
+    """Test cases for RateLimitFilter."""
+
+    def test_repeats_suppressed_and_summarized(self):
+        """Test that repeats beyond the burst are counted into one summary."""
+        limiter = RateLimitFilter(burst=3, window=3600)
+
+        passed = [limiter.filter(make_record('Error talking to %s', f'host{i}', created=1000.0 + i))
+                  for i in range(720)]
+
+        assert passed.count(True) == 3
+        assert limiter.collect_summaries(now=2000.0) == []
+
+        summaries = limiter.collect_summaries(now=1000.0 + 3600)
+        assert len(summaries) == 1
+        assert summaries[0].getMessage() == 'Error talking to host719 x 720 in last hour (717 suppressed)'
+
+    def test_different_messages_independent(self):
+        """Test that distinct templates and levels are limited separately."""
+        limiter = RateLimitFilter(burst=1, window=60)
+
+        assert limiter.filter(make_record('first'))
+        assert limiter.filter(make_record('second'))
+        error = make_record('first')
+        error.levelno = logging.ERROR
+        assert limiter.filter(error)
+        assert not limiter.filter(make_record('first'))
+
+    def test_new_window_passes_again(self):
+        """Test that a message passes again once its window has ended."""
+        limiter = RateLimitFilter(burst=1, window=60)
+
+        assert limiter.filter(make_record('msg', created=0.0))
+        assert not limiter.filter(make_record('msg', created=10.0))
+        assert limiter.filter(make_record('msg', created=70.0))
+
+        summaries = limiter.collect_summaries(now=75.0)
+        assert [s.getMessage() for s in summaries] == ['msg x 2 in last minute (1 suppressed)']
+        assert not limiter.filter(make_record('msg', created=80.0))
+
+
+class TestBackgroundLogWriter:
+    """Test cases for BackgroundLogWriter."""
+
+    def test_records_written_in_background(self):
+        """Test that records reach the handlers and summaries flush on stop."""
+        handler = ListHandler()
+        limiter = RateLimitFilter(burst=2, window=3600)
+        writer = BackgroundLogWriter([handler], rate_limiter=limiter)
+        writer.start()
+
+        logger = logging.getLogger('test_log_writer.background')
+        logger.propagate = False
+        logger.addHandler(writer.queue_handler)
+        try:
+            for i in range(10):
+                logger.warning("Retry %s failed", i)
+        finally:
+            writer.stop()
+            logger.removeHandler(writer.queue_handler)
+
+        assert handler.messages[:2] == ['Retry 0 failed', 'Retry 1 failed']
+        assert handler.messages[2] == 'Retry 9 failed x 10 in last hour (8 suppressed)'
+
+    def test_stalled_handler_does_not_block(self):
+        """Test that logging drops records instead of waiting on a stuck handler."""
+        handler = BlockedHandler()
+        writer = BackgroundLogWriter([handler], queue_size=5)
+        writer.start()
+
+        logger = logging.getLogger('test_log_writer.stalled')
+        logger.propagate = False
+        logger.addHandler(writer.queue_handler)
+        try:
+            for i in range(50):
+                logger.warning("Message %s", i)
+            assert writer.queue_handler.dropped > 0
+        finally:
+            handler.release.set()
+            writer.stop()
+            logger.removeHandler(writer.queue_handler)
+
+        assert any('log queue full' in message for message in handler.messages)
@@ -194,6 +194,16 @@ class TestMetricsCollector:
         assert 'disk' not in metrics['metrics']
         assert 'network' not in metrics['metrics']
 
+    def test_collect_sample(self, collector):
+        """Test that the compact sample converts to the collect() shape."""
+        sample = collector.collect_sample(['memory', 'network'])
+        metrics = sample.to_dict()
+
+        assert metrics['hostname'] == 'test-host'
+        assert list(metrics['metrics']) == ['memory', 'network']
+        assert sample.cpu is None
+        assert len(sample.network.counters) == 8 * len(sample.network.names)
+
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -0,0 +1,290 @@
+"""
+Unit tests for the event-loop runtime.
+"""
+
+import asyncio
+import pytest
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from runtime import CollectorRuntime, host_offset, next_slot
+
+
+class MockConfig:
+    """Mock configuration with sub-second intervals."""
+
+    def __init__(self, interval=0.05, align=False, jitter=0):
+        self.interval = interval
+        self.hostname = 'test-host'
+        self.align = align
+        self.jitter = jitter
+
+    def get(self, *keys, default=None):
+        return {
+            ('collector', 'shutdown_timeout'): 1,
+            ('collector', 'replay_interval'): 60,
+            ('collector', 'align'): self.align,
+            ('collector', 'jitter'): self.jitter,
+        }.get(keys, default)
+
+    def get_metric_interval(self, metric_type):
+        return self.interval
+
+
+class MockCollector:
+    """Collector returning empty samples."""
+
+    enabled_families = ['cpu', 'memory']
+
+    def collect_sample(self, families):
+        return MockSample({'timestamp': time.monotonic(), 'metrics': {family: {} for family in families}})
+
+
+class MockSample:
+    """Compact sample stand-in wrapping a dictionary."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.slot = None
+        self.window = None
+
+    def to_dict(self):
+        if self.slot is not None:
+            return dict(self.metrics, slot=self.slot, window=self.window)
+        return self.metrics
+
+
+class MockChannel:
+    """Sink channel recording what it was given."""
+
+    def __init__(self, name, delay=0.0, batch_size=1, window=1):
+        self.name = name
+        self.delay = delay
+        self.batch_size = batch_size
+        self.window = window
+        self.queue_size = 1000
+        self.sent = []
+        self.batches = []
+        self.buffered = []
+
+    def send(self, samples):
+        time.sleep(self.delay)
+        self.sent.extend(samples)
+        self.batches.append(len(samples))
+        return True
+
+    def buffer(self, sample):
+        self.buffered.append(sample)
+
+    def replay(self):
+        return 0
+
+
+class MockSender:
+    """Sender fanning out to mock channels."""
+
+    def __init__(self, *channels):
+        self.channels = {channel.name: channel for channel in channels}
+
+    def stamp(self, sample):
+        pass
+
+    def encode(self, sample, metrics):
+        return metrics
+
+
+class MockShared:
+    """Shared-memory writer recording what it was given."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.published = []
+
+    def publish(self, sample):
+        if self.fail:
+            raise OSError("segment unmapped")
+        self.published.append(sample)
+
+
+def run_for(runtime, seconds):
+    """Run the runtime and request a stop after the given time."""
+    async def main():
+        task = asyncio.ensure_future(runtime._main())
+        await asyncio.sleep(seconds)
+        runtime.request_stop()
+        await task
+
+    asyncio.run(main())
+
+
+class TestCollectorRuntime:
+    """Tests for CollectorRuntime class."""
+
+    def test_families_collected_on_interval(self):
+        """Test that each family task ticks at its interval without drift."""
+        channel = MockChannel('default')
+        runtime = CollectorRuntime(MockConfig(), MockCollector(), MockSender(channel))
+
+        run_for(runtime, 0.5)
+
+        cpu_times = [s['timestamp'] for s in channel.sent if 'cpu' in s['metrics']]
+        assert 7 <= len(cpu_times) <= 11
+        gaps = [b - a for a, b in zip(cpu_times, cpu_times[1:])]
+        assert max(gaps) < 0.05 * 1.8
+
+    def test_slow_sender_does_not_delay_collection(self):
+        """Test that collection continues while a send blocks."""
+        channel = MockChannel('default', delay=0.3)
+        runtime = CollectorRuntime(MockConfig(), MockCollector(), MockSender(channel))
+
+        run_for(runtime, 0.5)
+
+        # Sends could not keep up, so unsent samples were buffered on shutdown
+        assert len(channel.sent) + len(channel.buffered) >= 14
+        assert channel.buffered
+
+    def test_slow_sink_does_not_delay_other_sinks(self):
+        """Test that each sink drains its own queue independently."""
+        fast = MockChannel('primary')
+        slow = MockChannel('dr', delay=0.3)
+        runtime = CollectorRuntime(MockConfig(), MockCollector(), MockSender(fast, slow))
+
+        run_for(runtime, 0.5)
+
+        assert len(fast.sent) >= 14
+        assert not fast.buffered
+        assert len(slow.sent) < len(fast.sent)
+        # The same sample objects are shared between sinks
+        assert all(any(s is f for f in fast.sent) for s in slow.sent)
+
+    def test_batches_drain_backlog(self):
+        """Test that a sink with a batch size sends queued samples together."""
+        channel = MockChannel('default', delay=0.1, batch_size=10)
+        runtime = CollectorRuntime(MockConfig(), MockCollector(), MockSender(channel))
+
+        run_for(runtime, 0.5)
+
+        assert max(channel.batches) > 1
+        assert not channel.buffered
+
+    def test_window_keeps_sends_in_flight(self):
+        """Test that a sink with a window sends several batches at once."""
+        serial = MockChannel('serial', delay=0.2)
+        windowed = MockChannel('windowed', delay=0.2, window=4)
+        runtime = CollectorRuntime(MockConfig(), MockCollector(), MockSender(serial, windowed))
+
+        run_for(runtime, 0.5)
+
+        assert len(windowed.sent) >= 2 * len(serial.sent)
+        assert not windowed.buffered
+
+    def test_shutdown_bounded_by_stuck_send(self):
+        """Test that a send stuck past the shutdown timeout does not hold up shutdown."""
+        channel = MockChannel('default', delay=2.5)
+        runtime = CollectorRuntime(MockConfig(), MockCollector(), MockSender(channel))
+
+        began = time.monotonic()
+        run_for(runtime, 0.2)
+        elapsed = time.monotonic() - began
+
+        # 0.2s running plus the 1s shutdown_timeout, not the 2.5s send
+        assert elapsed < 2.0
+        assert channel.buffered
+
+    def test_reload_runs_off_loop(self):
+        """Test that reading the configuration does not block collection."""
+        channel = MockChannel('default')
+        config = MockConfig()
+        reloads = []
+
+        def reload():
+            reloads.append(threading.current_thread())
+            time.sleep(0.3)
+            raise ValueError("invalid configuration")
+
+        config.reload = reload
+        runtime = CollectorRuntime(config, MockCollector(), MockSender(channel))
+
+        async def main():
+            task = asyncio.ensure_future(runtime._main())
+            await asyncio.sleep(0.1)
+            sent = len(channel.sent)
+            reload_task = asyncio.ensure_future(runtime._reload())
+            await asyncio.sleep(0.25)
+            # Collection went on while the reload was reading
+            assert len(channel.sent) > sent + 4
+            await reload_task
+            runtime.request_stop()
+            await task
+
+        asyncio.run(main())
+
+        assert reloads and reloads[0] is not threading.main_thread()
+
+    @pytest.mark.parametrize('fail', [False, True])
+    def test_samples_published_to_shared_memory(self, fail):
+        """Test that collected samples are published, and a failing segment is skipped."""
+        channel = MockChannel('default')
+        shared = MockShared(fail)
+        runtime = CollectorRuntime(MockConfig(), MockCollector(), MockSender(channel),
+                                   shared=shared)
+
+        run_for(runtime, 0.3)
+
+        assert channel.sent
+        if not fail:
+            assert len(shared.published) >= len(channel.sent)
+            assert {sample.metrics['timestamp'] for sample in shared.published} \
+                >= {sample['timestamp'] for sample in channel.sent}
+
+    def test_aligned_ticks(self):
+        """Test that aligned ticks land on interval boundaries and report their window."""
+        channel = MockChannel('default')
+        runtime = CollectorRuntime(MockConfig(interval=0.1, align=True), MockCollector(),
+                                   MockSender(channel))
+
+        run_for(runtime, 0.65)
+
+        samples = [s for s in channel.sent if 'cpu' in s['metrics']]
+        assert 4 <= len(samples) <= 7
+        slots = [s['slot'] for s in samples]
+        assert len(set(slots)) == len(slots)
+        for sample in samples:
+            # Slots are whole tenths of a second
+            assert sample['slot'].endswith('00000Z')
+            start, end = sample['window']
+            assert 0 <= start <= end < 0.05
+
+
+class TestAlignment:
+    """Tests for aligned slot scheduling."""
+
+    def test_next_slot(self):
+        """Test that slots are the next interval boundary."""
+        assert next_slot(1000.2, 5) == 1005
+        assert next_slot(1004.99, 5) == 1005
+        assert next_slot(1005.0, 5) == 1010
+
+    def test_next_slot_with_offset(self):
+        """Test that the offset delays collection but not the slot."""
+        # Collected at slot + 2
+        assert next_slot(1001.0, 5, offset=2) == 1000
+        assert next_slot(1002.5, 5, offset=2) == 1005
+
+    def test_next_slot_never_repeats(self):
+        """Test that waking early does not collect the same slot twice."""
+        assert next_slot(1004.999, 5, after=1005) == 1010
+
+    def test_host_offset(self):
+        """Test that host offsets are stable, bounded and differ between hosts."""
+        offsets = [host_offset(f'web-{index:02d}', 5) for index in range(50)]
+
+        assert offsets == [host_offset(f'web-{index:02d}', 5) for index in range(50)]
+        assert all(0 <= offset < 5 for offset in offsets)
+        assert len(set(offsets)) == 50
+        assert host_offset('web-01', 0) == 0
@@ -0,0 +1,187 @@
+"""
+Unit tests for the compact sample model.
+"""
+
+import json
+import sys
+import tracemalloc
+from array import array
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from metrics_sender import EncodedSample
+from sample_model import NAN, Sample
+
+
+def make_sample(index=0):
+    """Build a sample dictionary with every family, as the collector reports it."""
+    return {
+        'timestamp': f'2026-01-01T00:00:{index % 60:02d}.{index:06d}Z',
+        'hostname': 'test-host',
+        'metrics': {
+            'cpu': {
+                'usage': {'total': 12.5, 'user': 8.1, 'system': 4.4, 'idle': 87.5, 'iowait': 0.3},
+                'cores': {'usage': [float(index % 100 + core) for core in range(16)],
+                          'count': 16, 'physical_count': 8},
+                'load': {'average': {'1m': 0.5, '5m': 0.75, '15m': 1.25}},
+            },
+            'memory': {
+                'total': 67108864000, 'used': 30000000000 + index, 'available': 37108864000,
+                'free': 4000000000, 'usage': {'percent': 44.7},
+                'buffers': 512000000, 'cached': 20000000000,
+                'swap': {'total': 8589934592, 'used': 0, 'free': 8589934592,
+                         'usage': {'percent': 0.0}},
+            },
+            'disk': {
+                'partitions': [{
+                    'device': f'/dev/sda{i}', 'mountpoint': mountpoint, 'fstype': 'ext4',
+                    'usage': {'total': 512110190592, 'used': 201234567168 + index,
+                              'free': 310875623424, 'percent': 39.3},
+                    'inode': {'total': 31260672, 'used': 812345, 'free': 30448327,
+                              'usage': {'percent': 2.6}},
+                } for i, mountpoint in enumerate(['/', '/var', '/home'], 1)],
+                'io': {'read': {'bytes': 1024.0, 'count': 2.0},
+                       'write': {'bytes': 4096.5, 'count': 8.0}},
+            },
+            'network': {
+                'interfaces': [{
+                    'name': name,
+                    'io': {'bytes': {'sent': 10**11 + index, 'recv': 10**11},
+                           'packets': {'sent': 10**8, 'recv': 10**8 + index},
+                           'errors': {'in': 0, 'out': 1}, 'dropped': {'in': 2, 'out': 0}},
+                    'io_rate': {'bytes_sent': 1500.0, 'bytes_recv': 2500.0,
+                                'packets_sent': 10.0, 'packets_recv': 12.5},
+                } for name in ['eth0', 'eth1', 'docker0']],
+                'connections': {'tcp': 120, 'udp': 8, 'established': 90, 'time_wait': 20,
+                                'close_wait': 1, 'listen': 12},
+            },
+        },
+    }
+
+
+def retained_size(build, count=200):
+    """Measure memory retained per object built by build(index)."""
+    tracemalloc.start()
+    try:
+        objects = [build(index) for index in range(count)]
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(objects) == count
+    return size / count
+
+
+class TestSample:
+    """Tests for Sample and the per-family records."""
+
+    def test_round_trip(self):
+        """Test that the JSON shape survives conversion unchanged."""
+        sample = make_sample(3)
+        assert Sample.from_dict(sample).to_dict() == sample
+
+    def test_aligned_fields(self):
+        """Test that slot and window are kept ahead of the metrics."""
+        sample = make_sample()
+        sample = {'timestamp': sample['timestamp'], 'hostname': sample['hostname'],
+                  'slot': '2026-01-01T00:00:00.000000Z',
+                  'window': {'start': 0.25, 'end': 1.26}, 'metrics': sample['metrics']}
+
+        result = Sample.from_dict(sample).to_dict()
+
+        assert result == sample
+        assert list(result) == ['timestamp', 'hostname', 'slot', 'window', 'metrics']
+
+    def test_partial_sample(self):
+        """Test that only collected families are reported, in family order."""
+        sample = make_sample()
+        sample['metrics'] = {
+            'network': sample['metrics']['network'],
+            'memory': sample['metrics']['memory'],
+        }
+
+        result = Sample.from_dict(sample).to_dict()
+
+        assert list(result['metrics']) == ['memory', 'network']
+
+    def test_optional_fields_omitted(self):
+        """Test that fields a platform does not report stay absent."""
+        sample = make_sample()
+        cpu = sample['metrics']['cpu']
+        del cpu['usage']['iowait'], cpu['cores'], cpu['load']
+        memory = sample['metrics']['memory']
+        del memory['buffers'], memory['cached']
+        disk = sample['metrics']['disk']
+        del disk['partitions'][1]['inode']
+        disk['io'] = {}
+        sample['metrics']['network']['connections'] = {}
+
+        assert Sample.from_dict(sample).to_dict() == sample
+
+    def test_first_rate_omitted(self):
+        """Test that interfaces without a previous reading get no io_rate."""
+        network = Sample.from_dict(make_sample()).network
+        network.rates[4:8] = array('d', [NAN] * 4)
+
+        interfaces = network.to_dict()['interfaces']
+
+        assert 'io_rate' in interfaces[0]
+        assert 'io_rate' not in interfaces[1]
+        assert 'io_rate' in interfaces[2]
+
+    def test_group_members(self):
+        """Test that group member counts survive conversion and single interfaces omit them."""
+        sample = make_sample()
+        interfaces = sample['metrics']['network']['interfaces']
+        interfaces[2] = {'name': 'veth', 'members': 40, **{
+            key: value for key, value in interfaces[2].items() if key != 'name'}}
+
+        network = Sample.from_dict(sample).network
+
+        assert list(network.members) == [0, 0, 40]
+        assert Sample.from_dict(sample).to_dict() == sample
+        assert Sample.from_dict(make_sample()).network.members is None
+
+    def test_labels_shared_between_samples(self):
+        """Test that repeated labels are stored once."""
+        first = Sample.from_dict(json.loads(json.dumps(make_sample(1))))
+        second = Sample.from_dict(json.loads(json.dumps(make_sample(2))))
+
+        assert first.network.names[0] is second.network.names[0]
+        assert first.disk.mountpoints[2] is second.disk.mountpoints[2]
+
+    def test_compact_sample_uses_less_memory(self):
+        """Test that a compact sample retains several times less than its dictionary."""
+        # Parse from JSON so the dictionaries own their strings, as they
+        # would coming from the collector
+        payloads = [json.dumps(make_sample(index)) for index in range(200)]
+
+        dict_size = retained_size(lambda index: json.loads(payloads[index]))
+        compact_size = retained_size(lambda index: Sample.from_dict(json.loads(payloads[index])))
+
+        assert compact_size * 3 < dict_size
+
+
+class TestEncodedSample:
+    """Tests for EncodedSample holding a compact sample."""
+
+    def test_payload_from_compact_sample(self):
+        """Test that a compact sample encodes to the same JSON as its dictionary."""
+        sample = make_sample()
+
+        encoded = EncodedSample(Sample.from_dict(sample))
+
+        assert json.loads(encoded.payload()) == sample
+        assert encoded.metrics == sample
+
+    def test_prebuilt_dictionary_not_retained(self):
+        """Test that a dictionary passed for encoding is not kept."""
+        sample = make_sample()
+        compact = Sample.from_dict(sample)
+
+        encoded = EncodedSample(compact, sample)
+
+        assert encoded.sample is compact
+        assert json.loads(encoded.payload()) == sample
+        assert not any(value is sample for value in (encoded.sample, encoded.metrics))
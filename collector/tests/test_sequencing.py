@@ -0,0 +1,173 @@
+"""
+Unit tests for sequence numbers, deduplication and the ingest stub.
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+from types import MappingProxyType
+
+import pytest
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from ingest_stub import IngestStub
+from load_shedding import BackpressureMonitor, merge_samples
+from metrics_sender import MetricsSender
+from sample_model import Sample
+from sequencing import SequenceTracker, sequence_numbers
+from sinks import HttpSink
+
+
+class MockConfig:
+    """Mock configuration with no sinks."""
+
+    sinks = ()
+
+    def get(self, *keys, default=None):
+        return default
+
+
+def make_sample(seq, session='s1', hostname='test-host', **extra):
+    sample = {'timestamp': '2026-01-01T00:00:00.000000Z', 'hostname': hostname,
+              'session': session, 'seq': seq, 'metrics': {}}
+    sample.update(extra)
+    return sample
+
+
+@pytest.fixture
+def stub():
+    """Run an ingest stub on a free port."""
+    stub = IngestStub()
+    stub.start_in_thread()
+    yield stub
+    stub.stop()
+
+
+def make_sink(stub, timeout=5):
+    spec = MappingProxyType({'name': 'primary', 'url': stub.url, 'timeout': timeout})
+    return HttpSink(spec, BackpressureMonitor(MockConfig()))
+
+
+class TestSequenceTracker:
+    """Tests for SequenceTracker class."""
+
+    def test_duplicates_dropped(self):
+        """Test that a sequence number is accepted once per session."""
+        tracker = SequenceTracker()
+
+        assert tracker.accept(make_sample(1))
+        assert not tracker.accept(make_sample(1))
+        assert tracker.accept(make_sample(1, session='s2'))
+        assert tracker.accept(make_sample(1, hostname='other-host'))
+
+    def test_out_of_order(self):
+        """Test that gaps are filled in any order and then collapse."""
+        tracker = SequenceTracker()
+
+        for seq in (3, 1, 4):
+            assert tracker.accept(make_sample(seq))
+        assert tracker.stats()['pending'] == 2
+        assert tracker.accept(make_sample(2))
+        assert not tracker.accept(make_sample(3))
+
+        assert tracker.stats() == {'sessions': 1, 'pending': 0}
+
+    def test_aggregate_numbers(self):
+        """Test that an aggregate is a duplicate only if every number it lists was stored."""
+        tracker = SequenceTracker()
+        tracker.accept(make_sample(1))
+        tracker.accept(make_sample(2))
+
+        assert not tracker.accept(make_sample(1, aggregate={'count': 2, 'seqs': [1, 2]}))
+        assert tracker.accept(make_sample(2, aggregate={'count': 2, 'seqs': [2, 3]}))
+        assert not tracker.accept(make_sample(3))
+
+    def test_aggregate_of_non_adjacent_samples(self):
+        """Test that samples between the ones an aggregate merged are still stored."""
+        tracker = SequenceTracker()
+        cpu = [make_sample(seq, metrics={'cpu': {}}) for seq in (1, 3)]
+        memory = make_sample(2, metrics={'memory': {}})
+
+        assert tracker.accept(merge_samples(cpu))
+        assert tracker.accept(memory)
+        assert not tracker.accept(cpu[1])
+
+    def test_unsequenced_samples_accepted(self):
+        """Test that samples from older collectors are always stored."""
+        tracker = SequenceTracker()
+        sample = {'timestamp': 't0', 'hostname': 'test-host', 'metrics': {}}
+
+        assert sequence_numbers(sample) is None
+        assert tracker.accept(sample)
+        assert tracker.accept(sample)
+
+    def test_sessions_bounded(self):
+        """Test that the least recently used session is forgotten first."""
+        tracker = SequenceTracker(max_sessions=2)
+        for session in ('a', 'b', 'c'):
+            tracker.accept(make_sample(1, session=session))
+
+        assert tracker.stats()['sessions'] == 2
+        assert tracker.accept(make_sample(1, session='a'))
+        assert not tracker.accept(make_sample(1, session='c'))
+
+
+class TestMetricsSender:
+    """Tests for sequence numbering in MetricsSender."""
+
+    def test_samples_numbered_in_order(self):
+        """Test that encoded samples carry the session and consecutive numbers."""
+        sender = MetricsSender(MockConfig())
+        compact = Sample('2026-01-01T00:00:00.000000Z', 'test-host')
+        sender.stamp(compact)
+
+        first = json.loads(sender.encode(compact, compact.to_dict()).payload())
+        second = json.loads(sender.encode({'timestamp': 't1', 'hostname': 'test-host',
+                                           'metrics': {}}).payload())
+
+        assert (first['session'], first['seq']) == (sender.session, 1)
+        assert (second['session'], second['seq']) == (sender.session, 2)
+        assert list(first)[:4] == ['timestamp', 'hostname', 'session', 'seq']
+
+
+class TestIngestStub:
+    """Tests for IngestStub class with an HTTP sink."""
+
+    def test_batches_stored(self, stub):
+        """Test that single samples and batches are stored."""
+        sink = make_sink(stub)
+
+        assert sink.deliver([json.dumps(make_sample(1)).encode()])
+        assert sink.deliver([json.dumps(make_sample(seq)).encode() for seq in (2, 3)])
+        sink.close()
+
+        assert [sample['seq'] for sample in stub.samples] == [1, 2, 3]
+
+    def test_retransmission_after_timeout_stored_once(self, stub):
+        """Test that a sample resent after a timed-out but stored request is dropped."""
+        payload = json.dumps(make_sample(1)).encode()
+        stub.delay = 0.5
+        slow = make_sink(stub, timeout=0.1)
+        assert not slow.deliver([payload])
+        slow.close()
+        deadline = time.monotonic() + 5
+        while not stub.stats['stored'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        stub.delay = 0.0
+        sink = make_sink(stub)
+        assert sink.deliver([payload, json.dumps(make_sample(2)).encode()])
+        sink.close()
+
+        assert [sample['seq'] for sample in stub.samples] == [1, 2]
+        assert stub.stats['duplicates'] == 1
+
+    def test_invalid_body_rejected(self, stub):
+        """Test that a body that is not a sample gets HTTP 400."""
+        sink = make_sink(stub)
+
+        assert not sink.deliver([b'[1, 2]'])
+        sink.close()
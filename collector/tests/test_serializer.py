@@ -0,0 +1,74 @@
+"""
+Unit tests for sample serialization.
+"""
+
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from serializer import encode, format_timestamp
+
+
+# 2026-01-01T00:00:00Z
+NEW_YEAR = 1767225600
+
+
+class TestFormatTimestamp:
+    """Tests for format_timestamp function."""
+
+    def test_matches_datetime(self):
+        """Test that the output matches datetime's ISO 8601 formatting."""
+        now = NEW_YEAR + 3723.5
+        expected = datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+        assert format_timestamp(now) == expected == '2026-01-01T01:02:03.500000Z'
+
+    def test_second_rollover(self):
+        """Test that the cached date and time change with the second."""
+        assert format_timestamp(NEW_YEAR - 0.25) == '2025-12-31T23:59:59.750000Z'
+        assert format_timestamp(NEW_YEAR + 0.25) == '2026-01-01T00:00:00.250000Z'
+        assert format_timestamp(NEW_YEAR + 0.75) == '2026-01-01T00:00:00.750000Z'
+        # Going back a second is not served from the cache either
+        assert format_timestamp(NEW_YEAR - 0.5) == '2025-12-31T23:59:59.500000Z'
+
+    def test_microseconds_zero_padded(self):
+        """Test that microseconds always have six digits."""
+        assert format_timestamp(NEW_YEAR) == '2026-01-01T00:00:00.000000Z'
+        assert format_timestamp(NEW_YEAR + 2 ** -11) == '2026-01-01T00:00:00.000488Z'
+        assert format_timestamp(NEW_YEAR + 0.0625) == '2026-01-01T00:00:00.062500Z'
+
+    def test_defaults_to_now(self):
+        """Test that the current time is used without an argument."""
+        before = datetime.now(timezone.utc).replace(microsecond=0)
+        stamp = format_timestamp()
+        after = datetime.now(timezone.utc)
+
+        parsed = datetime.strptime(stamp, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
+        assert before <= parsed <= after
+
+
+class TestEncode:
+    """Tests for encode function."""
+
+    def test_compact_separators(self):
+        """Test that no whitespace is emitted between tokens."""
+        sample = {'timestamp': '2026-01-01T00:00:00.000000Z', 'hostname': 'test-host',
+                  'metrics': {'cpu': {'usage': {'total': 12.5}, 'cores': {'usage': [1.0, 2.0]}}}}
+
+        data = encode(sample)
+
+        assert isinstance(data, bytes)
+        assert data == (b'{"timestamp":"2026-01-01T00:00:00.000000Z","hostname":"test-host",'
+                        b'"metrics":{"cpu":{"usage":{"total":12.5},"cores":{"usage":[1.0,2.0]}}}}')
+        assert json.loads(data) == sample
+
+    def test_non_ascii_escaped(self):
+        """Test that non-ASCII text is escaped, as json.dumps() does."""
+        sample = {'hostname': '서버-1'}
+
+        assert encode(sample) == json.dumps(sample, separators=(',', ':')).encode('ascii')
+        assert encode(sample) == b'{"hostname":"\\uc11c\\ubc84-1"}'
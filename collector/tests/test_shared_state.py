@@ -0,0 +1,188 @@
+"""
+Unit tests for the shared-memory segment.
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from sample_model import Sample
+from shared_state import SEQ, SharedStateReader, SharedStateWriter
+
+
+def make_sample(index=0, cores=16):
+    """Build a sample dictionary with every family, as the collector reports it."""
+    return {
+        'timestamp': f'2026-01-01T00:00:{index % 60:02d}.000000Z',
+        'hostname': 'test-host',
+        'metrics': {
+            'cpu': {
+                'usage': {'total': 12.5, 'user': 8.1, 'system': 4.4, 'idle': 87.5, 'iowait': 0.3},
+                'cores': {'usage': [float(index)] * cores, 'count': cores, 'physical_count': 8},
+                'load': {'average': {'1m': 0.5, '5m': 0.75, '15m': 1.25}},
+            },
+            'memory': {
+                'total': 67108864000, 'used': 30000000000 + index, 'available': 37108864000,
+                'free': 4000000000, 'usage': {'percent': 44.7},
+                'swap': {'total': 8589934592, 'used': 0, 'free': 8589934592,
+                         'usage': {'percent': 0.0}},
+            },
+            'disk': {
+                'partitions': [{
+                    'device': f'/dev/sda{i}', 'mountpoint': mountpoint, 'fstype': 'ext4',
+                    'usage': {'total': 512110190592, 'used': 201234567168 + index,
+                              'free': 310875623424, 'percent': 39.3},
+                    'inode': {'total': 31260672, 'used': 812345, 'free': 30448327,
+                              'usage': {'percent': 2.6}},
+                } for i, mountpoint in enumerate(['/', '/var'], 1)] + [{
+                    'device': 'tmpfs', 'mountpoint': '/run', 'fstype': 'tmpfs',
+                    'usage': {'total': 1024, 'used': 0, 'free': 1024, 'percent': 0.0},
+                }],
+                'io': {},
+            },
+            'network': {
+                'interfaces': [{
+                    'name': 'eth0',
+                    'io': {'bytes': {'sent': 10**11 + index, 'recv': 10**11},
+                           'packets': {'sent': 10**8, 'recv': 10**8},
+                           'errors': {'in': 0, 'out': 1}, 'dropped': {'in': 2, 'out': 0}},
+                    'io_rate': {'bytes_sent': 1500.0, 'bytes_recv': 2500.0,
+                                'packets_sent': 10.0, 'packets_recv': 12.5},
+                }, {
+                    'name': 'veth',
+                    'members': 40,
+                    'io': {'bytes': {'sent': 5, 'recv': 6}, 'packets': {'sent': 7, 'recv': 8},
+                           'errors': {'in': 0, 'out': 0}, 'dropped': {'in': 0, 'out': 0}},
+                }],
+                'connections': {'tcp': 120, 'udp': 8, 'established': 90, 'time_wait': 20,
+                                'close_wait': 1, 'listen': 12},
+            },
+        },
+    }
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = SharedStateWriter(tmp_path / 'metrics.shm', 'test-host', max_cores=64,
+                               max_partitions=8, max_interfaces=8)
+    yield writer
+    writer.close()
+
+
+class TestSharedState:
+    """Tests for SharedStateWriter and SharedStateReader."""
+
+    def test_round_trip(self, writer):
+        """Test that a reader sees every family as it was collected."""
+        sample = make_sample(5)
+        writer.publish(Sample.from_dict(sample))
+
+        with SharedStateReader(writer.path) as reader:
+            published = reader.sample()
+            assert reader.hostname == 'test-host'
+
+        assert published.to_dict()['metrics'] == sample['metrics']
+        assert published.timestamp == sample['timestamp']
+
+    def test_nothing_published(self, writer):
+        """Test that blocks never written read as None."""
+        with SharedStateReader(writer.path) as reader:
+            assert reader.cpu() is None
+            assert reader.sample() is None
+
+    def test_families_updated_independently(self, writer):
+        """Test that publishing one family leaves the others in place."""
+        writer.publish(Sample.from_dict(make_sample(1)))
+        cpu_only = Sample.from_dict(make_sample(2))
+        cpu_only.memory = cpu_only.disk = cpu_only.network = None
+        writer.publish(cpu_only)
+
+        with SharedStateReader(writer.path) as reader:
+            cpu, memory = reader.cpu(), reader.memory()
+
+        assert cpu.metrics.cores[0] == 2.0
+        assert cpu.timestamp - memory.timestamp == pytest.approx(1.0)
+        assert memory.metrics.used == 30000000001
+        assert cpu.seq > memory.seq == 2
+
+    def test_capacity_exceeded(self, writer):
+        """Test that entries beyond a block's capacity are dropped and counted."""
+        writer.publish(Sample.from_dict(make_sample(cores=100)))
+
+        with SharedStateReader(writer.path) as reader:
+            cpu = reader.cpu()
+
+        assert len(cpu.metrics.cores) == 64
+        assert cpu.total == 100
+        assert cpu.metrics.count == 100
+
+    def test_write_in_progress(self, writer):
+        """Test that a block left mid-write by a dead writer is not returned."""
+        writer.publish(Sample.from_dict(make_sample()))
+        SEQ.pack_into(writer._mm, writer.offsets['cpu'], 3)
+
+        with SharedStateReader(writer.path) as reader:
+            assert reader.cpu() is None
+            assert reader.memory() is not None
+
+    def test_concurrent_reads_consistent(self, writer):
+        """Test that a reader never sees a mix of two writes."""
+        samples = [Sample.from_dict(make_sample(index, cores=64)) for index in range(2)]
+        stop = threading.Event()
+
+        def publish():
+            index = 0
+            while not stop.is_set():
+                writer.publish(samples[index % 2])
+                index += 1
+
+        thread = threading.Thread(target=publish)
+        thread.start()
+        try:
+            with SharedStateReader(writer.path) as reader:
+                readings = [reader.cpu() for _ in range(2000)]
+        finally:
+            stop.set()
+            thread.join()
+
+        seen = set()
+        for reading in readings:
+            if reading is not None:
+                assert len(set(reading.metrics.cores)) == 1
+                seen.add(reading.metrics.cores[0])
+        assert seen
+
+    def test_stale_after_close_and_restart(self, writer, tmp_path):
+        """Test that readers notice a stopped or restarted collector."""
+        writer.publish(Sample.from_dict(make_sample(1)))
+        reader = SharedStateReader(writer.path)
+        assert not reader.stale
+
+        writer.close()
+        assert reader.closed and reader.stale
+        assert reader.memory().metrics.used == 30000000001
+
+        restarted = SharedStateWriter(writer.path, 'test-host', max_cores=4)
+        try:
+            reader.reopen()
+            assert not reader.stale
+            assert reader.max_cores == 4
+            assert reader.memory() is None
+        finally:
+            reader.close()
+            restarted.close()
+
+    def test_invalid_segment(self, tmp_path):
+        """Test that files that are not segments are rejected."""
+        with pytest.raises(FileNotFoundError):
+            SharedStateReader(tmp_path / 'missing.shm')
+
+        path = tmp_path / 'other.shm'
+        path.write_bytes(b'\0' * 4096)
+        with pytest.raises(ValueError):
+            SharedStateReader(path)
@@ -0,0 +1,239 @@
+"""
+Unit tests for sinks and per-sink delivery channels.
+"""
+
+import json
+import sys
+import threading
+from pathlib import Path
+from types import MappingProxyType
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from buffer_store import BufferStore
+from load_shedding import SHED_AGGREGATE, SHED_CRITICAL, SHED_DETAIL, SHED_NONE
+from metrics_sender import EncodedSample, SinkChannel
+from sinks import FileSink, Sink
+
+
+class MockConfig:
+    """Mock configuration using the defaults."""
+
+    def get(self, *keys, default=None):
+        return default
+
+
+class RecordingSink(Sink):
+    """Sink recording delivered payloads; can be switched off."""
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.up = True
+        self.delivered = []
+        self.batches = []
+
+    def deliver(self, payloads):
+        if not self.up:
+            return False
+        self.batches.append(len(payloads))
+        self.delivered.extend(payloads)
+        return True
+
+
+def make_spec(tmp_path, name='primary', **extra):
+    spec = {'name': name, 'type': 'http', 'url': 'http://127.0.0.1:9', 'batch_size': 1,
+            'window': 1, 'buffer_dir': tmp_path / name, 'buffer_max_size': 1}
+    spec.update(extra)
+    return MappingProxyType(spec)
+
+
+def make_sample(index):
+    return EncodedSample({
+        'timestamp': f'2026-01-01T00:00:{index:02d}.000000Z',
+        'hostname': 'test-host',
+        'metrics': {'cpu': {'usage': {'total': 10.0 + index}, 'cores': {'usage': [1.0, 2.0]}}},
+    })
+
+
+def make_network_sample(index):
+    return EncodedSample({
+        'timestamp': f'2026-01-01T00:00:{index:02d}.000000Z',
+        'hostname': 'test-host',
+        'metrics': {'network': {'interfaces': [{'name': 'eth0',
+                                                'io': {'bytes': {'sent': index}}}]}},
+    })
+
+
+class TestEncodedSample:
+    """Tests for EncodedSample class."""
+
+    def test_payload_encoded_once(self):
+        """Test that each shed level is serialized once and reused."""
+        sample = make_sample(1)
+
+        assert sample.payload() is sample.payload()
+        assert json.loads(sample.payload())['metrics']['cpu']['cores']['usage'] == [1.0, 2.0]
+        assert 'cores' not in json.loads(sample.payload(SHED_DETAIL))['metrics']['cpu']
+
+    def test_fully_shed_sample_has_no_payload(self):
+        """Test that a sample whose families are all dropped encodes to nothing."""
+        sample = make_network_sample(1)
+
+        assert sample.payload(SHED_CRITICAL) is None
+        assert sample.payload(SHED_AGGREGATE) is not None
+        assert make_sample(1).payload(SHED_CRITICAL) is not None
+
+
+class TestFileSink:
+    """Tests for FileSink class."""
+
+    def test_writes_json_lines(self, tmp_path):
+        """Test that payloads are appended one per line."""
+        sink = FileSink({'name': 'forensics', 'path': tmp_path / 'out' / 'metrics.jsonl'})
+
+        assert sink.deliver([make_sample(1).payload(), make_sample(2).payload()])
+        sink.close()
+
+        lines = (tmp_path / 'out' / 'metrics.jsonl').read_bytes().splitlines()
+        assert [json.loads(line)['metrics']['cpu']['usage']['total'] for line in lines] == [11.0, 12.0]
+
+    def test_rotates(self, tmp_path):
+        """Test that the file is rotated once it reaches its maximum size."""
+        path = tmp_path / 'metrics.jsonl'
+        sink = FileSink({'name': 'forensics', 'path': path, 'max_size': 0.0001,
+                         'backup_count': 2})
+
+        for index in range(5):
+            sink.deliver([make_sample(index).payload()])
+        sink.close()
+
+        assert (tmp_path / 'metrics.jsonl.1').exists()
+        assert (tmp_path / 'metrics.jsonl.2').exists()
+        assert not (tmp_path / 'metrics.jsonl.3').exists()
+
+    def test_capture_written_next_to_file(self, tmp_path):
+        """Test that a burst capture is written under its own name."""
+        sink = FileSink({'name': 'forensics', 'path': tmp_path / 'out' / 'metrics.jsonl'})
+
+        assert sink.deliver_capture('burst-20260101T000000Z.json.gz', b'data')
+
+        assert (tmp_path / 'out' / 'burst-20260101T000000Z.json.gz').read_bytes() == b'data'
+
+
+class TestSinkChannel:
+    """Tests for SinkChannel class."""
+
+    def make_channel(self, tmp_path, name='primary', **extra):
+        channel = SinkChannel(make_spec(tmp_path, name, **extra), MockConfig())
+        channel.sink = RecordingSink(channel.spec)
+        return channel
+
+    def test_shares_encoded_bytes(self, tmp_path):
+        """Test that sinks receive the same bytes object without copies."""
+        primary = self.make_channel(tmp_path, 'primary')
+        dr = self.make_channel(tmp_path, 'dr')
+        sample = make_sample(1)
+
+        assert primary.send([sample])
+        assert dr.send([sample])
+
+        assert primary.sink.delivered[0] is dr.sink.delivered[0] is sample.payload()
+
+    def test_down_sink_buffers_independently(self, tmp_path):
+        """Test that a failing sink buffers and replays without affecting others."""
+        primary = self.make_channel(tmp_path, 'primary')
+        dr = self.make_channel(tmp_path, 'dr')
+        dr.sink.up = False
+
+        for index in range(3):
+            sample = make_sample(index)
+            assert primary.send([sample])
+            assert not dr.send([sample])
+
+        assert primary.get_buffer_stats()['count'] == 0
+        assert dr.get_buffer_stats()['count'] == 3
+
+        dr.sink.up = True
+        assert dr.replay() == 3
+        assert dr.sink.delivered == primary.sink.delivered
+        primary.close()
+        dr.close()
+
+    def test_replay_uses_batch_size(self, tmp_path):
+        """Test that buffered samples are replayed batch_size at a time."""
+        channel = self.make_channel(tmp_path, 'primary', batch_size=4)
+        for index in range(10):
+            channel.buffer(make_sample(index))
+
+        assert channel.replay() == 10
+        assert channel.sink.batches == [4, 4, 2]
+        channel.close()
+
+    def test_replay_does_not_block_buffering(self, tmp_path):
+        """Test that the channel stays usable while a replay request is out."""
+        channel = self.make_channel(tmp_path, 'primary', batch_size=4)
+        for index in range(4):
+            channel.buffer(make_sample(index))
+
+        in_flight = threading.Event()
+        release = threading.Event()
+        deliver = channel.sink.deliver
+
+        def slow_deliver(payloads):
+            in_flight.set()
+            release.wait(5)
+            return deliver(payloads)
+
+        channel.sink.deliver = slow_deliver
+        replay = threading.Thread(target=channel.replay)
+        replay.start()
+        try:
+            assert in_flight.wait(5)
+            buffering = threading.Thread(target=channel.buffer, args=(make_sample(4),))
+            buffering.start()
+            buffering.join(1)
+            assert not buffering.is_alive()
+            assert channel.replay() == 0
+        finally:
+            release.set()
+            replay.join(5)
+
+        assert channel.sink.batches[0] == 4
+        channel.close()
+
+    def test_fully_shed_samples_not_stored(self, tmp_path):
+        """Test that samples left empty by shedding are neither sent nor buffered."""
+        channel = self.make_channel(tmp_path, 'primary')
+        # Critical shedding at any buffer usage, without compaction
+        channel.backpressure.watermarks = ((0.0, SHED_CRITICAL), (2.0, SHED_AGGREGATE),
+                                           (2.0, SHED_DETAIL))
+        channel.sink.up = False
+
+        assert not channel.send([make_network_sample(1), make_sample(2)])
+        channel.buffer(make_network_sample(3))
+        assert channel.get_buffer_stats()['count'] == 1
+
+        channel.sink.up = True
+        assert channel.replay() == 1
+        assert [list(json.loads(p)['metrics']) for p in channel.sink.delivered] == [['cpu']]
+        channel.close()
+
+    def test_compaction_drops_fully_shed_samples(self, tmp_path):
+        """Test that compacting at a shed level removes samples it empties."""
+        channel = self.make_channel(tmp_path, 'primary')
+        channel.store.close()
+        channel.store = BufferStore(tmp_path / 'small', 1024 * 1024, segment_size=256)
+        for index in range(20):
+            channel.store.append(make_network_sample(index).payload(SHED_NONE))
+            channel.store.append(make_sample(index).payload(SHED_NONE))
+
+        channel._compact_buffers(SHED_CRITICAL)
+
+        families = [list(json.loads(record)['metrics'])
+                    for record in channel.store.iter_records()]
+        # The compacted older records keep only CPU, with no empty records left
+        assert families[0] == ['cpu']
+        assert families.count(['network']) < 20
+        assert [] not in families
+        channel.close()
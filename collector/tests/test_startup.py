@@ -0,0 +1,107 @@
+"""
+Unit tests for startup stage timing.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+import startup
+from startup import StartupProfiler
+
+
+class FakeClock:
+    """perf_counter() stand-in that only moves when told to."""
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(startup.time, 'perf_counter', clock)
+    return clock
+
+
+class TestStartupProfiler:
+    """Tests for StartupProfiler class."""
+
+    def test_stage_timings(self, clock):
+        """Test that each stage records the time spent inside it."""
+        profiler = StartupProfiler(enabled=True)
+
+        with profiler.stage('import:sender'):
+            clock.advance(0.0125)
+        clock.advance(1.0)  # Between stages, not counted
+        with profiler.stage('init:collector'):
+            clock.advance(0.25)
+
+        assert profiler._stages == [('import:sender', pytest.approx(0.0125)),
+                                    ('init:collector', pytest.approx(0.25))]
+
+    def test_stage_recorded_on_error(self, clock):
+        """Test that a failing stage is still timed."""
+        profiler = StartupProfiler()
+
+        with pytest.raises(RuntimeError):
+            with profiler.stage('load:config'):
+                clock.advance(0.5)
+                raise RuntimeError("bad config")
+
+        assert profiler._stages == [('load:config', pytest.approx(0.5))]
+
+    def test_marks_relative_to_origin(self, clock):
+        """Test that milestones are measured from the given origin."""
+        profiler = StartupProfiler(origin=99.0)
+        clock.advance(0.5)
+        profiler.mark('first_sample')
+
+        assert profiler._marks == [('first_sample', pytest.approx(1.5))]
+
+        default = StartupProfiler()
+        clock.advance(2.0)
+        default.mark('first_sample')
+
+        assert default._marks == [('first_sample', pytest.approx(2.0))]
+
+    def test_emit_report(self, clock, capsys):
+        """Test that emit() writes stages, their total and marks to stderr."""
+        profiler = StartupProfiler(enabled=True)
+        with profiler.stage('import:sender'):
+            clock.advance(0.0125)
+        with profiler.stage('init:collector'):
+            clock.advance(0.25)
+        profiler.mark('first_sample')
+
+        profiler.emit()
+
+        captured = capsys.readouterr()
+        assert captured.out == ''
+        assert captured.err.splitlines() == [
+            "Startup profile:",
+            "  import:sender       12.50 ms",
+            "  init:collector     250.00 ms",
+            "  stages total       262.50 ms",
+            "  first_sample       262.50 ms since start",
+        ]
+
+    def test_emit_disabled(self, clock, capsys):
+        """Test that nothing is written unless profiling is enabled."""
+        profiler = StartupProfiler(enabled=False)
+        with profiler.stage('import:sender'):
+            clock.advance(0.1)
+
+        profiler.emit()
+
+        assert capsys.readouterr().err == ''
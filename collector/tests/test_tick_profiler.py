@@ -0,0 +1,181 @@
+"""
+Unit tests for the slow-tick profiler.
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add src directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+import tick_profiler
+from tick_profiler import SlowTickProfiler, collapse_stack
+
+
+class MockConfig:
+    """Mock configuration with profiler settings."""
+
+    def __init__(self, tmp_path, **settings):
+        self._profiler = {'enabled': True, 'budget': 0.05, 'sample_interval': 0.005,
+                          'dir': tmp_path / 'profiles'}
+        self._profiler.update(settings)
+
+    def get(self, *keys, default=None):
+        if keys[0] == 'profiler' and len(keys) == 2:
+            return self._profiler.get(keys[1], default)
+        return default
+
+
+def slow_work(seconds):
+    """Busy-wait, so the stack is inside this function when sampled."""
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def read_profiles(directory):
+    """Parse collapsed stack files into {file name: {stack: count}}."""
+    profiles = {}
+    for path in sorted(directory.glob('slow-*.folded')):
+        stacks = {}
+        for line in path.read_text().splitlines():
+            stack, count = line.rsplit(' ', 1)
+            stacks[stack] = int(count)
+        profiles[path.name] = stacks
+    return profiles
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    profiler = SlowTickProfiler(MockConfig(tmp_path))
+    yield profiler
+    profiler.stop(timeout=5)
+
+
+class TestSlowTickProfiler:
+    """Tests for SlowTickProfiler class."""
+
+    def test_ticks_within_budget_not_profiled(self, profiler, tmp_path):
+        """Test that fast ticks are counted but leave no profile."""
+        for _ in range(100):
+            with profiler.tick('collect-memory'):
+                pass
+        profiler.stop(timeout=5)
+
+        summary = profiler.summary()
+        assert summary['ticks'] == 100
+        assert summary['slow'] == summary['samples'] == 0
+        assert not (tmp_path / 'profiles').exists()
+
+    def test_slow_tick_written_as_collapsed_stacks(self, profiler, tmp_path):
+        """Test that an overrunning tick's stacks are written once it ends."""
+        with profiler.tick('collect-network'):
+            slow_work(0.3)
+        profiler.stop(timeout=5)
+
+        profiles = read_profiles(tmp_path / 'profiles')
+        assert len(profiles) == 1
+        name, stacks = next(iter(profiles.items()))
+        assert name.startswith('slow-collect-network-')
+        assert all(stack.startswith('collect-network;') for stack in stacks)
+        assert any('slow_work (test_tick_profiler.py:' in stack for stack in stacks)
+        # Sampled only after the budget ran out
+        assert 5 <= sum(stacks.values()) == profiler.summary()['samples']
+        assert profiler.summary()['slow'] == 1
+
+    def test_per_tick_budget(self, profiler, tmp_path):
+        """Test that a tick's own budget overrides profiler.budget."""
+        with profiler.tick('send-primary', budget=5):
+            slow_work(0.15)
+        profiler.stop(timeout=5)
+
+        assert profiler.summary()['slow'] == 0
+
+    def test_short_budget_while_long_tick_runs(self, profiler, tmp_path):
+        """Test that a tick due before a running one's deadline is still sampled."""
+        started = threading.Event()
+        release = threading.Event()
+
+        def send():
+            with profiler.tick('send-primary', budget=5):
+                started.set()
+                release.wait(5)
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        try:
+            assert started.wait(5)
+            with profiler.tick('collect-cpu', budget=0.1):
+                slow_work(1.0)
+        finally:
+            release.set()
+            sender.join(5)
+        profiler.stop(timeout=5)
+
+        profiles = read_profiles(tmp_path / 'profiles')
+        assert len(profiles) == 1
+        assert next(iter(profiles)).startswith('slow-collect-cpu-')
+        assert sum(next(iter(profiles.values())).values()) >= 5
+
+    def test_hung_tick_written_while_running(self, profiler, tmp_path, monkeypatch):
+        """Test that a tick that does not end is written after MAX_SAMPLES."""
+        monkeypatch.setattr(tick_profiler, 'MAX_SAMPLES', 5)
+
+        with profiler.tick('send-primary'):
+            deadline = time.monotonic() + 5
+            while not list((tmp_path / 'profiles').glob('*.folded')):
+                assert time.monotonic() < deadline, "profile not written"
+                time.sleep(0.01)
+            slow_work(0.05)
+        profiler.stop(timeout=5)
+
+        profiles = read_profiles(tmp_path / 'profiles')
+        assert len(profiles) == 1
+        assert sum(next(iter(profiles.values())).values()) == 5
+
+    def test_old_profiles_rotated(self, tmp_path):
+        """Test that only the newest profiler.max_files profiles are kept."""
+        profiler = SlowTickProfiler(MockConfig(tmp_path, max_files=2))
+        for index in range(4):
+            with profiler.tick(f'collect-{index}'):
+                slow_work(0.08)
+            # Written by the watchdog once the tick ends
+            time.sleep(0.05)
+        profiler.stop(timeout=5)
+
+        names = sorted(read_profiles(tmp_path / 'profiles'))
+        assert len(names) == 2
+        assert names[0].startswith('slow-collect-2-') and names[1].startswith('slow-collect-3-')
+
+    def test_disabled_profiler_idle(self, tmp_path):
+        """Test that a disabled profiler runs no watchdog and times nothing."""
+        profiler = SlowTickProfiler(MockConfig(tmp_path, enabled=False))
+        with profiler.tick('collect-cpu'):
+            slow_work(0.1)
+
+        assert profiler._thread is None
+        assert profiler.summary()['ticks'] == 0
+
+        forced = SlowTickProfiler(MockConfig(tmp_path, enabled=False), force=True)
+        assert forced.enabled
+        forced.stop(timeout=5)
+
+
+class TestCollapseStack:
+    """Tests for collapse_stack function."""
+
+    def test_outermost_first(self):
+        """Test that frames are joined from the outermost caller inwards."""
+        def inner():
+            return collapse_stack(sys._getframe())
+
+        def outer():
+            return inner()
+
+        frames = outer().split(';')
+        assert frames[-1].startswith('inner (test_tick_profiler.py:')
+        assert frames[-2].startswith('outer (test_tick_profiler.py:')